@@ -1,22 +1,27 @@
-from flask import Flask, request, jsonify
+import time
+_import_started = time.perf_counter()
+
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
-import mysql.connector
-import tensorflow as tf
 import numpy as np
-import pandas as pd
-from sklearn.preprocessing import LabelEncoder
 import json
-import os
 from dotenv import load_dotenv
-from ml_model import CoffeeClassifier
+from ml_model import get_classifier, start_classifier_loading, classifier_status
 from decimal import Decimal
-from config import db_config
+from config import ml_config, cache_config
 from datetime import datetime
-from db import get_db_connection
+from storage import get_repository, DuplicateError, init_app as init_storage
 from routes.characteristics import characteristics
 from routes.coffee_type_characteristics import coffee_type_characteristics
-import joblib
-from sklearn.preprocessing import StandardScaler
+from routes.model_versions import model_versions
+from routes.knowledge_base_import import knowledge_base_import
+from knowledge_base import get_snapshot, invalidate_snapshot, is_snapshot_loaded, cached_for_version
+from result_cache import ResultCache, cache_key, canonical_characteristics
+from feature_encoder import check_sample
+
+# Время импорта модулей (подробно: python -X importtime app.py)
+IMPORT_SECONDS = time.perf_counter() - _import_started
+print(f"Модули приложения импортированы за {IMPORT_SECONDS:.2f} с")
 
 load_dotenv()
 
@@ -32,86 +37,55 @@ app = Flask(__name__)
 app.json_encoder = CustomJSONEncoder
 
 CORS(app, resources={r"/api/*": {"origins": "*"}})
+init_storage(app)
 
 # Регистрируем blueprints
 app.register_blueprint(characteristics)
 app.register_blueprint(coffee_type_characteristics, url_prefix='/api/expert')
+app.register_blueprint(model_versions)
+app.register_blueprint(knowledge_base_import)
+
+# Классификатор строится в фоне: сервер начинает принимать запросы сразу,
+# а /readyz сообщает балансировщику, когда модель готова
+if ml_config['preload_model']:
+    start_classifier_loading()
+
+
+def ready_classifier():
+    """Классификатор с загруженной моделью или None, если загрузка не успела завершиться"""
+    classifier = get_classifier(timeout=ml_config['model_ready_timeout'])
+    if classifier is None or classifier.model is None:
+        return None
+    return classifier
+
+
+def model_not_ready():
+    return jsonify({'error': 'Модель ещё загружается, повторите запрос позже'}), 503
+
+# Кэш статического анализа: ключ включает отпечаток базы знаний, поэтому
+# после изменения данных старые записи просто перестают запрашиваться
+static_cache = ResultCache(cache_config['max_entries'], cache_config['max_bytes'])
 
-classifier = CoffeeClassifier()
-
-CHARACTERISTIC_TRANSLATIONS = {
-    'acidity': 'Кислотность',
-    'bitterness': 'Горечь',
-    'sweetness': 'Сладость',
-    'density': 'Плотность',
-    'astringency': 'Терпкость',
-    'roasting_degree': 'Степень обжарки',
-    'grinding_degree': 'Степень помола',
-    'variety': 'Разновидность',
-    'processing_method': 'Метод обработки',
-    'region': 'Регион произрастания',
-    'roast_level': 'Степень обжарки',
-    'body': 'Тело',
-    'aroma': 'Аромат',
-    'aftertaste': 'Послевкусие',
-    'flavor': 'Вкус'
-}
 
 def statistical_analysis(input_data):
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    
-    
-    cursor.execute("SELECT * FROM coffee_types")
-    coffee_types = cursor.fetchall()
+    snapshot = get_snapshot()
+    return static_cache.get_or_compute(
+        cache_key('statistical', snapshot.fingerprint, input_data),
+        lambda: compute_statistical_analysis(snapshot, input_data)
+    )
+
+
+def compute_statistical_analysis(snapshot, input_data):
+    match_result = snapshot.matcher.match_by_name(input_data)
+    summary = match_result.summary
     
     results = []
-    for coffee in coffee_types:
-        match_score = 0
-        total_characteristics = 0
-        
-        
-        cursor.execute("""
-            SELECT c.name, cn.min_value, cn.max_value 
-            FROM coffee_numeric_characteristics cn
-            JOIN characteristics c ON cn.characteristic_id = c.id
-            WHERE cn.coffee_type_id = %s
-        """, (coffee['id'],))
-        numeric_ranges = cursor.fetchall()
-        
-        for range_data in numeric_ranges:
-            char_name = range_data['name']
-            if char_name in input_data:
-                value = float(input_data[char_name])
-                if range_data['min_value'] <= value <= range_data['max_value']:
-                    match_score += 1
-                total_characteristics += 1
-        
-        
-        cursor.execute("""
-            SELECT c.name, cc.value
-            FROM coffee_categorical_characteristics cc
-            JOIN characteristics c ON cc.characteristic_id = c.id
-            WHERE cc.coffee_type_id = %s
-        """, (coffee['id'],))
-        categorical_values = cursor.fetchall()
-        
-        for cat_data in categorical_values:
-            char_name = cat_data['name']
-            if char_name in input_data:
-                if input_data[char_name] == cat_data['value']:
-                    match_score += 1
-                total_characteristics += 1
-        
-        if total_characteristics > 0:
-            confidence = (match_score / total_characteristics) * 100
-            results.append({
-                'coffee_type': coffee['name'],
-                'confidence': confidence
-            })
+    for row in np.flatnonzero(summary['checked'] > 0):
+        results.append({
+            'coffee_type': snapshot.type_names[int(summary['type_id'][row])],
+            'confidence': float(summary['matched'][row]) / float(summary['checked'][row]) * 100
+        })
     
-    cursor.close()
-    conn.close()
     return sorted(results, key=lambda x: x['confidence'], reverse=True)
 
 
@@ -119,19 +93,8 @@ def statistical_analysis(input_data):
 def get_coffee_types():
     print("Получен запрос на список сортов кофе")
     try:
-        print("Подключение к базе данных...")
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        print("Выполнение запроса...")
-        cursor.execute("SELECT id, name FROM coffee_types ORDER BY name")
-        result = cursor.fetchall()
+        result = get_repository().list_coffee_types()
         print(f"Получено {len(result)} сортов кофе")
-        
-        cursor.close()
-        conn.close()
-        print("Соединение с базой данных закрыто")
-        
         return jsonify(result)
     except Exception as e:
         print(f"Ошибка при получении списка сортов кофе: {str(e)}")
@@ -139,13 +102,7 @@ def get_coffee_types():
 
 @app.route('/api/characteristics', methods=['GET'])
 def get_characteristics():
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM characteristics")
-    result = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    return jsonify(result)
+    return jsonify(get_repository().list_characteristics())
 
 @app.route('/api/classify', methods=['POST'])
 def classify_coffee():
@@ -156,6 +113,9 @@ def classify_coffee():
     if method == 'statistical':
         results = statistical_analysis(input_data)
     else:
+        classifier = ready_classifier()
+        if classifier is None:
+            return model_not_ready()
         results = classifier.predict(input_data)
     
     return jsonify(results)
@@ -164,35 +124,28 @@ def classify_coffee():
 def add_coffee_type():
     data = request.json
     name = data.get('name')
-    
+
     if not name:
         return jsonify({
             'success': False,
             'error': 'Название сорта кофе не может быть пустым'
         }), 400
-    
-    conn = get_db_connection()
-    cursor = conn.cursor()
+
     try:
-        cursor.execute(
-            "INSERT INTO coffee_types (name) VALUES (%s)",
-            (name,)
-        )
-        conn.commit()
-        return jsonify({'success': True, 'id': cursor.lastrowid})
-    except mysql.connector.Error as err:
-        if err.errno == 1062:  
-            return jsonify({
-                'success': False,
-                'error': f'Сорт кофе "{name}" уже существует'
-            }), 409
+        coffee_id = get_repository().add_coffee_type(name)
+        invalidate_snapshot()
+        return jsonify({'success': True, 'id': coffee_id})
+    except DuplicateError:
+        return jsonify({
+            'success': False,
+            'error': f'Сорт кофе "{name}" уже существует'
+        }), 409
+    except Exception as err:
+        print(f"Ошибка при добавлении сорта кофе: {err}")
         return jsonify({
             'success': False,
             'error': 'Произошла ошибка при добавлении сорта кофе'
         }), 500
-    finally:
-        cursor.close()
-        conn.close()
 
 @app.route('/api/expert/add-numeric-range', methods=['POST'])
 def add_numeric_range():
@@ -201,22 +154,15 @@ def add_numeric_range():
     characteristic_id = data.get('characteristic_id')
     min_value = data.get('min_value')
     max_value = data.get('max_value')
-    
-    conn = get_db_connection()
-    cursor = conn.cursor()
+
     try:
-        cursor.execute("""
-            INSERT INTO numeric_ranges 
-            (coffee_type_id, characteristic_id, min_value, max_value)
-            VALUES (%s, %s, %s, %s)
-        """, (coffee_type_id, characteristic_id, min_value, max_value))
-        conn.commit()
+        get_repository().add_type_characteristic(
+            coffee_type_id, characteristic_id, numeric=(min_value, max_value)
+        )
+        invalidate_snapshot()
         return jsonify({'success': True})
-    except mysql.connector.Error as err:
+    except Exception as err:
         return jsonify({'success': False, 'error': str(err)})
-    finally:
-        cursor.close()
-        conn.close()
 
 @app.route('/api/expert/add-categorical-value', methods=['POST'])
 def add_categorical_value():
@@ -224,106 +170,60 @@ def add_categorical_value():
     coffee_type_id = data.get('coffee_type_id')
     characteristic_id = data.get('characteristic_id')
     value_id = data.get('value_id')
-    
-    conn = get_db_connection()
-    cursor = conn.cursor()
+
     try:
-        cursor.execute("""
-            INSERT INTO coffee_categorical_values 
-            (coffee_type_id, characteristic_id, value_id)
-            VALUES (%s, %s, %s)
-        """, (coffee_type_id, characteristic_id, value_id))
-        conn.commit()
+        get_repository().add_categorical_assignment(coffee_type_id, characteristic_id, value_id)
+        invalidate_snapshot()
         return jsonify({'success': True})
-    except mysql.connector.Error as err:
+    except Exception as err:
         return jsonify({'success': False, 'error': str(err)})
-    finally:
-        cursor.close()
-        conn.close()
 
 @app.route('/api/expert/delete-coffee-type/<int:coffee_id>', methods=['DELETE'])
 def delete_coffee_type(coffee_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
     try:
-        
-        cursor.execute("SELECT name FROM coffee_types WHERE id = %s", (coffee_id,))
-        coffee = cursor.fetchone()
-        if not coffee:
+        # Характеристики сорта удаляются вместе с ним в одной транзакции
+        if not get_repository().delete_coffee_type(coffee_id):
             return jsonify({
                 'success': False,
                 'error': 'Сорт кофе не найден'
             }), 404
+        invalidate_snapshot()
 
-        
-        cursor.execute("DELETE FROM coffee_numeric_characteristics WHERE coffee_type_id = %s", (coffee_id,))
-        cursor.execute("DELETE FROM coffee_categorical_characteristics WHERE coffee_type_id = %s", (coffee_id,))
-        
-        
-        cursor.execute("DELETE FROM coffee_types WHERE id = %s", (coffee_id,))
-        conn.commit()
-        
         return jsonify({
             'success': True,
             'message': 'Сорт кофе успешно удален'
         })
-    except mysql.connector.Error as err:
-        conn.rollback()
-        print(f"Ошибка SQL при удалении сорта кофе: {err}")
+    except Exception as err:
+        print(f"Ошибка при удалении сорта кофе: {err}")
         return jsonify({
             'success': False,
             'error': f'Произошла ошибка при удалении сорта кофе: {str(err)}'
         }), 500
-    finally:
-        cursor.close()
-        conn.close()
 
 @app.route('/api/expert/coffee-type/<int:coffee_id>/characteristics', methods=['GET'])
 def get_coffee_characteristics(coffee_id):
     print(f"Получен запрос на характеристики для сорта кофе {coffee_id}")
-    conn = None
-    cursor = None
     try:
-        print("Подключение к базе данных...")
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
+        repository = get_repository()
+
         # Проверяем существование сорта кофе
-        print("Проверка существования сорта кофе...")
-        cursor.execute("SELECT id FROM coffee_types WHERE id = %s", (coffee_id,))
-        if not cursor.fetchone():
+        if not repository.coffee_type_exists(coffee_id):
             print(f"Сорт кофе {coffee_id} не найден")
             return jsonify({
                 'success': False,
                 'error': 'Сорт кофе не найден'
             }), 404
-        
+
         # Получаем числовые характеристики
-        print("Получение числовых характеристик...")
-        cursor.execute("""
-            SELECT c.id, c.name, c.type, cn.min_value, cn.max_value
-            FROM coffee_numeric_characteristics cn
-            JOIN characteristics c ON c.id = cn.characteristic_id
-            WHERE cn.coffee_type_id = %s
-        """, (coffee_id,))
-        numeric_characteristics = cursor.fetchall()
+        numeric_characteristics = [
+            {key: row[key] for key in ('id', 'name', 'type', 'min_value', 'max_value')}
+            for row in repository.type_numeric_ranges(coffee_id)
+        ]
         print(f"Найдено {len(numeric_characteristics)} числовых характеристик")
-        
-        # Получаем категориальные характеристики
-        print("Получение категориальных характеристик...")
-        cursor.execute("""
-            SELECT c.id, c.name, c.type, cv.value
-            FROM coffee_categorical_characteristics cc
-            JOIN characteristics c ON c.id = cc.characteristic_id
-            JOIN categorical_values cv ON cv.id = cc.categorical_value_id
-            WHERE cc.coffee_type_id = %s
-        """, (coffee_id,))
-        categorical_characteristics = cursor.fetchall()
-        print(f"Найдено {len(categorical_characteristics)} категориальных характеристик")
-        
+
         # Группируем категориальные характеристики
         grouped_categorical = {}
-        for char in categorical_characteristics:
+        for char in repository.type_categorical_values(coffee_id):
             if char['id'] not in grouped_categorical:
                 grouped_categorical[char['id']] = {
                     'id': char['id'],
@@ -333,203 +233,122 @@ def get_coffee_characteristics(coffee_id):
                 }
             if char['value']:
                 grouped_categorical[char['id']]['values'].append(char['value'])
-        
+        print(f"Найдено {len(grouped_categorical)} категориальных характеристик")
+
         result = {
             'numeric': numeric_characteristics,
             'categorical': list(grouped_categorical.values())
         }
-        
+
         print("Успешно сформирован ответ")
         return jsonify(result)
-        
+
     except Exception as e:
         print(f"Ошибка при получении характеристик: {str(e)}")
         return jsonify({
             'success': False,
             'error': f'Произошла ошибка при получении характеристик: {str(e)}'
         }), 500
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
-            print("Соединение с базой данных закрыто")
 
 @app.route('/api/expert/coffee-type/<int:coffee_id>/characteristics', methods=['POST'])
 def update_coffee_characteristics(coffee_id):
     print(f"Получен запрос на обновление характеристик для сорта кофе {coffee_id}")
-    conn = None
-    cursor = None
     try:
         data = request.json
         print("Получены данные:", data)
-        
-        print("Подключение к базе данных...")
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
+        repository = get_repository()
+
         # Проверяем существование сорта кофе
-        print("Проверка существования сорта кофе...")
-        cursor.execute("SELECT id FROM coffee_types WHERE id = %s", (coffee_id,))
-        if not cursor.fetchone():
+        if not repository.coffee_type_exists(coffee_id):
             print(f"Сорт кофе {coffee_id} не найден")
             return jsonify({
-                'success': False, 
+                'success': False,
                 'error': 'Сорт кофе не найден'
             }), 404
-        
-        # Удаляем старые характеристики
-        print("Удаление старых характеристик...")
-        cursor.execute("DELETE FROM coffee_numeric_characteristics WHERE coffee_type_id = %s", (coffee_id,))
-        cursor.execute("DELETE FROM coffee_categorical_characteristics WHERE coffee_type_id = %s", (coffee_id,))
-        
-        # Добавляем новые числовые характеристики
-        print("Добавление числовых характеристик...")
-        for char in data.get('numeric', []):
-            cursor.execute("""
-                INSERT INTO coffee_numeric_characteristics 
-                (coffee_type_id, characteristic_id, min_value, max_value)
-                VALUES (%s, %s, %s, %s)
-            """, (coffee_id, char['id'], char.get('min_value', 0), char.get('max_value', 0)))
-        
-        # Добавляем новые категориальные характеристики
-        print("Добавление категориальных характеристик...")
-        for char in data.get('categorical', []):
-            for value in char.get('values', []):
-                # Получаем ID значения категориальной характеристики
-                cursor.execute("""
-                    SELECT id FROM categorical_values 
-                    WHERE characteristic_id = %s AND value = %s
-                """, (char['id'], value))
-                result = cursor.fetchone()
-                
-                if result:
-                    value_id = result[0]
-                    cursor.execute("""
-                        INSERT INTO coffee_categorical_characteristics 
-                        (coffee_type_id, characteristic_id, categorical_value_id)
-                        VALUES (%s, %s, %s)
-                    """, (coffee_id, char['id'], value_id))
-                else:
-                    # Если значение не найдено, создаем его
-                    cursor.execute("""
-                        INSERT INTO categorical_values (characteristic_id, value)
-                        VALUES (%s, %s)
-                    """, (char['id'], value))
-                    value_id = cursor.lastrowid
-                    
-                    cursor.execute("""
-                        INSERT INTO coffee_categorical_characteristics 
-                        (coffee_type_id, characteristic_id, categorical_value_id)
-                        VALUES (%s, %s, %s)
-                    """, (coffee_id, char['id'], value_id))
-        
-        conn.commit()
+
+        # Старые характеристики заменяются новыми; отсутствующие значения создаются
+        repository.replace_type_characteristics(
+            coffee_id,
+            [
+                (char['id'], char.get('min_value', 0), char.get('max_value', 0))
+                for char in data.get('numeric', [])
+            ],
+            [
+                (char['id'], value)
+                for char in data.get('categorical', []) for value in char.get('values', [])
+            ],
+            create_values=True
+        )
+        invalidate_snapshot()
         print("Изменения успешно сохранены")
         return jsonify({'success': True})
-        
+
     except Exception as e:
-        if conn:
-            conn.rollback()
         print(f"Ошибка при обновлении характеристик: {str(e)}")
         return jsonify({
             'success': False,
             'error': f'Произошла ошибка при обновлении характеристик: {str(e)}'
         }), 500
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
-            print("Соединение с базой данных закрыто")
 
 @app.route('/api/expert/characteristics', methods=['POST'])
 def add_characteristic():
     data = request.json
     name = data.get('name')
-    type = data.get('type')  
-    
+    type = data.get('type')
+
     if not name or not type or type not in ['numeric', 'categorical']:
         return jsonify({
             'success': False,
             'error': 'Необходимо указать название и корректный тип характеристики'
         }), 400
-    
-    conn = get_db_connection()
-    cursor = conn.cursor()
+
     try:
-        
-        cursor.execute("SELECT id FROM characteristics WHERE name = %s", (name,))
-        existing_char = cursor.fetchone()
-        
+        repository = get_repository()
+        existing_char = repository.find_characteristic(name)
+
         if existing_char:
-            
             return jsonify({
                 'success': True,
-                'id': existing_char[0],
+                'id': existing_char['id'],
                 'message': 'Характеристика уже существует'
             })
-            
-        
-        cursor.execute(
-            "INSERT INTO characteristics (name, type) VALUES (%s, %s)",
-            (name, type)
-        )
-        char_id = cursor.lastrowid
-        
-        
+
+        values = []
         if type == 'categorical' and 'values' in data:
-            for value in data.get('values', []):
-                if value:  
-                    cursor.execute(
-                        "INSERT INTO categorical_values (characteristic_id, value) VALUES (%s, %s)",
-                        (char_id, value)
-                    )
-        
-        conn.commit()
+            values = [value for value in data.get('values', []) if value]
+        char_id = repository.add_characteristic(name, type, values=values)
+        invalidate_snapshot()
         return jsonify({
             'success': True,
             'id': char_id,
             'message': 'Характеристика успешно добавлена'
         })
-        
-    except mysql.connector.Error as err:
-        conn.rollback()
-        print(f"Ошибка SQL при добавлении характеристики: {err}")
+
+    except Exception as err:
+        print(f"Ошибка при добавлении характеристики: {err}")
         return jsonify({
             'success': False,
             'error': f'Произошла ошибка при добавлении характеристики: {str(err)}'
         }), 500
-    finally:
-        cursor.close()
-        conn.close()
 
 @app.route('/api/expert/characteristic/<int:char_id>/values', methods=['GET'])
 def get_characteristic_values(char_id):
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    
     try:
-        
-        cursor.execute("SELECT id, name, type FROM characteristics WHERE id = %s", (char_id,))
-        characteristic = cursor.fetchone()
-        
+        repository = get_repository()
+        characteristic = repository.get_characteristic(char_id)
+
         if not characteristic:
             return jsonify({
                 'success': False,
                 'error': 'Характеристика не найдена'
             }), 404
-            
-        
+
         if characteristic['type'] == 'categorical':
-            cursor.execute("""
-                SELECT id, value
-                FROM categorical_values
-                WHERE characteristic_id = %s
-                ORDER BY value
-            """, (char_id,))
-            values = cursor.fetchall()
-            
+            values = [
+                {'id': row['id'], 'value': row['value']}
+                for row in repository.list_categorical_values(char_id)
+            ]
+
             return jsonify({
                 'success': True,
                 'characteristic': characteristic,
@@ -540,358 +359,288 @@ def get_characteristic_values(char_id):
                 'success': False,
                 'error': 'Это не категориальная характеристика'
             }), 400
-            
-    except mysql.connector.Error as err:
-        print(f"Ошибка SQL: {err}")
+
+    except Exception as err:
+        print(f"Ошибка при получении значений: {err}")
         return jsonify({
             'success': False,
             'error': f'Произошла ошибка при получении значений: {str(err)}'
         }), 500
-    finally:
-        cursor.close()
-        conn.close()
 
 @app.route('/api/expert/coffee-type/<int:coffee_id>/add-characteristic', methods=['POST'])
 def add_characteristic_to_coffee(coffee_id):
     data = request.json
     characteristic_id = data.get('characteristic_id')
     characteristic_type = data.get('type')
-    
+
     if not characteristic_id or not characteristic_type:
         return jsonify({
             'success': False,
             'error': 'Не указаны ID характеристики или её тип'
         }), 400
-    
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
+
     try:
-        
-        cursor.execute("SELECT id FROM coffee_types WHERE id = %s", (coffee_id,))
-        if not cursor.fetchone():
+        repository = get_repository()
+
+        if not repository.coffee_type_exists(coffee_id):
             return jsonify({
                 'success': False,
                 'error': 'Сорт кофе не найден'
             }), 404
-        
-        
-        cursor.execute("SELECT type FROM characteristics WHERE id = %s", (characteristic_id,))
-        char_data = cursor.fetchone()
-        if not char_data:
+
+        if not repository.get_characteristic(characteristic_id):
             return jsonify({
                 'success': False,
                 'error': 'Характеристика не найдена'
             }), 404
-        
-        
+
+        numeric_ids, categorical_ids = repository.type_characteristic_ids(coffee_id)
         if characteristic_type == 'numeric':
-            cursor.execute("""
-                SELECT id FROM coffee_numeric_characteristics 
-                WHERE coffee_type_id = %s AND characteristic_id = %s
-            """, (coffee_id, characteristic_id))
-            if cursor.fetchone():
+            if characteristic_id in numeric_ids:
                 return jsonify({
                     'success': False,
                     'error': 'Эта числовая характеристика уже добавлена к данному сорту кофе'
                 }), 409
-        else:
-            cursor.execute("""
-                SELECT id FROM coffee_categorical_characteristics 
-                WHERE coffee_type_id = %s AND characteristic_id = %s
-            """, (coffee_id, characteristic_id))
-            if cursor.fetchone():
-                return jsonify({
-                    'success': False,
-                    'error': 'Эта категориальная характеристика уже добавлена к данному сорту кофе'
-                }), 409
-        
+        elif characteristic_id in categorical_ids:
+            return jsonify({
+                'success': False,
+                'error': 'Эта категориальная характеристика уже добавлена к данному сорту кофе'
+            }), 409
+
         if characteristic_type == 'numeric':
             min_value = data.get('min_value')
             max_value = data.get('max_value')
-            
+
             if min_value is None or max_value is None:
                 return jsonify({
                     'success': False,
                     'error': 'Для числовой характеристики необходимо указать минимальное и максимальное значения'
                 }), 400
-            
-            cursor.execute("""
-                INSERT INTO coffee_numeric_characteristics 
-                (coffee_type_id, characteristic_id, min_value, max_value)
-                VALUES (%s, %s, %s, %s)
-            """, (coffee_id, characteristic_id, min_value, max_value))
-        
+
+            repository.add_type_characteristic(coffee_id, characteristic_id, numeric=(min_value, max_value))
+
         elif characteristic_type == 'categorical':
             values = data.get('values', [])
-            
+
             if not values:
                 return jsonify({
                     'success': False,
                     'error': 'Для категориальной характеристики необходимо указать хотя бы одно значение'
                 }), 400
-            
-            for value in values:
-                cursor.execute("""
-                    INSERT INTO coffee_categorical_characteristics 
-                    (coffee_type_id, characteristic_id, value)
-                    VALUES (%s, %s, %s)
-                """, (coffee_id, characteristic_id, value))
-        
+
+            # Значения сопоставляются с id значений характеристики
+            if not repository.add_type_characteristic(coffee_id, characteristic_id, values=values):
+                return jsonify({
+                    'success': False,
+                    'error': 'Ни одно из указанных значений не найдено у характеристики'
+                }), 400
+
         else:
             return jsonify({
                 'success': False,
                 'error': 'Неверный тип характеристики'
             }), 400
-        
-        conn.commit()
+
+        invalidate_snapshot()
         return jsonify({'success': True})
-        
-    except mysql.connector.Error as err:
-        conn.rollback()
+
+    except Exception as err:
         return jsonify({
             'success': False,
             'error': str(err)
         }), 500
-    finally:
-        cursor.close()
-        conn.close()
 
 @app.route('/api/expert/coffee-type/<int:coffee_id>/characteristic/<int:characteristic_id>', methods=['DELETE'])
 def delete_coffee_characteristic(coffee_id, characteristic_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
     try:
-        
-        cursor.execute("SELECT id FROM coffee_types WHERE id = %s", (coffee_id,))
-        if not cursor.fetchone():
+        repository = get_repository()
+
+        if not repository.coffee_type_exists(coffee_id):
             return jsonify({
                 'success': False,
                 'error': 'Сорт кофе не найден'
             }), 404
-        
-        
-        cursor.execute("SELECT type FROM characteristics WHERE id = %s", (characteristic_id,))
-        char_data = cursor.fetchone()
-        if not char_data:
+
+        if not repository.get_characteristic(characteristic_id):
             return jsonify({
                 'success': False,
                 'error': 'Характеристика не найдена'
             }), 404
-        
-        
-        cursor.execute("""
-            DELETE FROM coffee_numeric_characteristics 
-            WHERE coffee_type_id = %s AND characteristic_id = %s
-        """, (coffee_id, characteristic_id))
-        numeric_deleted = cursor.rowcount
-        
-        
-        cursor.execute("""
-            DELETE FROM coffee_categorical_characteristics 
-            WHERE coffee_type_id = %s AND characteristic_id = %s
-        """, (coffee_id, characteristic_id))
-        categorical_deleted = cursor.rowcount
-        
-        
-        if numeric_deleted == 0 and categorical_deleted == 0:
+
+        if not repository.delete_type_characteristic(coffee_id, characteristic_id):
             return jsonify({
                 'success': False,
                 'error': 'Характеристика не найдена у данного сорта кофе'
             }), 404
-        
-        conn.commit()
+
+        invalidate_snapshot()
         return jsonify({
             'success': True,
             'message': 'Характеристика успешно удалена'
         })
-        
-    except mysql.connector.Error as err:
-        conn.rollback()
+
+    except Exception as err:
         return jsonify({
             'success': False,
             'error': str(err)
         }), 500
-    finally:
-        cursor.close()
-        conn.close()
 
 @app.route('/api/expert/characteristics/values', methods=['GET'])
 def get_all_characteristic_values():
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    
     try:
-        # Получаем числовые характеристики с их глобальными ограничениями
-        cursor.execute("""
-            SELECT DISTINCT c.id, c.name, c.type, 
-                   ncl.min_value as min_value, 
-                   ncl.max_value as max_value
-            FROM characteristics c
-            LEFT JOIN numeric_characteristic_limits ncl ON c.id = ncl.characteristic_id
-            WHERE c.type = 'numeric'
-            ORDER BY c.name
-        """)
-        numeric_characteristics = cursor.fetchall()
-        
-        # Получаем категориальные характеристики с их возможными значениями
-        cursor.execute("""
-            SELECT DISTINCT c.id, c.name, c.type, 
-                   GROUP_CONCAT(DISTINCT cv.value ORDER BY cv.value) AS possible_values
-            FROM characteristics c
-            LEFT JOIN categorical_values cv ON c.id = cv.characteristic_id
-            WHERE c.type = 'categorical'
-            GROUP BY c.id, c.name, c.type
-            ORDER BY c.name
-        """)
-        categorical_characteristics = cursor.fetchall()
-        
-        # Обрабатываем возможные значения для категориальных характеристик
-        for char in categorical_characteristics:
-            if char['possible_values']:
-                char['possible_values'] = char['possible_values'].split(',')
-            else:
-                char['possible_values'] = []
-        
-        result = {
-            'numeric': numeric_characteristics,
-            'categorical': categorical_characteristics
-        }
-        
-        return jsonify(result)
-    except mysql.connector.Error as err:
-        print(f"Ошибка SQL при получении значений характеристик: {err}")
+        return jsonify(cached_for_version('characteristic_values', load_characteristic_values))
+    except Exception as err:
+        print(f"Ошибка при получении значений характеристик: {err}")
         return jsonify({
             'success': False,
             'error': f'Произошла ошибка при получении значений характеристик: {str(err)}'
         }), 500
-    finally:
-        cursor.close()
-        conn.close()
+
+def load_characteristic_values():
+    """Характеристики с ограничениями и возможными значениями за два запроса"""
+    repository = get_repository()
+
+    # Числовые характеристики с их глобальными ограничениями
+    numeric_characteristics = [
+        {key: row[key] for key in ('id', 'name', 'type', 'min_value', 'max_value')}
+        for row in repository.characteristics_with_limits('numeric')
+    ]
+
+    # Категориальные характеристики и их значения одной выборкой; значения
+    # группируются здесь, а не через GROUP_CONCAT, который обрезается по
+    # group_concat_max_len и ломается на значениях с запятой
+    categorical_characteristics = []
+    by_id = {}
+    for row in repository.categorical_characteristic_values():
+        char = by_id.get(row['id'])
+        if char is None:
+            char = {'id': row['id'], 'name': row['name'], 'type': row['type'], 'possible_values': []}
+            by_id[row['id']] = char
+            categorical_characteristics.append(char)
+        if row['value'] is not None and row['value'] not in char['possible_values']:
+            char['possible_values'].append(row['value'])
+
+    return {
+        'numeric': numeric_characteristics,
+        'categorical': categorical_characteristics
+    }
 
 @app.route('/api/specialist/analyze-static', methods=['POST'])
 def analyze_static():
     data = request.json
     numeric_chars = data['characteristics']['numeric']
     categorical_chars = data['characteristics']['categorical']
+    canonical = canonical_characteristics(numeric_chars, categorical_chars, cache_config['numeric_precision'])
     
-    connection = None
-    cursor = None
     try:
-        connection = mysql.connector.connect(**db_config)
-        cursor = connection.cursor()
-        
-        cursor.execute("SELECT id, name FROM coffee_types")
-        coffee_types_data = cursor.fetchall()
-        coffee_types = {row[0]: row[1] for row in coffee_types_data}
-        
-        results = {
-            'type': None,
-            'explanations': [],
-            'all_types_analysis': {}
-        }
-        
-        for coffee_id, coffee_name in coffee_types.items():
-            type_analysis = {
-                'name': coffee_name,
-                'matches': True,
-                'reasons': []
-            }
-            
-            # Проверяем числовые характеристики
-            for char_id, value in numeric_chars.items():
-                cursor.execute("""
-                    SELECT c.name, cn.min_value, cn.max_value 
-                    FROM coffee_numeric_characteristics cn
-                    JOIN characteristics c ON c.id = cn.characteristic_id
-                    WHERE cn.coffee_type_id = %s AND cn.characteristic_id = %s
-                """, (coffee_id, char_id))
-                range_data = cursor.fetchall()
-                
-                cursor.execute("SELECT name FROM characteristics WHERE id = %s", (char_id,))
-                char_name_result = cursor.fetchone()
-                char_name = char_name_result[0] if char_name_result else f"Характеристика {char_id}"
-                char_name_ru = CHARACTERISTIC_TRANSLATIONS.get(char_name, char_name)
-                
-                if not range_data:
-                    type_analysis['matches'] = False
-                    type_analysis['reasons'].append(
-                        f"Характеристика '{char_name_ru}' не определена для данного сорта"
-                    )
-                else:
-                    char_name, min_val, max_val = range_data[0]
-                    char_name_ru = CHARACTERISTIC_TRANSLATIONS.get(char_name, char_name)
-                    
-                    if value < min_val or value > max_val:
-                        type_analysis['matches'] = False
-                        type_analysis['reasons'].append(
-                            f"Значение '{value}' для характеристики '{char_name_ru}' "
-                            f"не входит в допустимый диапазон [{min_val:.2f}, {max_val:.2f}]"
-                        )
-                    else:
-                        type_analysis['reasons'].append(
-                            f"Значение '{value}' для характеристики '{char_name_ru}' "
-                            f"входит в допустимый диапазон [{min_val:.2f}, {max_val:.2f}]"
-                        )
-            
-            # Проверяем категориальные характеристики
-            for char_id, value in categorical_chars.items():
-                cursor.execute("""
-                    SELECT c.name, cv.value 
-                    FROM coffee_categorical_characteristics cc
-                    JOIN characteristics c ON c.id = cc.characteristic_id
-                    JOIN categorical_values cv ON cc.categorical_value_id = cv.id
-                    WHERE cc.coffee_type_id = %s AND cc.characteristic_id = %s
-                """, (coffee_id, char_id))
-                cat_data = cursor.fetchall()
-                
-                cursor.execute("SELECT name FROM characteristics WHERE id = %s", (char_id,))
-                char_name_result = cursor.fetchone()
-                char_name = char_name_result[0] if char_name_result else f"Характеристика {char_id}"
-                char_name_ru = CHARACTERISTIC_TRANSLATIONS.get(char_name, char_name)
-                
-                if not cat_data:
-                    type_analysis['matches'] = False
-                    type_analysis['reasons'].append(
-                        f"Характеристика '{char_name_ru}' не определена для данного сорта"
-                    )
-                else:
-                    char_name, expected_value = cat_data[0]
-                    char_name_ru = CHARACTERISTIC_TRANSLATIONS.get(char_name, char_name)
-                    
-                    if value != expected_value:
-                        type_analysis['matches'] = False
-                        type_analysis['reasons'].append(
-                            f"Значение '{value}' для характеристики '{char_name_ru}' "
-                            f"не соответствует требуемому значению '{expected_value}'"
-                        )
-                    else:
-                        type_analysis['reasons'].append(
-                            f"Значение '{value}' для характеристики '{char_name_ru}' "
-                            f"соответствует требуемому значению '{expected_value}'"
-                        )
-            
-            results['all_types_analysis'][coffee_name] = type_analysis
-            
-            if type_analysis['matches'] and not results['type']:
-                results['type'] = coffee_name
-                results['explanations'].append(f"Наиболее подходящий тип: {coffee_name}")
-        
-        if not results['type']:
-            results['explanations'].append("Не найдено подходящих типов кофе.")
-            
+        snapshot = get_snapshot()
+        if canonical is None:
+            # Значения точнее ввода считаются как есть, без кэша
+            results = compute_static_analysis(snapshot, numeric_chars, categorical_chars)
+        else:
+            numeric_chars, categorical_chars = canonical
+            results = static_cache.get_or_compute(
+                cache_key('static', snapshot.fingerprint, numeric_chars, categorical_chars),
+                lambda: compute_static_analysis(snapshot, numeric_chars, categorical_chars)
+            )
         return jsonify(results)
         
     except Exception as e:
         print(f"Error in analyze_static: {str(e)}")
         return jsonify({'error': 'Internal Server Error'}), 500
-        
-    finally:
-        if cursor:
-            cursor.close()
-        if connection:
-            connection.close()
+
+
+def compute_static_analysis(snapshot, numeric_chars, categorical_chars):
+    match_result = snapshot.matcher.match(numeric_chars, categorical_chars)
+    summary = match_result.summary
+    
+    results = {
+        'type': None,
+        'explanations': [],
+        'all_types_analysis': {}
+    }
+    
+    # Обоснования формируются только на этапе сборки ответа
+    for row, type_id in enumerate(summary['type_id'].tolist()):
+        coffee_name = snapshot.type_names[type_id]
+        results['all_types_analysis'][coffee_name] = {
+            'name': coffee_name,
+            'matches': bool(summary['matches'][row]),
+            'reasons': match_result.reasons(row)
+        }
+    
+    candidates = snapshot.candidate_index.candidates(numeric_chars, categorical_chars)
+    first_match = snapshot.candidate_index.first_type_id(candidates)
+    if first_match is not None:
+        coffee_name = snapshot.type_names[first_match]
+        results['type'] = coffee_name
+        results['explanations'].append(f"Наиболее подходящий тип: {coffee_name}")
+    
+    if not results['type']:
+        results['explanations'].append("Не найдено подходящих типов кофе.")
+    
+    return results
+
+@app.route('/api/specialist/candidates', methods=['POST'])
+def get_candidates():
+    """Возвращает id сортов, полностью подходящих под образец"""
+    data = request.json
+    if not data or 'characteristics' not in data:
+        return jsonify({'error': 'Отсутствуют характеристики в входных данных'}), 400
+    
+    characteristics = data['characteristics']
+    numeric_chars = characteristics.get('numeric', {})
+    categorical_chars = characteristics.get('categorical', {})
+    
+    try:
+        index = get_snapshot().candidate_index
+        candidates = index.candidates(numeric_chars, categorical_chars)
+        return jsonify({'candidates': index.type_ids_of(candidates)})
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': f'Неверный формат характеристик: {str(e)}'}), 400
+    except Exception as e:
+        print(f"Error in get_candidates: {str(e)}")
+        return jsonify({'error': 'Internal Server Error'}), 500
+
+def build_ml_result(prediction, coffee_types, class_mapping=None, with_explanations=True):
+    """Формирует ответ ML-анализа по строке вероятностей одного образца.
+    
+    class_mapping - id сорта для каждого выхода модели; для моделей без
+    метаданных выход i соответствует сорту с id i + 1.
+    """
+    total_prob = np.sum(prediction)
+    if abs(total_prob - 1.0) > 1e-6:
+        print(f"Предупреждение: сумма вероятностей не равна 1: {total_prob}")
+        prediction = prediction / total_prob
+    
+    results = {
+        'type': None,
+        'probabilities': {}
+    }
+    if with_explanations:
+        results['explanations'] = []
+    
+    if class_mapping is None:
+        class_mapping = range(1, len(prediction) + 1)
+    output_types = list(class_mapping)
+    
+    for index, prob in enumerate(prediction):
+        if index < len(output_types) and output_types[index] in coffee_types:
+            results['probabilities'][coffee_types[output_types[index]]] = round(float(prob) * 100, 2)
+    
+    max_prob_idx = int(prediction.argmax())
+    if max_prob_idx < len(output_types) and output_types[max_prob_idx] in coffee_types:
+        predicted_type = coffee_types[output_types[max_prob_idx]]
+        results['type'] = predicted_type
+        if with_explanations:
+            results['explanations'].append(
+                f"Модель ИИ предсказала тип '{predicted_type}' на основе введённых данных."
+            )
+            results['explanations'].append(
+                "Вероятности для каждого типа приведены ниже."
+            )
+    
+    return results
 
 @app.route('/api/specialist/analyze-ml', methods=['POST'])
 def analyze_ml():
@@ -905,390 +654,276 @@ def analyze_ml():
         characteristics = data['characteristics']
         if 'numeric' not in characteristics or 'categorical' not in characteristics:
             return jsonify({'error': 'Отсутствуют числовые или категориальные характеристики'}), 400
-            
-        numeric_chars = characteristics['numeric']
-        categorical_chars = characteristics['categorical']
         
+        classifier = ready_classifier()
+        if classifier is None:
+            return model_not_ready()
         
         predictions = classifier.predict(data)
         print('Сырые предсказания:', predictions)
         
-        
         predictions = predictions / np.sum(predictions)
         print('Нормализованные предсказания:', predictions)
         
-        
-        total_prob = np.sum(predictions[0])
-        if abs(total_prob - 1.0) > 1e-6:
-            print(f"Предупреждение: сумма вероятностей не равна 1: {total_prob}")
-            predictions = predictions / total_prob
-        
-        
-        connection = mysql.connector.connect(**db_config)
-        cursor = connection.cursor()
-        cursor.execute("SELECT id, name FROM coffee_types")
-        coffee_types_data = cursor.fetchall()
-        coffee_types = {row[0]: row[1] for row in coffee_types_data}
-        cursor.close()
-        connection.close()
-        
-        
-        results = {
-            'type': None,
-            'explanations': [],
-            'probabilities': {}
-        }
-        
-        
-        for type_id, prob in enumerate(predictions[0]):
-            if type_id + 1 in coffee_types:
-                
-                results['probabilities'][coffee_types[type_id + 1]] = round(float(prob) * 100, 2)
-        
-        
-        max_prob_idx = predictions[0].argmax()
-        if max_prob_idx + 1 in coffee_types:
-            predicted_type = coffee_types[max_prob_idx + 1]
-            results['type'] = predicted_type
-            results['explanations'].append(
-                f"Модель ИИ предсказала тип '{predicted_type}' на основе введённых данных."
-            )
-            results['explanations'].append(
-                "Вероятности для каждого типа приведены ниже."
-            )
-        
-        return jsonify(results)
+        return jsonify(build_ml_result(predictions[0], get_snapshot().type_names, classifier.class_mapping))
         
     except Exception as e:
         print(f"Error in analyze_ml: {str(e)}")
         return jsonify({'error': 'Internal Server Error'}), 500
 
-@app.route('/api/specialist/knowledge-base', methods=['GET'])
-def get_knowledge_base():
-    """Получение всей базы знаний для специалиста"""
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+@app.route('/api/specialist/analyze-ml/batch', methods=['POST'])
+def analyze_ml_batch():
+    """Пакетная ML-классификация: один проход модели на весь массив образцов"""
+    data = request.json
+    samples = data.get('samples') if isinstance(data, dict) else None
+    
+    if not isinstance(samples, list) or not samples:
+        return jsonify({'error': 'Ожидается непустой массив образцов в поле samples'}), 400
+    if len(samples) > ml_config['batch_max_samples']:
+        return jsonify({
+            'error': f"Слишком много образцов: максимум {ml_config['batch_max_samples']}"
+        }), 413
+    
+    for index, sample in enumerate(samples):
+        characteristics = sample.get('characteristics') if isinstance(sample, dict) else None
+        if not isinstance(characteristics, dict) or 'numeric' not in characteristics or 'categorical' not in characteristics:
+            return jsonify({
+                'error': f'Образец {index}: отсутствуют числовые или категориальные характеристики',
+                'index': index
+            }), 400
+        # Нечисловое значение иначе закодировалось бы нулём и дало уверенный ответ
+        try:
+            check_sample(sample)
+        except ValueError as e:
+            return jsonify({'error': f'Образец {index}: {e}', 'index': index}), 400
+    
+    classifier = ready_classifier()
+    if classifier is None:
+        return model_not_ready()
     
     try:
-        # Получаем все сорта кофе
-        cursor.execute("SELECT id, name FROM coffee_types ORDER BY name")
-        coffee_types = cursor.fetchall()
-        
-        result = []
+        predictions = classifier.predict_batch(samples)
+        coffee_types = get_snapshot().type_names
+        class_mapping = classifier.class_mapping
         
-        for coffee in coffee_types:
-            # Получаем числовые характеристики
-            cursor.execute("""
-                SELECT 
-                    c.id,
-                    c.name,
-                    c.type,
-                    cn.min_value,
-                    cn.max_value
-                FROM coffee_numeric_characteristics cn
-                JOIN characteristics c ON c.id = cn.characteristic_id
-                WHERE cn.coffee_type_id = %s
-            """, (coffee['id'],))
-            numeric_characteristics = cursor.fetchall()
-            
-            # Получаем категориальные характеристики
-            cursor.execute("""
-                SELECT 
-                    c.id,
-                    c.name,
-                    c.type,
-                    GROUP_CONCAT(cv.value) as value_list
-                FROM coffee_categorical_characteristics cc
-                JOIN characteristics c ON c.id = cc.characteristic_id
-                JOIN categorical_values cv ON cc.categorical_value_id = cv.id
-                WHERE cc.coffee_type_id = %s
-                GROUP BY c.id, c.name, c.type
-            """, (coffee['id'],))
-            categorical_characteristics = cursor.fetchall()
-            
-            # Обрабатываем категориальные значения
-            for char in categorical_characteristics:
-                if char['value_list']:
-                    char['values'] = char['value_list'].split(',')
-                else:
-                    char['values'] = []
-                del char['value_list']  # Удаляем временное поле
-            
-            result.append({
-                'id': coffee['id'],
-                'name': coffee['name'],
-                'characteristics': {
-                    'numeric': numeric_characteristics,
-                    'categorical': categorical_characteristics
-                }
-            })
-        
-        return jsonify(result)
+        return jsonify({
+            'results': [
+                build_ml_result(prediction, coffee_types, class_mapping, with_explanations=False)
+                for prediction in predictions
+            ]
+        })
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"Error in analyze_ml_batch: {str(e)}")
+        return jsonify({'error': 'Internal Server Error'}), 500
+
+@app.route('/api/specialist/knowledge-base', methods=['GET'])
+def get_knowledge_base():
+    """Получение всей базы знаний для специалиста.
+
+    Ответ сериализуется один раз на версию базы знаний; клиент с актуальным
+    If-None-Match получает 304 без повторной сериализации.
+    """
+    try:
+        body, etag = get_snapshot().knowledge_base_json()
     except Exception as e:
         print(f"Ошибка при получении базы знаний: {e}")
         return jsonify({'error': str(e)}), 500
-    finally:
-        cursor.close()
-        conn.close()
+    
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    # Клиент хранит ответ, но перепроверяет его ETag при каждом запросе
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
 
 @app.route('/api/expert/coffee-type/<int:coffee_type_id>/values', methods=['GET'])
 def get_coffee_type_values(coffee_type_id):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
+        repository = get_repository()
+
         # Проверяем существование сорта кофе
-        cursor.execute("SELECT id FROM coffee_types WHERE id = %s", (coffee_type_id,))
-        if not cursor.fetchone():
+        if not repository.coffee_type_exists(coffee_type_id):
             return jsonify({"error": "Сорт кофе не найден"}), 404
-        
-        # Получаем числовые характеристики и их значения
-        cursor.execute("""
-            SELECT 
-                c.id,
-                c.name,
-                c.type,
-                ncl.min_value as global_min,
-                ncl.max_value as global_max,
-                cn.min_value as coffee_min,
-                cn.max_value as coffee_max
-            FROM characteristics c
-            JOIN numeric_characteristic_limits ncl ON c.id = ncl.characteristic_id
-            JOIN coffee_numeric_characteristics cn ON c.id = cn.characteristic_id
-            WHERE cn.coffee_type_id = %s
-        """, (coffee_type_id,))
-        numeric_values = cursor.fetchall()
-        
-        # Получаем категориальные характеристики и их значения
-        cursor.execute("""
-            SELECT 
-                c.id,
-                c.name,
-                c.type,
-                (
-                    SELECT GROUP_CONCAT(cv.value)
-                    FROM coffee_categorical_characteristics cc
-                    JOIN categorical_values cv ON cc.categorical_value_id = cv.id
-                    WHERE cc.coffee_type_id = %s AND cc.characteristic_id = c.id
-                ) as selected_values,
-                (
-                    SELECT GROUP_CONCAT(DISTINCT cv2.value)
-                    FROM categorical_values cv2
-                    WHERE cv2.characteristic_id = c.id
-                ) as available_values
-            FROM characteristics c
-            WHERE c.type = 'categorical'
-            AND EXISTS (
-                SELECT 1 
-                FROM coffee_categorical_characteristics cc 
-                WHERE cc.coffee_type_id = %s AND cc.characteristic_id = c.id
-            )
-        """, (coffee_type_id, coffee_type_id))
-        categorical_values = cursor.fetchall()
-        
-        # Обрабатываем результаты
-        for char in categorical_values:
-            if char['selected_values']:
-                char['selected_values'] = char['selected_values'].split(',')
-            else:
-                char['selected_values'] = []
-                
-            if char['available_values']:
-                char['available_values'] = char['available_values'].split(',')
-            else:
-                char['available_values'] = []
-        
+
+        # Числовые характеристики сорта, у которых заданы глобальные ограничения
+        numeric_values = [
+            {
+                'id': row['id'],
+                'name': row['name'],
+                'type': row['type'],
+                'global_min': row['global_min'],
+                'global_max': row['global_max'],
+                'coffee_min': row['min_value'],
+                'coffee_max': row['max_value']
+            }
+            for row in repository.type_numeric_ranges(coffee_type_id)
+            if row['limits_id'] is not None
+        ]
+
+        # Выбранные значения группируются здесь, а не через GROUP_CONCAT:
+        # он есть не во всех СУБД и ломается на значениях с запятой
+        selected = {}
+        for row in repository.type_categorical_values(coffee_type_id):
+            selected.setdefault(row['id'], {
+                'id': row['id'],
+                'name': row['name'],
+                'type': row['type'],
+                'selected_values': []
+            })['selected_values'].append(row['value'])
+
+        available = {}
+        for row in repository.list_categorical_values():
+            if row['characteristic_id'] in selected and row['value'] not in available.setdefault(row['characteristic_id'], []):
+                available[row['characteristic_id']].append(row['value'])
+
+        categorical_values = []
+        for char_id in sorted(selected):
+            char = selected[char_id]
+            char['available_values'] = available.get(char_id, [])
+            categorical_values.append(char)
+
         return jsonify({
             "numeric": numeric_values,
             "categorical": categorical_values
         })
-        
+
     except Exception as e:
         print(f"Ошибка при получении значений характеристик: {str(e)}")
         return jsonify({"error": str(e)}), 500
-    finally:
-        if 'cursor' in locals():
-            cursor.close()
-        if 'conn' in locals():
-            conn.close()
 
 @app.route('/api/expert/coffee-type/<int:coffee_type_id>/values', methods=['POST'])
 def update_coffee_type_values(coffee_type_id):
     try:
         data = request.get_json()
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
+        repository = get_repository()
+
         # Проверяем существование сорта кофе
-        cursor.execute("SELECT id FROM coffee_types WHERE id = %s", (coffee_type_id,))
-        if not cursor.fetchone():
+        if not repository.coffee_type_exists(coffee_type_id):
             return jsonify({"error": "Сорт кофе не найден"}), 404
-        
-        # Обновляем числовые значения
-        if 'numeric' in data:
-            for char in data['numeric']:
-                # Проверяем ограничения
-                cursor.execute("""
-                    SELECT min_value, max_value 
-                    FROM numeric_characteristic_limits 
-                    WHERE characteristic_id = %s
-                """, (char['id'],))
-                limits = cursor.fetchone()
-                
-                if limits:
-                    # Преобразуем значения в Decimal для корректного сравнения
-                    min_value = max(Decimal(str(limits[0])), Decimal(str(char.get('min_value', 0))))
-                    max_value = min(Decimal(str(limits[1])), Decimal(str(char.get('max_value', 0))))
-                else:
-                    min_value = Decimal(str(char.get('min_value', 0)))
-                    max_value = Decimal(str(char.get('max_value', 0)))
-                
-                # Обновляем значения
-                cursor.execute("""
-                    UPDATE coffee_numeric_characteristics 
-                    SET min_value = %s, max_value = %s
-                    WHERE coffee_type_id = %s AND characteristic_id = %s
-                """, (min_value, max_value, coffee_type_id, char['id']))
-        
-        # Обновляем категориальные значения
-        if 'categorical' in data:
-            for char in data['categorical']:
-                # Удаляем старые значения
-                cursor.execute("""
-                    DELETE FROM coffee_categorical_characteristics 
-                    WHERE coffee_type_id = %s AND characteristic_id = %s
-                """, (coffee_type_id, char['id']))
-                
-                # Добавляем новые значения
-                for value in char.get('selected_values', []):
-                    # Получаем ID значения категориальной характеристики
-                    cursor.execute("""
-                        SELECT id FROM categorical_values 
-                        WHERE characteristic_id = %s AND value = %s
-                    """, (char['id'], value))
-                    result = cursor.fetchone()
-                    
-                    if result:
-                        value_id = result[0]
-                        # Добавляем новое значение
-                        cursor.execute("""
-                            INSERT INTO coffee_categorical_characteristics 
-                            (coffee_type_id, characteristic_id, categorical_value_id)
-                            VALUES (%s, %s, %s)
-                        """, (coffee_type_id, char['id'], value_id))
-        
-        conn.commit()
+
+        # Числовые значения ограничиваются глобальными пределами характеристик
+        limits = repository.numeric_limits() if data.get('numeric') else {}
+        numeric = []
+        for char in data.get('numeric', []):
+            char_limits = limits.get(char['id'])
+            if char_limits:
+                # Преобразуем значения в Decimal для корректного сравнения
+                min_value = max(Decimal(str(char_limits[0])), Decimal(str(char.get('min_value', 0))))
+                max_value = min(Decimal(str(char_limits[1])), Decimal(str(char.get('max_value', 0))))
+            else:
+                min_value = Decimal(str(char.get('min_value', 0)))
+                max_value = Decimal(str(char.get('max_value', 0)))
+            numeric.append((char['id'], min_value, max_value))
+
+        # Выбранные значения категориальных характеристик заменяются целиком
+        categorical = {
+            char['id']: char.get('selected_values', [])
+            for char in data.get('categorical', [])
+        }
+
+        repository.update_type_values(coffee_type_id, numeric, categorical)
+        invalidate_snapshot()
         return jsonify({"success": True})
-        
+
     except Exception as e:
         print(f"Ошибка при обновлении значений характеристик: {str(e)}")
-        if 'conn' in locals():
-            conn.rollback()
         return jsonify({"error": str(e)}), 500
-    finally:
-        if 'cursor' in locals():
-            cursor.close()
-        if 'conn' in locals():
-            conn.close()
 
 @app.route('/api/expert/completeness-check', methods=['GET'])
 def check_completeness():
+    """Отчёт о полноте данных сортов, кэшируемый до изменения базы знаний"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        # Получаем все сорта кофе
-        cursor.execute("SELECT id, name FROM coffee_types")
-        coffee_types = cursor.fetchall()
-        
-        result = {
-            'no_characteristics': [],  # Сорта без выбранных характеристик
-            'incomplete_values': []    # Сорта с неполными значениями
-        }
-        
-        for coffee in coffee_types:
-            # Проверяем наличие характеристик
-            cursor.execute("""
-                SELECT COUNT(*) as count 
-                FROM coffee_numeric_characteristics 
-                WHERE coffee_type_id = %s
-            """, (coffee['id'],))
-            numeric_count = cursor.fetchone()['count']
-            
-            cursor.execute("""
-                SELECT COUNT(*) as count 
-                FROM coffee_categorical_characteristics 
-                WHERE coffee_type_id = %s
-            """, (coffee['id'],))
-            categorical_count = cursor.fetchone()['count']
-            
-            if numeric_count == 0 and categorical_count == 0:
-                result['no_characteristics'].append({
-                    'id': coffee['id'],
-                    'name': coffee['name']
-                })
-                continue
-            
-            # Проверяем числовые значения
-            cursor.execute("""
-                SELECT 
-                    c.name,
-                    cn.min_value,
-                    cn.max_value,
-                    ncl.min_value as global_min,
-                    ncl.max_value as global_max
-                FROM coffee_numeric_characteristics cn
-                JOIN characteristics c ON c.id = cn.characteristic_id
-                JOIN numeric_characteristic_limits ncl ON c.id = ncl.characteristic_id
-                WHERE cn.coffee_type_id = %s
-                AND (
-                    cn.min_value IS NULL 
-                    OR cn.max_value IS NULL
-                    OR cn.min_value < ncl.min_value
-                    OR cn.max_value > ncl.max_value
-                    OR cn.min_value = 0 AND cn.max_value = 0
-                )
-            """, (coffee['id'],))
-            invalid_numeric = cursor.fetchall()
-            
-            # Проверяем категориальные значения
-            cursor.execute("""
-                SELECT c.name
-                FROM coffee_categorical_characteristics cc
-                JOIN characteristics c ON c.id = cc.characteristic_id
-                WHERE cc.coffee_type_id = %s
-                AND NOT EXISTS (
-                    SELECT 1 FROM coffee_categorical_characteristics cc2
-                    WHERE cc2.coffee_type_id = cc.coffee_type_id
-                    AND cc2.characteristic_id = cc.characteristic_id
-                    AND cc2.categorical_value_id IS NOT NULL
-                )
-            """, (coffee['id'],))
-            empty_categorical = cursor.fetchall()
-            
-            if invalid_numeric or empty_categorical:
-                result['incomplete_values'].append({
-                    'id': coffee['id'],
-                    'name': coffee['name'],
-                    'empty_numeric': [
-                        f"{char['name']} (текущие значения: {char['min_value']} - {char['max_value']}, "
-                        f"допустимый диапазон: {char['global_min']} - {char['global_max']})"
-                        for char in invalid_numeric
-                    ],
-                    'empty_categorical': [char['name'] for char in empty_categorical]
-                })
-        
-        return jsonify(result)
-        
+        return jsonify(cached_for_version('completeness', build_completeness_report))
     except Exception as e:
         print(f"Ошибка при проверке полноты данных: {str(e)}")
         return jsonify({"error": str(e)}), 500
-    finally:
-        if 'cursor' in locals():
-            cursor.close()
-        if 'conn' in locals():
-            conn.close()
+
+
+def build_completeness_report():
+    """Строит отчёт фиксированным числом агрегирующих запросов по всем сортам сразу"""
+    coffee_types, characteristic_counts, invalid_rows, empty_rows = get_repository().completeness_data()
+
+    # Некорректные числовые значения всех сортов
+    invalid_numeric = {}
+    for char in invalid_rows:
+        invalid_numeric.setdefault(char['coffee_type_id'], []).append(char)
+
+    # Категориальные характеристики без единого значения
+    empty_categorical = {}
+    for char in empty_rows:
+        empty_categorical.setdefault(char['coffee_type_id'], []).append(char)
+
+    result = {
+        'no_characteristics': [],  # Сорта без выбранных характеристик
+        'incomplete_values': []    # Сорта с неполными значениями
+    }
+
+    for coffee in coffee_types:
+        if not characteristic_counts.get(coffee['id']):
+            result['no_characteristics'].append({
+                'id': coffee['id'],
+                'name': coffee['name']
+            })
+            continue
+
+        coffee_invalid_numeric = invalid_numeric.get(coffee['id'], [])
+        coffee_empty_categorical = empty_categorical.get(coffee['id'], [])
+        if coffee_invalid_numeric or coffee_empty_categorical:
+            result['incomplete_values'].append({
+                'id': coffee['id'],
+                'name': coffee['name'],
+                'empty_numeric': [
+                    f"{char['name']} (текущие значения: {char['min_value']} - {char['max_value']}, "
+                    f"допустимый диапазон: {char['global_min']} - {char['global_max']})"
+                    for char in coffee_invalid_numeric
+                ],
+                'empty_categorical': [char['name'] for char in coffee_empty_categorical]
+            })
+
+    return result
+
+@app.route('/api/model/status', methods=['GET'])
+def get_model_status():
+    """Состояние фонового обучения и версия обслуживаемой модели"""
+    classifier = get_classifier(timeout=0)
+    if classifier is None:
+        return jsonify(classifier_status())
+    return jsonify(classifier.model_status())
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Метрики обслуживания: очередь и размеры пакетов инференса, кэши, пул соединений"""
+    classifier = get_classifier(timeout=0)
+    return jsonify({
+        'inference': classifier.scheduler.metrics() if classifier is not None else None,
+        'prediction_cache': classifier.result_cache.stats() if classifier is not None else None,
+        'static_cache': static_cache.stats(),
+        'db_pool': get_repository().pool_metrics()
+    })
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    """Процесс жив и отвечает на запросы"""
+    return jsonify({
+        'status': 'ok',
+        'import_seconds': round(IMPORT_SECONDS, 3)
+    })
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    """Готовность обслуживать запросы: загружены база знаний и модель"""
+    # Запускает (или повторяет после ошибки) загрузку, не дожидаясь её
+    get_classifier(timeout=0)
+    status = classifier_status()
+    ready = is_snapshot_loaded() and status['model_loaded']
+    return jsonify({
+        'ready': ready,
+        'knowledge_base_loaded': is_snapshot_loaded(),
+        'model_loaded': status['model_loaded'],
+        'classifier': status
+    }), 200 if ready else 503
 
 if __name__ == '__main__':
     app.run(debug=True) 
\ No newline at end of file
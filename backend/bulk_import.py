@@ -0,0 +1,282 @@
+"""Массовый импорт каталога сортов в базу знаний.
+
+Каталог - список сортов с диапазонами числовых и значениями категориальных
+характеристик. JSON совпадает с форматом /api/specialist/knowledge-base
+(выгрузку можно загрузить обратно); характеристики задаются именем или id:
+
+    [{"name": "Арабика",
+      "characteristics": {
+          "numeric": [{"name": "acidity", "min_value": 4, "max_value": 6}],
+          "categorical": [{"name": "region", "values": ["Эфиопия"]}]}}]
+
+CSV - по строке на диапазон или значение:
+
+    coffee_type,characteristic,min_value,max_value,value
+    Арабика,acidity,4,6,
+    Арабика,region,,,Эфиопия
+
+Каталог проверяется целиком по снимку базы знаний в памяти; затем все сорта
+записываются пакетными запросами в одной транзакции с одним повышением
+версии. Характеристики сортов из каталога заменяются, остальные сорта не
+затрагиваются.
+
+    python bulk_import.py catalog.json [--dry-run]
+"""
+import argparse
+import csv
+import io
+import json
+import math
+import os
+import sys
+from knowledge_base import get_snapshot, invalidate_snapshot
+from storage import get_repository
+
+
+class CatalogError(ValueError):
+    """Каталог не прошёл проверку; errors - список найденных ошибок"""
+
+    def __init__(self, errors):
+        super().__init__(f"Ошибок в каталоге: {len(errors)}")
+        self.errors = errors
+
+
+def _number(value):
+    """Конечное число из числа или строки (десятичная запятая допускается)"""
+    if isinstance(value, bool):
+        raise ValueError(value)
+    if isinstance(value, str):
+        value = value.strip().replace(',', '.')
+    number = float(value)
+    if not math.isfinite(number):
+        raise ValueError(value)
+    return number
+
+
+def _items(container, key, where, errors):
+    """Список характеристик раздела numeric/categorical; None, если раздел некорректен"""
+    items = container.get(key, [])
+    if not isinstance(items, list):
+        errors.append(f"{where}: {key} должен быть списком характеристик")
+        return None
+    valid = []
+    for item in items:
+        if isinstance(item, dict):
+            valid.append(item)
+        else:
+            errors.append(
+                f"{where}: {key}: ожидается объект характеристики, получено {json.dumps(item, ensure_ascii=False)}"
+            )
+    return valid
+
+
+def parse_csv(text):
+    """Каталог из CSV: строки одного сорта собираются в одну запись"""
+    reader = csv.DictReader(io.StringIO(text))
+    missing = [column for column in ('coffee_type', 'characteristic') if column not in (reader.fieldnames or [])]
+    if missing:
+        raise CatalogError([f"В CSV нет столбцов: {', '.join(missing)}"])
+
+    catalog = {}
+    for line, row in enumerate(reader, start=2):
+        name = (row.get('coffee_type') or '').strip()
+        entry = catalog.setdefault(name, {
+            'name': name,
+            'characteristics': {'numeric': [], 'categorical': {}},
+            'line': line
+        })
+        characteristic = (row.get('characteristic') or '').strip()
+        if not characteristic:
+            continue
+        value = (row.get('value') or '').strip()
+        if value:
+            entry['characteristics']['categorical'].setdefault(
+                characteristic, {'name': characteristic, 'values': [], 'line': line}
+            )['values'].append(value)
+        else:
+            entry['characteristics']['numeric'].append({
+                'name': characteristic,
+                'min_value': row.get('min_value'),
+                'max_value': row.get('max_value'),
+                'line': line
+            })
+
+    entries = list(catalog.values())
+    for entry in entries:
+        entry['characteristics']['categorical'] = list(entry['characteristics']['categorical'].values())
+    return entries
+
+
+def parse_json(data):
+    """Каталог из JSON: список сортов или {"coffee_types": [...]}"""
+    if isinstance(data, dict):
+        data = data.get('coffee_types')
+    if not isinstance(data, list):
+        raise CatalogError(["Ожидается список сортов или объект с ключом coffee_types"])
+    return data
+
+
+def load_catalog(path):
+    """Каталог из файла .json или .csv"""
+    with open(path, encoding='utf-8-sig') as f:
+        if os.path.splitext(path)[1].lower() == '.csv':
+            return parse_csv(f.read())
+        return parse_json(json.load(f))
+
+
+def _resolve_characteristic(snapshot, item):
+    """id характеристики по имени (предпочтительно: id различаются между базами) или по id"""
+    name = item.get('name') or item.get('characteristic')
+    if name is not None:
+        return snapshot.characteristic_ids_by_name.get(str(name).strip())
+    try:
+        char_id = int(item.get('id'))
+    except (TypeError, ValueError):
+        return None
+    return char_id if char_id in snapshot.characteristics else None
+
+
+def validate_catalog(snapshot, entries):
+    """Проверяет каталог по снимку и готовит строки для записи.
+
+    Возвращает список сортов {'name', 'numeric': [(char_id, min, max)],
+    'categorical': [(char_id, value_id)]}; при ошибках выбрасывает CatalogError.
+    """
+    # Одна карта для всех значений: (id характеристики, значение) -> id значения
+    value_ids = {
+        (char_id, value): value_id
+        for char_id, values in snapshot.categorical_values.items()
+        for value_id, value in values
+    }
+    errors = []
+    plan = []
+    seen_names = set()
+
+    for index, entry in enumerate(entries):
+        where = f"строка {entry['line']}" if isinstance(entry, dict) and 'line' in entry else f"сорт #{index + 1}"
+        if not isinstance(entry, dict):
+            errors.append(f"{where}: ожидается объект")
+            continue
+        name = str(entry.get('name') or '').strip()
+        if not name:
+            errors.append(f"{where}: не указано название сорта")
+            continue
+        # Названия в MySQL сравниваются без учёта регистра
+        if name.casefold() in seen_names:
+            errors.append(f"{where}: сорт \"{name}\" указан в каталоге повторно")
+            continue
+        seen_names.add(name.casefold())
+
+        characteristics = entry.get('characteristics') or {}
+        if not isinstance(characteristics, dict):
+            errors.append(f"{where}: characteristics должен быть объектом с разделами numeric и categorical")
+            continue
+        numeric_items = _items(characteristics, 'numeric', where, errors)
+        categorical_items = _items(characteristics, 'categorical', where, errors)
+        if numeric_items is None or categorical_items is None:
+            continue
+
+        numeric = []
+        seen_numeric = set()
+        for item in numeric_items:
+            item_where = f"строка {item['line']}" if 'line' in item else f"{name}"
+            char_id = _resolve_characteristic(snapshot, item)
+            if char_id is None or snapshot.characteristics[char_id]['type'] != 'numeric':
+                errors.append(f"{item_where}: неизвестная числовая характеристика {item.get('name', item.get('id'))}")
+                continue
+            char_name = snapshot.characteristics[char_id]['name']
+            if char_id in seen_numeric:
+                errors.append(f"{item_where}: характеристика {char_name} указана повторно")
+                continue
+            seen_numeric.add(char_id)
+            try:
+                min_value = _number(item.get('min_value'))
+                max_value = _number(item.get('max_value'))
+            except (TypeError, ValueError):
+                errors.append(f"{item_where}: {char_name}: границы диапазона должны быть конечными числами")
+                continue
+            if min_value > max_value:
+                errors.append(f"{item_where}: {char_name}: минимум {min_value} больше максимума {max_value}")
+                continue
+            limits = snapshot.numeric_limits.get(char_id)
+            if limits is not None and (min_value < limits[0] or max_value > limits[1]):
+                errors.append(
+                    f"{item_where}: {char_name}: диапазон {min_value} - {max_value} "
+                    f"вне допустимого {limits[0]} - {limits[1]}"
+                )
+                continue
+            numeric.append((char_id, min_value, max_value))
+
+        categorical = []
+        seen_categorical = set()
+        for item in categorical_items:
+            item_where = f"строка {item['line']}" if 'line' in item else f"{name}"
+            char_id = _resolve_characteristic(snapshot, item)
+            if char_id is None or snapshot.characteristics[char_id]['type'] != 'categorical':
+                errors.append(f"{item_where}: неизвестная категориальная характеристика {item.get('name', item.get('id'))}")
+                continue
+            char_name = snapshot.characteristics[char_id]['name']
+            values = item.get('values', [])
+            if not isinstance(values, list):
+                errors.append(f"{item_where}: {char_name}: values должен быть списком значений")
+                continue
+            for value in values:
+                if not isinstance(value, str):
+                    errors.append(
+                        f"{item_where}: {char_name}: значение должно быть строкой, "
+                        f"получено {json.dumps(value, ensure_ascii=False)}"
+                    )
+                    continue
+                value_id = value_ids.get((char_id, value))
+                if value_id is None:
+                    errors.append(f"{item_where}: {char_name}: недопустимое значение \"{value}\"")
+                elif (char_id, value_id) not in seen_categorical:
+                    seen_categorical.add((char_id, value_id))
+                    categorical.append((char_id, value_id))
+
+        plan.append({'name': name, 'numeric': numeric, 'categorical': categorical})
+
+    if errors:
+        raise CatalogError(errors)
+    return plan
+
+
+def import_catalog(entries, dry_run=False):
+    """Проверяет и (если не dry_run) записывает каталог; возвращает сводку"""
+    plan = validate_catalog(get_snapshot(), entries)
+    if dry_run or not plan:
+        return {
+            'coffee_types': len(plan),
+            'numeric_ranges': sum(len(entry['numeric']) for entry in plan),
+            'categorical_values': sum(len(entry['categorical']) for entry in plan),
+            'dry_run': dry_run
+        }
+
+    summary = get_repository().import_catalog(plan)
+    invalidate_snapshot()
+    summary['dry_run'] = False
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Массовый импорт сортов кофе в базу знаний')
+    parser.add_argument('path', help='Файл каталога (.json или .csv)')
+    parser.add_argument('--dry-run', action='store_true', help='Только проверить каталог, ничего не записывая')
+    args = parser.parse_args()
+
+    try:
+        summary = import_catalog(load_catalog(args.path), dry_run=args.dry_run)
+    except CatalogError as e:
+        print(e)
+        for error in e.errors:
+            print(f"  {error}")
+        return 1
+    print(
+        f"Сортов: {summary['coffee_types']}, диапазонов: {summary['numeric_ranges']}, "
+        f"значений: {summary['categorical_values']}" + (" (проверка без записи)" if args.dry_run else "")
+    )
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,104 @@
+from bisect import bisect_left
+
+
+class CandidateIndex:
+    """Инвертированный индекс сортов на битовых множествах.
+
+    Бит i соответствует i-му сорту снимка (в порядке id). Для каждой числовой
+    характеристики хранятся отсортированные концы интервалов и битовые множества
+    сортов, покрывающих каждую точку и каждый промежуток между точками; для каждого
+    категориального значения - множество сортов, которым оно назначено.
+    Полностью подходящие сорта получаются пересечением k множеств за O(k log n).
+    """
+
+    def __init__(self, snapshot):
+        self.type_ids = [type_id for type_id, _ in snapshot.coffee_types]
+        type_bits = {type_id: 1 << row for row, type_id in enumerate(self.type_ids)}
+        self.all_types = (1 << len(self.type_ids)) - 1
+
+        # id характеристики -> (точки, множества в точках, множества в промежутках)
+        self.numeric = {}
+        starts = {}
+        ends = {}
+        for type_id, ranges in snapshot.numeric_ranges.items():
+            bit = type_bits.get(type_id)
+            if bit is None:
+                continue
+            for char_id, (min_value, max_value) in ranges.items():
+                if min_value is None or max_value is None or min_value > max_value:
+                    continue
+                char_starts = starts.setdefault(char_id, {})
+                char_ends = ends.setdefault(char_id, {})
+                char_starts[min_value] = char_starts.get(min_value, 0) | bit
+                char_ends[max_value] = char_ends.get(max_value, 0) | bit
+
+        for char_id, char_starts in starts.items():
+            char_ends = ends[char_id]
+            points = sorted(set(char_starts) | set(char_ends))
+            point_sets = []
+            gap_sets = []
+            active = 0
+            for point in points:
+                # Интервалы замкнутые: в точке активны и начинающиеся, и заканчивающиеся
+                active |= char_starts.get(point, 0)
+                point_sets.append(active)
+                active &= ~char_ends.get(point, 0)
+                gap_sets.append(active)
+            self.numeric[char_id] = (points, point_sets, gap_sets)
+
+        # (id характеристики, значение) -> множество сортов
+        self.categorical = {}
+        for type_id, assignments in snapshot.categorical_assignments.items():
+            bit = type_bits.get(type_id)
+            if bit is None:
+                continue
+            for char_id, values in assignments.items():
+                for value in values:
+                    key = (char_id, value)
+                    self.categorical[key] = self.categorical.get(key, 0) | bit
+
+    def numeric_candidates(self, char_id, value):
+        """Множество сортов, диапазон которых содержит значение"""
+        entry = self.numeric.get(int(char_id))
+        if entry is None:
+            return 0
+        points, point_sets, gap_sets = entry
+        value = float(value)
+        position = bisect_left(points, value)
+        if position < len(points) and points[position] == value:
+            return point_sets[position]
+        if position == 0:
+            return 0
+        return gap_sets[position - 1]
+
+    def categorical_candidates(self, char_id, value):
+        """Множество сортов, которым назначено категориальное значение"""
+        return self.categorical.get((int(char_id), value), 0)
+
+    def candidates(self, numeric_chars, categorical_chars):
+        """Битовое множество сортов, полностью подходящих под образец"""
+        result = self.all_types
+        for char_id, value in numeric_chars.items():
+            result &= self.numeric_candidates(char_id, value)
+            if not result:
+                return 0
+        for char_id, value in categorical_chars.items():
+            result &= self.categorical_candidates(char_id, value)
+            if not result:
+                return 0
+        return result
+
+    def type_ids_of(self, bitset):
+        """Преобразует битовое множество в список id сортов"""
+        result = []
+        while bitset:
+            lowest = bitset & -bitset
+            result.append(self.type_ids[lowest.bit_length() - 1])
+            bitset ^= lowest
+        return result
+
+    def first_type_id(self, bitset):
+        """id первого (в порядке id) сорта из множества или None"""
+        if not bitset:
+            return None
+        return self.type_ids[(bitset & -bitset).bit_length() - 1]
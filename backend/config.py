@@ -1,3 +1,5 @@
+import os
+
 # Конфигурация базы данных
 db_config = {
     'host': 'localhost',
@@ -5,4 +7,103 @@ db_config = {
     'user': 'root',
     'password': 'qwerty123',
     'database': 'coffee_classification'
-} 
\ No newline at end of file
+}
+
+# Хранилище базы знаний (storage.py)
+storage_config = {
+    # 'mysql' - сервер MySQL (db_config, db_pool_config); 'sqlite' - локальный файл в процессе
+    'backend': os.environ.get('STORAGE_BACKEND', 'mysql'),
+    # Файл базы SQLite (создаётся: python storage.py init-sqlite <файл> --snapshot <снимок>)
+    'sqlite_path': os.environ.get('SQLITE_PATH') or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'data', 'coffee_classification.sqlite3'
+    )
+}
+
+# Пул соединений с MySQL (db.py)
+db_pool_config = {
+    # Максимальное число открытых соединений процесса
+    'size': 10,
+    # Сколько секунд ждать свободного соединения, прежде чем вернуть ошибку
+    'borrow_timeout': 5.0,
+    # Соединение, простоявшее дольше этого (в секундах), проверяется ping перед выдачей
+    'health_check_idle_seconds': 30.0
+}
+
+# Настройки ML-классификации
+ml_config = {
+    # Максимальное число образцов в одном пакетном запросе
+    'batch_max_samples': 10000,
+    # Окно ожидания микробатчинга одиночных запросов, мс
+    'inference_batch_window_ms': 2,
+    # Максимальное число строк в одном микробатче
+    'inference_max_batch_size': 64,
+    # Число синтетических образцов на сорт при обучении
+    'samples_per_class': 10,
+    # Гиперпараметры сети по умолчанию (подбираются tune_model.py, см. tuning_config)
+    'network': {
+        'hidden_units': [128, 64, 32],
+        'dropout': 0.3,
+        'learning_rate': 0.001,
+        'batch_size': 32
+    },
+    # Максимальное число эпох и терпение ранней остановки по val_loss
+    'max_epochs': 50,
+    'early_stopping_patience': 5,
+    # Дообучение после правок: эпохи, шаг обучения и replay-образцы неизменённых сортов
+    'fine_tune_epochs': 10,
+    'fine_tune_learning_rate': 0.0005,
+    'replay_samples_per_class': 3,
+    # Полное обучение - не реже чем раз в столько часов или при падении точности ниже порога
+    'full_retrain_interval_hours': 24,
+    'min_validation_accuracy': 0.8,
+    # Образцов на сорт в проверочной выборке
+    'validation_samples_per_class': 50,
+    # Зерно генератора синтетической выборки (выборки кэшируются в models/dataset_cache)
+    'training_seed': 0,
+    # Ограничения кэша выборок: общий размер в байтах и возраст записи в часах
+    'dataset_cache_max_bytes': 512 * 1024 * 1024,
+    'dataset_cache_max_age_hours': 168,
+    # Реестр моделей: как часто сверять указатель текущей версии (с) и сколько версий хранить
+    'registry_poll_interval': 2.0,
+    'registry_keep_versions': 5,
+    # Движок инференса: 'numpy' (.npz без TensorFlow) или 'keras'
+    'serving_engine': 'numpy',
+    # Загружать модель в фоне сразу при запуске (иначе - при первом запросе)
+    'preload_model': True,
+    # Сколько секунд запрос ждёт загрузки модели, прежде чем получить 503
+    'model_ready_timeout': 5.0
+}
+
+# Кэш результатов анализа (ML и статистического)
+cache_config = {
+    # Ограничения LRU-кэша: число записей и объём в байтах
+    'max_entries': 10000,
+    'max_bytes': 32 * 1024 * 1024,
+    # Точность ввода числовых характеристик (DECIMAL(10,2) в базе)
+    'numeric_precision': 2
+}
+
+# Подбор гиперпараметров (tune_model.py)
+tuning_config = {
+    # Сетка кандидатов: перебираются все сочетания
+    'hidden_units': [[128, 64, 32], [64, 32, 16], [64, 32], [32, 16], [32], [16]],
+    'dropout': [0.3, 0.1],
+    'learning_rate': [0.001, 0.003],
+    'batch_size': [32],
+    # Параллельные процессы обучения и потоков на каждый (без переподписки ядер)
+    'workers': 4,
+    'threads_per_worker': 1,
+    # Бюджет задержки одиночного предсказания, мс
+    'latency_budget_ms': 1.0,
+    # Допустимая потеря точности относительно лучшего кандидата
+    'accuracy_tolerance': 0.01
+}
+
+# Настройки кэширования базы знаний
+kb_config = {
+    # Как часто (в секундах) сверять версию базы знаний с хранилищем
+    'version_poll_interval': 1.0,
+    # Файл снимка (kb_snapshot.py export): если задан, база знаний читается из него,
+    # а не из хранилища - для быстрого холодного старта и развёртываний только для чтения
+    'snapshot_path': os.environ.get('KB_SNAPSHOT_PATH') or None
+}
@@ -0,0 +1,102 @@
+"""Кэш синтетических обучающих выборок на диске.
+
+Выборка однозначно определяется отпечатком базы знаний, раскладкой признаков,
+параметрами нормализации и настройками генератора, поэтому повторные обучения
+(смена гиперпараметров, перезапуск после сбоя, несколько воркеров) открывают
+готовые .npy через mmap вместо повторной генерации.
+"""
+import hashlib
+import json
+import os
+import shutil
+import time
+import numpy as np
+from config import ml_config
+from training_data import generate_training_set
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.path.join(BACKEND_DIR, 'models', 'dataset_cache')
+# Увеличивается при изменении алгоритма генерации, чтобы не читать старые выборки
+GENERATOR_VERSION = 1
+
+
+def dataset_key(snapshot, encoder, class_mapping, samples_per_class, seed):
+    """Ключ выборки: SHA-256 от всего, что влияет на её содержимое"""
+    content = {
+        'generator': GENERATOR_VERSION,
+        'kb_fingerprint': snapshot.fingerprint,
+        'columns': [list(key) for key in encoder.column_keys()],
+        'normalization': [encoder.mean.tolist(), encoder.scale.tolist()] if encoder.normalized else None,
+        'class_mapping': list(class_mapping),
+        'samples_per_class': samples_per_class,
+        'seed': seed
+    }
+    canonical = json.dumps(content, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def _entry_size(path):
+    return sum(
+        os.path.getsize(os.path.join(path, name)) for name in os.listdir(path)
+    )
+
+
+def evict(cache_dir=CACHE_DIR, max_bytes=None, max_age_hours=None):
+    """Удаляет записи старше max_age_hours и самые давние сверх max_bytes"""
+    if not os.path.isdir(cache_dir):
+        return
+    max_bytes = ml_config['dataset_cache_max_bytes'] if max_bytes is None else max_bytes
+    max_age_hours = ml_config['dataset_cache_max_age_hours'] if max_age_hours is None else max_age_hours
+
+    entries = []
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        if not os.path.isdir(path) or name.startswith('.'):
+            continue
+        try:
+            entries.append((os.path.getmtime(path), _entry_size(path), path))
+        except OSError:
+            continue
+
+    # Самые недавно использованные - первыми
+    entries.sort(reverse=True)
+    now = time.time()
+    total = 0
+    for used_at, size, path in entries:
+        total += size
+        if now - used_at > max_age_hours * 3600 or total > max_bytes:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def cached_training_set(snapshot, encoder, class_mapping, samples_per_class, seed, cache_dir=CACHE_DIR):
+    """Выборка generate_training_set из кэша (mmap) или сгенерированная и сохранённая в кэш"""
+    key = dataset_key(snapshot, encoder, class_mapping, samples_per_class, seed)
+    path = os.path.join(cache_dir, key)
+    try:
+        X = np.load(os.path.join(path, 'X.npy'), mmap_mode='r')
+        y = np.load(os.path.join(path, 'y.npy'), mmap_mode='r')
+        # Время изменения каталога отмечает последнее использование для вытеснения
+        os.utime(path)
+        print(f"Обучающая выборка загружена из кэша: {key[:12]}")
+        return X, y
+    except (OSError, ValueError):
+        pass
+
+    X, y = generate_training_set(snapshot, encoder, class_mapping, samples_per_class, seed=seed)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        # Пишем во временный каталог и переименовываем: параллельные воркеры
+        # не увидят недописанную выборку
+        tmp_path = os.path.join(cache_dir, f".{key}.{os.getpid()}.tmp")
+        os.makedirs(tmp_path, exist_ok=True)
+        np.save(os.path.join(tmp_path, 'X.npy'), X)
+        np.save(os.path.join(tmp_path, 'y.npy'), y)
+        try:
+            os.rename(tmp_path, path)
+        except OSError:
+            # Ту же выборку уже сохранил другой воркер
+            shutil.rmtree(tmp_path, ignore_errors=True)
+        evict(cache_dir)
+    except OSError as e:
+        print(f"Не удалось сохранить обучающую выборку в кэш: {e}")
+    return X, y
@@ -1,5 +1,186 @@
+"""Пул соединений с MySQL.
+
+Все модули берут соединения через get_db_connection(); close() возвращает
+соединение в пул. Соединения, выданные внутри запроса Flask, запоминаются и
+возвращаются в пул при завершении контекста приложения (см. init_app), поэтому
+забытый close() больше не оставляет открытых соединений.
+"""
+import os
+import threading
+import time
 import mysql.connector
-from config import db_config
+from mysql.connector.errors import PoolError
+from flask import g, has_app_context
+from config import db_config, db_pool_config
+
+
+class PooledConnection:
+    """Соединение из пула: close() возвращает его в пул вместо закрытия"""
+
+    def __init__(self, pool, connection):
+        self._pool = pool
+        self._connection = connection
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+    def close(self):
+        if self._connection is None:
+            return
+        connection, self._connection = self._connection, None
+        self._pool.release(connection)
+
+
+class ConnectionPool:
+    """Ограниченный пул соединений с ожиданием свободного и проверкой при выдаче"""
+
+    def __init__(self, config, size, borrow_timeout, health_check_idle_seconds):
+        self.config = config
+        self.size = size
+        self.borrow_timeout = borrow_timeout
+        self.health_check_idle_seconds = health_check_idle_seconds
+        self._idle = []          # (соединение, время возврата в пул)
+        self._open = 0
+        self._waiters = 0
+        self._condition = threading.Condition()
+        self._borrows = 0
+        self._timeouts = 0
+        self._health_check_failures = 0
+        self._wait_seconds_total = 0.0
+        self._wait_seconds_max = 0.0
+
+    def _healthy(self, connection, idle_since):
+        if time.monotonic() - idle_since < self.health_check_idle_seconds:
+            return True
+        try:
+            connection.ping(reconnect=False)
+            return True
+        except mysql.connector.Error:
+            return False
+
+    def _discard(self, connection):
+        try:
+            connection.close()
+        except mysql.connector.Error:
+            pass
+
+    def acquire(self):
+        """Свободное соединение из пула, новое (если пул не заполнен) или ожидание"""
+        started = time.monotonic()
+        deadline = started + self.borrow_timeout
+        with self._condition:
+            while True:
+                if self._idle:
+                    connection, idle_since = self._idle.pop()
+                    break
+                if self._open < self.size:
+                    connection, idle_since = None, None
+                    self._open += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolError(f"Нет свободных соединений с базой данных за {self.borrow_timeout} с")
+                self._waiters += 1
+                try:
+                    self._condition.wait(remaining)
+                finally:
+                    self._waiters -= 1
+            waited = time.monotonic() - started
+            self._borrows += 1
+            self._wait_seconds_total += waited
+            self._wait_seconds_max = max(self._wait_seconds_max, waited)
+
+        # Соединение устанавливается и проверяется вне блокировки
+        if connection is not None and not self._healthy(connection, idle_since):
+            with self._condition:
+                self._health_check_failures += 1
+            self._discard(connection)
+            connection = None
+        if connection is None:
+            try:
+                connection = mysql.connector.connect(**self.config)
+            except Exception:
+                with self._condition:
+                    self._open -= 1
+                    self._condition.notify()
+                raise
+        return PooledConnection(self, connection)
+
+    def release(self, connection):
+        """Возвращает соединение в пул, откатив незавершённую транзакцию"""
+        try:
+            # Следующий заёмщик не должен видеть чужую транзакцию и её снимок данных
+            if connection.in_transaction:
+                connection.rollback()
+            reusable = True
+        except mysql.connector.Error:
+            reusable = False
+        with self._condition:
+            if reusable:
+                self._idle.append((connection, time.monotonic()))
+            else:
+                self._open -= 1
+            self._condition.notify()
+        if not reusable:
+            self._discard(connection)
+
+    def metrics(self):
+        """Занятость пула и время ожидания соединений"""
+        with self._condition:
+            return {
+                'size': self.size,
+                'open': self._open,
+                'idle': len(self._idle),
+                'in_use': self._open - len(self._idle),
+                'waiters': self._waiters,
+                'borrows': self._borrows,
+                'timeouts': self._timeouts,
+                'health_check_failures': self._health_check_failures,
+                'wait_ms_total': round(self._wait_seconds_total * 1000, 3),
+                'wait_ms_max': round(self._wait_seconds_max * 1000, 3),
+                'wait_ms_avg': round(self._wait_seconds_total * 1000 / self._borrows, 3) if self._borrows else 0.0
+            }
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Пул текущего процесса (после fork дочерний процесс создаёт свой)"""
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ConnectionPool(
+                db_config,
+                db_pool_config['size'],
+                db_pool_config['borrow_timeout'],
+                db_pool_config['health_check_idle_seconds']
+            )
+            _pool_pid = os.getpid()
+        return _pool
+
 
 def get_db_connection():
-    return mysql.connector.connect(**db_config) 
\ No newline at end of file
+    """Соединение из пула; выданное внутри запроса вернётся в пул не позже его завершения"""
+    connection = get_pool().acquire()
+    if has_app_context():
+        g.setdefault('db_leases', []).append(connection)
+    return connection
+
+
+def release_request_connections(exception=None):
+    # Уже закрытые соединения пропускаются в PooledConnection.close()
+    for connection in g.pop('db_leases', []):
+        connection.close()
+
+
+def init_app(app):
+    """Возвращает незакрытые соединения запроса в пул при завершении контекста"""
+    app.teardown_appcontext(release_request_connections)
+
+
+def pool_metrics():
+    return get_pool().metrics()
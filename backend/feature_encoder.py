@@ -0,0 +1,112 @@
+import math
+import numpy as np
+
+
+def check_sample(sample):
+    """Проверяет формат образца и числовые значения; ValueError с описанием ошибки"""
+    characteristics = sample.get('characteristics') if isinstance(sample, dict) else None
+    if not isinstance(characteristics, dict):
+        raise ValueError("отсутствуют характеристики")
+    numeric_chars = characteristics.get('numeric', {})
+    categorical_chars = characteristics.get('categorical', {})
+    if not isinstance(numeric_chars, dict) or not isinstance(categorical_chars, dict):
+        raise ValueError("числовые и категориальные характеристики должны быть объектами")
+    for char_id, value in numeric_chars.items():
+        try:
+            number = None if isinstance(value, bool) else float(value)
+        except (ValueError, TypeError):
+            number = None
+        if number is None or not math.isfinite(number):
+            raise ValueError(f"значение {value!r} характеристики {char_id} не является числом")
+
+
+class FeatureEncoder:
+    """Кодировщик образцов в матрицу признаков модели.
+
+    Компилируется один раз для маппинга характеристик и scaler: порядок
+    столбцов, словари значение -> столбец и параметры нормализации хранятся
+    готовыми, поэтому кодирование не пересортировывает характеристики и не
+    обращается к scaler на каждый образец. Используется и при обучении, и при инференсе.
+    """
+
+    def __init__(self, mapping, scaler=None):
+        self.mapping = mapping
+        self.scaler = scaler
+        self.numeric_ids = sorted(mapping['numeric'].keys())
+        self.categorical_ids = sorted(mapping['categorical'].keys())
+        self.n_numeric = len(self.numeric_ids)
+
+        # id числовой характеристики -> столбец
+        self.numeric_columns = {char_id: column for column, char_id in enumerate(self.numeric_ids)}
+        # id категориальной характеристики -> {значение: столбец}
+        self.categorical_columns = {}
+        offset = self.n_numeric
+        for char_id in self.categorical_ids:
+            values = mapping['categorical'][char_id]['values']
+            self.categorical_columns[char_id] = {value: offset + index for index, value in enumerate(values)}
+            offset += len(values)
+        self.n_features = offset
+
+        # Параметры нормализации по столбцам числового блока
+        self.mean = np.zeros(self.n_numeric, dtype=np.float32)
+        self.scale = np.ones(self.n_numeric, dtype=np.float32)
+        self.normalized = scaler is not None
+        if scaler is not None:
+            self.mean, self.scale = scaler.parameters(self.numeric_ids)
+
+    def column_keys(self):
+        """Ключи столбцов: ('numeric', id) и ('categorical', id, значение)"""
+        keys = [('numeric', char_id) for char_id in self.numeric_ids]
+        for char_id in self.categorical_ids:
+            keys.extend(('categorical', char_id, value) for value in self.categorical_columns[char_id])
+        return keys
+
+    def normalize(self, X):
+        """Нормализует числовой блок матрицы на месте"""
+        if self.normalized and self.n_numeric:
+            numeric_block = X[:, :self.n_numeric]
+            numeric_block -= self.mean
+            numeric_block /= self.scale
+        return X
+
+    def encode_batch(self, samples, strict=False):
+        """Кодирует список образцов {'characteristics': {...}} в матрицу float32.
+
+        strict - нечисловое значение числовой характеристики вызывает ValueError
+        вместо нуля в столбце.
+        """
+        X = np.zeros((len(samples), self.n_features), dtype=np.float32)
+        for row, sample in enumerate(samples):
+            if strict:
+                try:
+                    check_sample(sample)
+                except ValueError as e:
+                    raise ValueError(f"Образец {row}: {e}")
+            if not isinstance(sample, dict) or not isinstance(sample.get('characteristics'), dict):
+                raise ValueError(f"Неверный формат образца {row}")
+            numeric_chars = sample['characteristics'].get('numeric', {})
+            categorical_chars = sample['characteristics'].get('categorical', {})
+            if not isinstance(numeric_chars, dict) or not isinstance(categorical_chars, dict):
+                raise ValueError(f"Неверный формат характеристик образца {row}")
+
+            # Проходим только по указанным в образце характеристикам
+            for char_id, value in numeric_chars.items():
+                column = self.numeric_columns.get(str(char_id))
+                if column is not None:
+                    try:
+                        X[row, column] = float(value)
+                    except (ValueError, TypeError):
+                        pass
+
+            for char_id, value in categorical_chars.items():
+                columns = self.categorical_columns.get(str(char_id))
+                if columns is not None:
+                    column = columns.get(str(value))
+                    if column is not None:
+                        X[row, column] = 1.0
+
+        return self.normalize(X)
+
+    def encode(self, sample):
+        """Кодирует один образец в матрицу 1 x n_features"""
+        return self.encode_batch([sample])
@@ -0,0 +1,80 @@
+"""Дообучение модели после небольших правок базы знаний.
+
+Вместо обучения с нуля текущая сеть переносится на новую раскладку признаков
+и классов (входной и выходной слои только расширяются) и дообучается на свежих
+образцах изменённых сортов плюс небольшой выборке остальных (replay).
+"""
+import numpy as np
+
+
+def affected_types(metadata, snapshot, class_mapping):
+    """Сорта, которые появились или изменились с момента обучения модели"""
+    trained = metadata.get('type_fingerprints', {})
+    return [
+        type_id for type_id in class_mapping
+        if trained.get(str(type_id)) != snapshot.type_fingerprints.get(type_id)
+    ]
+
+
+def can_grow(old_encoder, new_encoder, old_classes, new_classes):
+    """Новая раскладка получается из старой только добавлением столбцов и сортов"""
+    return (
+        set(old_encoder.column_keys()) <= set(new_encoder.column_keys())
+        and set(old_classes) <= set(new_classes)
+    )
+
+
+def grow_input_layer(kernel, bias, old_encoder, new_encoder, init_kernel):
+    """Переносит веса входного Dense на новую раскладку признаков.
+
+    Строки новых столбцов остаются со свежей инициализацией (у старых сортов
+    эти признаки нулевые). Числовые столбцы пересчитываются под новую
+    нормализацию: слой видел (x - m) / s, теперь получает (x - m') / s', поэтому
+    W' = W * s' / s и b' = b + W * (m' - m) / s - выход слоя не меняется.
+    """
+    new_kernel = np.array(init_kernel, dtype=np.float32, copy=True)
+    new_bias = np.array(bias, dtype=np.float32, copy=True)
+    new_columns = {key: column for column, key in enumerate(new_encoder.column_keys())}
+    for column, key in enumerate(old_encoder.column_keys()):
+        target = new_columns[key]
+        row = kernel[column]
+        if key[0] == 'numeric':
+            old_mean, old_scale = old_encoder.mean[column], old_encoder.scale[column]
+            new_mean, new_scale = new_encoder.mean[target], new_encoder.scale[target]
+            new_kernel[target] = row * (new_scale / old_scale)
+            new_bias += row * ((new_mean - old_mean) / old_scale)
+        else:
+            new_kernel[target] = row
+    return new_kernel, new_bias
+
+
+def grow_output_layer(kernel, bias, old_classes, new_classes, init_kernel):
+    """Переносит веса выходного Dense на новый список сортов"""
+    new_kernel = np.array(init_kernel, dtype=np.float32, copy=True)
+    # Новые сорта начинают со среднего смещения, чтобы не перетягивать вероятность
+    new_bias = np.full(len(new_classes), float(np.mean(bias)), dtype=np.float32)
+    old_index = {type_id: column for column, type_id in enumerate(old_classes)}
+    for column, type_id in enumerate(new_classes):
+        if type_id in old_index:
+            new_kernel[:, column] = kernel[:, old_index[type_id]]
+            new_bias[column] = bias[old_index[type_id]]
+    return new_kernel, new_bias
+
+
+def transfer_weights(old_model, new_model, old_encoder, new_encoder, old_classes, new_classes):
+    """Копирует веса старой сети в новую той же архитектуры с расширенными входом и выходом"""
+    old_layers = [layer for layer in old_model.layers if layer.get_weights()]
+    new_layers = [layer for layer in new_model.layers if layer.get_weights()]
+    if len(old_layers) != len(new_layers):
+        raise ValueError("Архитектуры старой и новой модели не совпадают")
+
+    last = len(new_layers) - 1
+    for index, (old_layer, new_layer) in enumerate(zip(old_layers, new_layers)):
+        weights = old_layer.get_weights()
+        if index == 0:
+            init_kernel = new_layer.get_weights()[0]
+            weights = list(grow_input_layer(weights[0], weights[1], old_encoder, new_encoder, init_kernel))
+        elif index == last:
+            init_kernel = new_layer.get_weights()[0]
+            weights = list(grow_output_layer(weights[0], weights[1], old_classes, new_classes, init_kernel))
+        new_layer.set_weights(weights)
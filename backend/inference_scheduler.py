@@ -0,0 +1,124 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+import numpy as np
+
+
+class _InferenceRequest:
+    def __init__(self, X):
+        self.X = X
+        self.future = Future()
+
+
+class InferenceScheduler:
+    """Микробатчинг запросов к модели.
+
+    Запросы, пришедшие в пределах окна ожидания (или до набора max_batch_size
+    строк), объединяются в одну матрицу и обрабатываются одним вызовом
+    predict_fn; каждый вызывающий получает свои строки результата.
+    """
+
+    def __init__(self, predict_fn, max_wait_ms=2, max_batch_size=64):
+        self.predict_fn = predict_fn
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_batch_size = max_batch_size
+        self._queue = queue.Queue()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        self._metrics_lock = threading.Lock()
+        self._batches = 0
+        self._requests = 0
+        self._rows = 0
+        self._max_batch_seen = 0
+        self._last_batch_size = 0
+        self._max_queue_depth = 0
+        self._batch_size_histogram = {}
+
+    def _ensure_worker(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='inference-scheduler', daemon=True)
+                self._thread.start()
+
+    def submit(self, X):
+        """Ставит матрицу признаков в очередь и возвращает Future с предсказаниями"""
+        self._ensure_worker()
+        request = _InferenceRequest(np.asarray(X, dtype=np.float32))
+        self._queue.put(request)
+        depth = self._queue.qsize()
+        with self._metrics_lock:
+            self._max_queue_depth = max(self._max_queue_depth, depth)
+        return request.future
+
+    def predict(self, X, timeout=None):
+        """Синхронное предсказание через общий пакет"""
+        return self.submit(X).result(timeout)
+
+    def _collect_batch(self):
+        batch = [self._queue.get()]
+        rows = len(batch[0].X)
+        deadline = time.perf_counter() + self.max_wait
+        while rows < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(request)
+            rows += len(request.X)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            # Запросы с разной размерностью признаков (после смены модели) не смешиваем
+            groups = {}
+            for request in batch:
+                groups.setdefault(request.X.shape[1], []).append(request)
+            for requests in groups.values():
+                self._process(requests)
+
+    def _process(self, requests):
+        X = np.vstack([request.X for request in requests])
+        try:
+            predictions = self.predict_fn(X)
+        except Exception as e:
+            for request in requests:
+                request.future.set_exception(e)
+            return
+
+        offset = 0
+        for request in requests:
+            rows = len(request.X)
+            request.future.set_result(predictions[offset:offset + rows])
+            offset += rows
+
+        with self._metrics_lock:
+            self._batches += 1
+            self._requests += len(requests)
+            self._rows += len(X)
+            self._last_batch_size = len(X)
+            self._max_batch_seen = max(self._max_batch_seen, len(X))
+            self._batch_size_histogram[len(X)] = self._batch_size_histogram.get(len(X), 0) + 1
+
+    def metrics(self):
+        """Метрики очереди и размеров пакетов"""
+        with self._metrics_lock:
+            return {
+                'queue_depth': self._queue.qsize(),
+                'max_queue_depth': self._max_queue_depth,
+                'batches': self._batches,
+                'requests': self._requests,
+                'rows': self._rows,
+                'avg_batch_size': round(self._rows / self._batches, 2) if self._batches else 0,
+                'last_batch_size': self._last_batch_size,
+                'max_batch_size': self._max_batch_seen,
+                'batch_size_histogram': dict(sorted(self._batch_size_histogram.items())),
+                'max_wait_ms': self.max_wait * 1000.0,
+                'max_batch_size_limit': self.max_batch_size
+            }
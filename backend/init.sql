@@ -63,6 +63,14 @@ CREATE TABLE IF NOT EXISTS coffee_categorical_characteristics (
     UNIQUE KEY unique_categorical_char_per_coffee (coffee_type_id, characteristic_id, categorical_value_id)
 );
 
+-- Версия базы знаний: увеличивается в транзакции каждой записи эксперта
+CREATE TABLE IF NOT EXISTS knowledge_base_version (
+    id TINYINT PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0
+);
+
+INSERT IGNORE INTO knowledge_base_version (id, version) VALUES (1, 0);
+
 -- Вставка базовых сортов кофе
 INSERT INTO coffee_types (name) VALUES
 ('Арабика'),
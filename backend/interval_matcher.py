@@ -0,0 +1,183 @@
+import numpy as np
+
+# Статусы проверки характеристики для сорта
+STATUS_UNDEFINED = 0  # характеристика не определена для сорта
+STATUS_MATCH = 1      # значение входит в диапазон / допустимые значения
+STATUS_MISMATCH = 2   # значение не подходит
+
+MATCH_DTYPE = np.dtype([
+    ('type_id', np.int64),
+    ('matches', np.bool_),
+    ('matched', np.int32),
+    ('checked', np.int32)
+])
+
+
+class MatchResult:
+    """Результат сопоставления образца со всеми сортами.
+
+    summary - структурированный массив MATCH_DTYPE (по строке на сорт),
+    status - матрица статусов (сорта x проверки),
+    checks - список проверок (тип, id характеристики, значение) в порядке столбцов status.
+    """
+
+    def __init__(self, matcher, summary, status, checks):
+        self.matcher = matcher
+        self.summary = summary
+        self.status = status
+        self.checks = checks
+
+    def first_match(self):
+        """Индекс первого полностью подходящего сорта или None"""
+        matching = np.flatnonzero(self.summary['matches'])
+        return int(matching[0]) if matching.size else None
+
+    def reasons(self, row):
+        """Формирует текстовые обоснования только для запрошенного сорта"""
+        snapshot = self.matcher.snapshot
+        type_id = int(self.summary['type_id'][row])
+        reasons = []
+        for column, (kind, char_id, value) in enumerate(self.checks):
+            char_name_ru = snapshot.characteristic_name(char_id)
+            status = self.status[row, column]
+            if status == STATUS_UNDEFINED:
+                reasons.append(f"Характеристика '{char_name_ru}' не определена для данного сорта")
+            elif kind == 'numeric':
+                min_val, max_val = snapshot.numeric_ranges[type_id][int(char_id)]
+                verdict = 'входит' if status == STATUS_MATCH else 'не входит'
+                reasons.append(
+                    f"Значение '{value}' для характеристики '{char_name_ru}' "
+                    f"{verdict} в допустимый диапазон [{min_val:.2f}, {max_val:.2f}]"
+                )
+            elif status == STATUS_MATCH:
+                reasons.append(
+                    f"Значение '{value}' для характеристики '{char_name_ru}' "
+                    f"соответствует требуемому значению '{value}'"
+                )
+            else:
+                expected = "', '".join(snapshot.categorical_assignments[type_id][int(char_id)])
+                reasons.append(
+                    f"Значение '{value}' для характеристики '{char_name_ru}' "
+                    f"не соответствует требуемому значению '{expected}'"
+                )
+        return reasons
+
+
+class IntervalMatcher:
+    """Векторизованное сопоставление образца с диапазонами всех сортов.
+
+    Числовые диапазоны хранятся плотными матрицами (сорта x характеристики),
+    категориальные назначения - булевыми масками (сорта x значения),
+    поэтому все сорта оцениваются одним широковещательным сравнением.
+    """
+
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+        self.type_ids = np.array([type_id for type_id, _ in snapshot.coffee_types], dtype=np.int64)
+        type_rows = {type_id: row for row, type_id in enumerate(self.type_ids.tolist())}
+        n_types = len(self.type_ids)
+
+        # Числовые характеристики: NaN означает, что диапазон не задан
+        numeric_ids = sorted({
+            char_id for ranges in snapshot.numeric_ranges.values() for char_id in ranges
+        })
+        self.numeric_columns = {char_id: column for column, char_id in enumerate(numeric_ids)}
+        self.min_values = np.full((n_types, len(numeric_ids)), np.nan)
+        self.max_values = np.full((n_types, len(numeric_ids)), np.nan)
+        for type_id, ranges in snapshot.numeric_ranges.items():
+            row = type_rows.get(type_id)
+            if row is None:
+                continue
+            for char_id, (min_value, max_value) in ranges.items():
+                column = self.numeric_columns[char_id]
+                self.min_values[row, column] = np.nan if min_value is None else min_value
+                self.max_values[row, column] = np.nan if max_value is None else max_value
+        self.numeric_defined = ~(np.isnan(self.min_values) | np.isnan(self.max_values))
+
+        # Категориальные характеристики: маска (сорта x значения) на характеристику
+        self.categorical_columns = {}
+        self.categorical_masks = {}
+        self.categorical_defined = {}
+        for type_id, assignments in snapshot.categorical_assignments.items():
+            row = type_rows.get(type_id)
+            if row is None:
+                continue
+            for char_id, values in assignments.items():
+                columns = self.categorical_columns.setdefault(char_id, {})
+                for value in values:
+                    columns.setdefault(value, len(columns))
+        for char_id, columns in self.categorical_columns.items():
+            mask = np.zeros((n_types, len(columns)), dtype=bool)
+            for type_id, assignments in snapshot.categorical_assignments.items():
+                row = type_rows.get(type_id)
+                if row is None or char_id not in assignments:
+                    continue
+                mask[row, [columns[value] for value in assignments[char_id]]] = True
+            self.categorical_masks[char_id] = mask
+            self.categorical_defined[char_id] = mask.any(axis=1)
+
+    def match(self, numeric_chars, categorical_chars):
+        """Сопоставляет образец со всеми сортами и возвращает MatchResult"""
+        n_types = len(self.type_ids)
+        checks = []
+        status_columns = []
+
+        numeric_items = list(numeric_chars.items())
+        if numeric_items:
+            columns = [self.numeric_columns.get(int(char_id), -1) for char_id, _ in numeric_items]
+            values = np.array([float(value) for _, value in numeric_items])
+            known = np.array(columns) >= 0
+            safe_columns = np.where(known, columns, 0)
+            if self.min_values.shape[1]:
+                min_values = self.min_values[:, safe_columns]
+                max_values = self.max_values[:, safe_columns]
+                defined = self.numeric_defined[:, safe_columns] & known
+            else:
+                min_values = max_values = np.zeros((n_types, len(columns)))
+                defined = np.zeros((n_types, len(columns)), dtype=bool)
+            with np.errstate(invalid='ignore'):
+                inside = (values >= min_values) & (values <= max_values)
+            status = np.where(defined, np.where(inside, STATUS_MATCH, STATUS_MISMATCH), STATUS_UNDEFINED)
+            status_columns.append(status.astype(np.int8))
+            checks.extend(('numeric', char_id, value) for char_id, value in numeric_items)
+
+        for char_id, value in categorical_chars.items():
+            mask = self.categorical_masks.get(int(char_id))
+            if mask is None:
+                status = np.full(n_types, STATUS_UNDEFINED, dtype=np.int8)
+            else:
+                column = self.categorical_columns[int(char_id)].get(value)
+                inside = mask[:, column] if column is not None else np.zeros(n_types, dtype=bool)
+                status = np.where(
+                    self.categorical_defined[int(char_id)],
+                    np.where(inside, STATUS_MATCH, STATUS_MISMATCH),
+                    STATUS_UNDEFINED
+                ).astype(np.int8)
+            status_columns.append(status[:, None])
+            checks.append(('categorical', char_id, value))
+
+        if status_columns:
+            status = np.hstack(status_columns)
+        else:
+            status = np.zeros((n_types, 0), dtype=np.int8)
+
+        summary = np.zeros(n_types, dtype=MATCH_DTYPE)
+        summary['type_id'] = self.type_ids
+        summary['matches'] = (status == STATUS_MATCH).all(axis=1)
+        summary['matched'] = (status == STATUS_MATCH).sum(axis=1)
+        summary['checked'] = (status != STATUS_UNDEFINED).sum(axis=1)
+        return MatchResult(self, summary, status, checks)
+
+    def match_by_name(self, input_data):
+        """Сопоставление для входных данных с ключами-названиями характеристик"""
+        numeric_chars = {}
+        categorical_chars = {}
+        for name, value in input_data.items():
+            char_id = self.snapshot.characteristic_ids_by_name.get(name)
+            if char_id is None:
+                continue
+            if self.snapshot.characteristics[char_id]['type'] == 'numeric':
+                numeric_chars[char_id] = value
+            else:
+                categorical_chars[char_id] = value
+        return self.match(numeric_chars, categorical_chars)
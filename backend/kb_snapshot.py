@@ -0,0 +1,64 @@
+"""Файл снимка базы знаний.
+
+Снимок (сорта, диапазоны, ограничения, значения и метаданные характеристик)
+сохраняется в сжатый .npz с заголовком: версия базы знаний, отпечаток и
+контрольная сумма данных. Процессы с KB_SNAPSHOT_PATH (kb_config['snapshot_path'])
+стартуют из файла без базы данных; train_worker.py --snapshot обучает по нему
+воспроизводимо.
+
+    python kb_snapshot.py export models/knowledge_base.npz
+    python kb_snapshot.py verify models/knowledge_base.npz
+    python kb_snapshot.py import models/knowledge_base.npz [--dry-run]
+"""
+import argparse
+import os
+import sys
+from knowledge_base import load_snapshot_from_db, load_snapshot_file, save_snapshot_file
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Экспорт и импорт снимка базы знаний')
+    commands = parser.add_subparsers(dest='command', required=True)
+    export_parser = commands.add_parser('export', help='Сохранить базу знаний из хранилища в файл')
+    export_parser.add_argument('path')
+    verify_parser = commands.add_parser('verify', help='Проверить контрольную сумму и отпечаток файла')
+    verify_parser.add_argument('path')
+    import_parser = commands.add_parser('import', help='Загрузить сорта из файла в хранилище (см. bulk_import.py)')
+    import_parser.add_argument('path')
+    import_parser.add_argument('--dry-run', action='store_true', help='Только проверить, ничего не записывая')
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'export':
+            header = save_snapshot_file(load_snapshot_from_db(), args.path)
+            print(
+                f"Снимок версии {header['version']} сохранён в {args.path} "
+                f"({os.path.getsize(args.path)} байт, сортов: {header['coffee_types']})"
+            )
+        elif args.command == 'verify':
+            snapshot = load_snapshot_file(args.path)
+            print(
+                f"Файл корректен: версия {snapshot.version}, сортов {len(snapshot.coffee_types)}, "
+                f"отпечаток {snapshot.fingerprint[:12]}"
+            )
+        elif args.command == 'import':
+            from bulk_import import CatalogError, import_catalog
+            try:
+                summary = import_catalog(load_snapshot_file(args.path).knowledge_base(), dry_run=args.dry_run)
+            except CatalogError as e:
+                print(e)
+                for error in e.errors:
+                    print(f"  {error}")
+                return 1
+            print(
+                f"Сортов: {summary['coffee_types']}, диапазонов: {summary['numeric_ranges']}, "
+                f"значений: {summary['categorical_values']}" + (" (проверка без записи)" if args.dry_run else "")
+            )
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Ошибка: {e}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,461 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime
+import numpy as np
+from config import kb_config
+from storage import get_repository
+from interval_matcher import IntervalMatcher
+from candidate_index import CandidateIndex
+
+CHARACTERISTIC_TRANSLATIONS = {
+    'acidity': 'Кислотность',
+    'bitterness': 'Горечь',
+    'sweetness': 'Сладость',
+    'density': 'Плотность',
+    'astringency': 'Терпкость',
+    'roasting_degree': 'Степень обжарки',
+    'grinding_degree': 'Степень помола',
+    'variety': 'Разновидность',
+    'processing_method': 'Метод обработки',
+    'region': 'Регион произрастания',
+    'roast_level': 'Степень обжарки',
+    'body': 'Тело',
+    'aroma': 'Аромат',
+    'aftertaste': 'Послевкусие',
+    'flavor': 'Вкус'
+}
+
+
+def _to_float(value):
+    return float(value) if value is not None else None
+
+
+class KnowledgeBaseSnapshot:
+    """Неизменяемый снимок базы знаний, собранный за фиксированное число запросов.
+
+    После создания снимок не модифицируется: при изменении данных
+    собирается новый снимок и целиком подменяет старый.
+    """
+
+    def __init__(self, coffee_types, characteristics, numeric_limits,
+                 categorical_values, numeric_ranges, categorical_assignments, version=None):
+        self.version = version
+        self.built_at = datetime.now()
+        # Сорта кофе в порядке id: (id, name)
+        self.coffee_types = tuple(coffee_types)
+        self.type_names = {type_id: name for type_id, name in self.coffee_types}
+        # id характеристики -> {'id', 'name', 'type'}
+        self.characteristics = characteristics
+        self.characteristic_ids_by_name = {
+            char['name']: char_id for char_id, char in characteristics.items()
+        }
+        # id характеристики -> (min, max) глобальных ограничений
+        self.numeric_limits = numeric_limits
+        # id характеристики -> ((value_id, value), ...) упорядоченные по значению
+        self.categorical_values = categorical_values
+        # id сорта -> {id характеристики: (min, max)}
+        self.numeric_ranges = numeric_ranges
+        # id сорта -> {id характеристики: (value, ...)}
+        self.categorical_assignments = categorical_assignments
+        # Отпечаток содержимого: совпадает у снимков с одинаковыми данными
+        self.fingerprint = self._compute_fingerprint()
+        # Отпечатки данных отдельных сортов: по ним дообучение находит изменённые сорта
+        self.type_fingerprints = {
+            type_id: self._compute_type_fingerprint(type_id) for type_id, _ in self.coffee_types
+        }
+        # Векторизованный сопоставитель диапазонов, общий для всех запросов
+        self.matcher = IntervalMatcher(self)
+        # Битовый индекс для быстрого отбора полностью подходящих сортов
+        self.candidate_index = CandidateIndex(self)
+        # Сериализованная база знаний и её ETag, строятся при первом запросе
+        self._knowledge_base_json = None
+
+    def _compute_fingerprint(self):
+        """SHA-256 от канонического представления данных, от которых зависит модель"""
+        content = {
+            'coffee_types': [list(item) for item in self.coffee_types],
+            'characteristics': [
+                [char_id, char['name'], char['type']] for char_id, char in sorted(self.characteristics.items())
+            ],
+            'categorical_values': [
+                [char_id, [value for _, value in values]] for char_id, values in sorted(self.categorical_values.items())
+            ],
+            'numeric_ranges': [
+                [type_id, [[char_id, list(bounds)] for char_id, bounds in sorted(ranges.items())]]
+                for type_id, ranges in sorted(self.numeric_ranges.items())
+            ],
+            'categorical_assignments': [
+                [type_id, [[char_id, sorted(values)] for char_id, values in sorted(chars.items())]]
+                for type_id, chars in sorted(self.categorical_assignments.items())
+            ]
+        }
+        canonical = json.dumps(content, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    def _compute_type_fingerprint(self, type_id):
+        """SHA-256 от диапазонов и значений одного сорта"""
+        content = {
+            'numeric_ranges': [
+                [char_id, list(bounds)] for char_id, bounds in sorted(self.numeric_ranges.get(type_id, {}).items())
+            ],
+            'categorical_assignments': [
+                [char_id, sorted(values)] for char_id, values in sorted(self.categorical_assignments.get(type_id, {}).items())
+            ]
+        }
+        canonical = json.dumps(content, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    def characteristic_name(self, char_id):
+        """Возвращает отображаемое (переведённое) название характеристики"""
+        char = self.characteristics.get(int(char_id))
+        if char is None:
+            return f"Характеристика {char_id}"
+        return CHARACTERISTIC_TRANSLATIONS.get(char['name'], char['name'])
+
+    def knowledge_base(self):
+        """Формирует полную базу знаний в формате /api/specialist/knowledge-base"""
+        result = []
+        for type_id, name in sorted(self.coffee_types, key=lambda item: item[1]):
+            numeric = [
+                {
+                    'id': char_id,
+                    'name': self.characteristics[char_id]['name'],
+                    'type': self.characteristics[char_id]['type'],
+                    'min_value': min_value,
+                    'max_value': max_value
+                }
+                for char_id, (min_value, max_value) in sorted(self.numeric_ranges.get(type_id, {}).items())
+            ]
+            categorical = [
+                {
+                    'id': char_id,
+                    'name': self.characteristics[char_id]['name'],
+                    'type': self.characteristics[char_id]['type'],
+                    'values': list(values)
+                }
+                for char_id, values in sorted(self.categorical_assignments.get(type_id, {}).items())
+            ]
+            result.append({
+                'id': type_id,
+                'name': name,
+                'characteristics': {
+                    'numeric': numeric,
+                    'categorical': categorical
+                }
+            })
+        return result
+
+
+    def knowledge_base_json(self):
+        """База знаний в виде готового JSON (bytes) и строгий ETag - SHA-256 тела.
+
+        Снимок неизменяем, поэтому сериализация выполняется один раз на снимок
+        (параллельные первые запросы могут посчитать её дважды - результат тот же).
+        """
+        if self._knowledge_base_json is None:
+            body = json.dumps(self.knowledge_base(), ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+            self._knowledge_base_json = (body, hashlib.sha256(body).hexdigest())
+        return self._knowledge_base_json
+
+
+def load_snapshot():
+    """Снимок базы знаний из файла kb_config['snapshot_path'], если он задан, иначе из хранилища"""
+    if kb_config['snapshot_path']:
+        return load_snapshot_file(kb_config['snapshot_path'])
+    return load_snapshot_from_db()
+
+
+def load_snapshot_from_db():
+    """Собирает снимок базы знаний из хранилища за фиксированное число запросов"""
+    data = get_repository().load_knowledge_base()
+
+    coffee_types = [(row['id'], row['name']) for row in data['coffee_types']]
+    characteristics = {
+        row['id']: {'id': row['id'], 'name': row['name'], 'type': row['type']}
+        for row in data['characteristics']
+    }
+    numeric_limits = {
+        row['characteristic_id']: (_to_float(row['min_value']), _to_float(row['max_value']))
+        for row in data['numeric_limits']
+    }
+
+    categorical_values = {}
+    for row in data['categorical_values']:
+        categorical_values.setdefault(row['characteristic_id'], []).append((row['id'], row['value']))
+    categorical_values = {char_id: tuple(values) for char_id, values in categorical_values.items()}
+
+    numeric_ranges = {}
+    for row in data['numeric_ranges']:
+        numeric_ranges.setdefault(row['coffee_type_id'], {})[row['characteristic_id']] = (
+            _to_float(row['min_value']), _to_float(row['max_value'])
+        )
+
+    categorical_assignments = {}
+    for row in data['categorical_assignments']:
+        categorical_assignments.setdefault(row['coffee_type_id'], {}).setdefault(
+            row['characteristic_id'], []
+        ).append(row['value'])
+    categorical_assignments = {
+        type_id: {char_id: tuple(values) for char_id, values in chars.items()}
+        for type_id, chars in categorical_assignments.items()
+    }
+
+    return KnowledgeBaseSnapshot(
+        coffee_types, characteristics, numeric_limits,
+        categorical_values, numeric_ranges, categorical_assignments, data['version']
+    )
+
+
+# Формат файла снимка; увеличивается при несовместимых изменениях
+SNAPSHOT_FORMAT = 1
+
+
+def _bounds(pairs):
+    """(min, max) с None -> массив [n, 2] float64 с NaN"""
+    return np.array(
+        [[np.nan if value is None else value for value in pair] for pair in pairs], dtype=np.float64
+    ).reshape(-1, 2)
+
+
+def _bounds_tuple(row):
+    return tuple(None if np.isnan(value) else float(value) for value in row)
+
+
+def _snapshot_arrays(snapshot):
+    """Содержимое снимка в виде плоских массивов (строки - unicode, без pickle)"""
+    characteristics = sorted(snapshot.characteristics.values(), key=lambda char: char['id'])
+    limits = sorted(snapshot.numeric_limits.items())
+    values = [
+        (char_id, value_id, value)
+        for char_id, char_values in sorted(snapshot.categorical_values.items())
+        for value_id, value in char_values
+    ]
+    ranges = [
+        (type_id, char_id, bounds)
+        for type_id, chars in sorted(snapshot.numeric_ranges.items())
+        for char_id, bounds in sorted(chars.items())
+    ]
+    assignments = [
+        (type_id, char_id, value)
+        for type_id, chars in sorted(snapshot.categorical_assignments.items())
+        for char_id, char_values in sorted(chars.items())
+        for value in char_values
+    ]
+    return {
+        'type_ids': np.array([type_id for type_id, _ in snapshot.coffee_types], dtype=np.int64),
+        'type_names': np.array([name for _, name in snapshot.coffee_types], dtype=str),
+        'char_ids': np.array([char['id'] for char in characteristics], dtype=np.int64),
+        'char_names': np.array([char['name'] for char in characteristics], dtype=str),
+        'char_types': np.array([char['type'] for char in characteristics], dtype=str),
+        'limit_char_ids': np.array([char_id for char_id, _ in limits], dtype=np.int64),
+        'limit_bounds': _bounds([bounds for _, bounds in limits]),
+        'value_char_ids': np.array([row[0] for row in values], dtype=np.int64),
+        'value_ids': np.array([row[1] for row in values], dtype=np.int64),
+        'values': np.array([row[2] for row in values], dtype=str),
+        'range_type_ids': np.array([row[0] for row in ranges], dtype=np.int64),
+        'range_char_ids': np.array([row[1] for row in ranges], dtype=np.int64),
+        'range_bounds': _bounds([row[2] for row in ranges]),
+        'assignment_type_ids': np.array([row[0] for row in assignments], dtype=np.int64),
+        'assignment_char_ids': np.array([row[1] for row in assignments], dtype=np.int64),
+        'assignment_values': np.array([row[2] for row in assignments], dtype=str)
+    }
+
+
+def _arrays_checksum(arrays):
+    """SHA-256 от имён, типов, размерностей и содержимого массивов"""
+    digest = hashlib.sha256()
+    for name in sorted(arrays):
+        array = np.ascontiguousarray(arrays[name])
+        digest.update(f"{name}:{array.dtype.str}:{array.shape};".encode('utf-8'))
+        digest.update(array.tobytes())
+    return digest.hexdigest()
+
+
+def save_snapshot_file(snapshot, path):
+    """Сохраняет снимок в сжатый .npz с JSON-заголовком; запись атомарная"""
+    arrays = _snapshot_arrays(snapshot)
+    header = {
+        'format': SNAPSHOT_FORMAT,
+        'version': snapshot.version,
+        'fingerprint': snapshot.fingerprint,
+        'exported_at': datetime.now().isoformat(),
+        'coffee_types': len(snapshot.coffee_types),
+        'checksum': _arrays_checksum(arrays)
+    }
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.savez_compressed(
+            f, header=np.frombuffer(json.dumps(header).encode('utf-8'), dtype=np.uint8), **arrays
+        )
+    os.replace(tmp_path, path)
+    return header
+
+
+def read_snapshot_header(path):
+    """Заголовок файла снимка (массивы данных не читаются)"""
+    with np.load(path, allow_pickle=False) as data:
+        return json.loads(data['header'].tobytes().decode('utf-8'))
+
+
+def load_snapshot_file(path):
+    """Восстанавливает снимок из файла, проверяя контрольную сумму и отпечаток"""
+    with np.load(path, allow_pickle=False) as data:
+        header = json.loads(data['header'].tobytes().decode('utf-8'))
+        arrays = {name: data[name] for name in data.files if name != 'header'}
+    if header.get('format') != SNAPSHOT_FORMAT:
+        raise ValueError(f"Неподдерживаемый формат файла снимка: {header.get('format')}")
+    if _arrays_checksum(arrays) != header['checksum']:
+        raise ValueError(f"Контрольная сумма файла снимка {path} не совпадает: файл повреждён")
+
+    coffee_types = list(zip(arrays['type_ids'].tolist(), arrays['type_names'].tolist()))
+    characteristics = {
+        char_id: {'id': char_id, 'name': name, 'type': char_type}
+        for char_id, name, char_type in zip(
+            arrays['char_ids'].tolist(), arrays['char_names'].tolist(), arrays['char_types'].tolist()
+        )
+    }
+    numeric_limits = {
+        char_id: _bounds_tuple(bounds)
+        for char_id, bounds in zip(arrays['limit_char_ids'].tolist(), arrays['limit_bounds'])
+    }
+    categorical_values = {}
+    for char_id, value_id, value in zip(
+        arrays['value_char_ids'].tolist(), arrays['value_ids'].tolist(), arrays['values'].tolist()
+    ):
+        categorical_values.setdefault(char_id, []).append((value_id, value))
+    numeric_ranges = {}
+    for type_id, char_id, bounds in zip(
+        arrays['range_type_ids'].tolist(), arrays['range_char_ids'].tolist(), arrays['range_bounds']
+    ):
+        numeric_ranges.setdefault(type_id, {})[char_id] = _bounds_tuple(bounds)
+    categorical_assignments = {}
+    for type_id, char_id, value in zip(
+        arrays['assignment_type_ids'].tolist(), arrays['assignment_char_ids'].tolist(),
+        arrays['assignment_values'].tolist()
+    ):
+        categorical_assignments.setdefault(type_id, {}).setdefault(char_id, []).append(value)
+
+    snapshot = KnowledgeBaseSnapshot(
+        coffee_types, characteristics, numeric_limits,
+        {char_id: tuple(values) for char_id, values in categorical_values.items()},
+        numeric_ranges,
+        {
+            type_id: {char_id: tuple(values) for char_id, values in chars.items()}
+            for type_id, chars in categorical_assignments.items()
+        },
+        header['version']
+    )
+    if snapshot.fingerprint != header['fingerprint']:
+        raise ValueError(f"Отпечаток снимка из {path} не совпадает с заголовком")
+    return snapshot
+
+def fetch_version():
+    """Читает версию базы знаний напрямую из хранилища (или заголовка файла снимка), минуя кэш"""
+    if kb_config['snapshot_path']:
+        # Файл можно атомарно заменить новым экспортом - процессы перейдут на него
+        return read_snapshot_header(kb_config['snapshot_path'])['version']
+    return get_repository().read_version()
+
+
+_version = None
+_version_checked_at = None
+_version_lock = threading.Lock()
+
+
+def _version_is_fresh():
+    return (_version_checked_at is not None
+            and time.monotonic() - _version_checked_at < kb_config['version_poll_interval'])
+
+
+def get_version():
+    """Версия базы знаний, проверяемая в хранилище не чаще раза в version_poll_interval секунд"""
+    global _version, _version_checked_at
+    if _version_is_fresh():
+        return _version
+
+    with _version_lock:
+        if _version_is_fresh():
+            return _version
+        try:
+            _version = fetch_version()
+        except Exception as e:
+            print(f"Ошибка при чтении версии базы знаний: {e}")
+        _version_checked_at = time.monotonic()
+        return _version
+
+
+_snapshot = None
+_snapshot_stale = True
+_snapshot_lock = threading.Lock()
+
+
+def _snapshot_is_current(snapshot, version):
+    if snapshot is None or _snapshot_stale:
+        return False
+    # Без версии (старая схема) полагаемся только на флаг устаревания
+    if version is None or snapshot.version is None:
+        return True
+    return snapshot.version >= version
+
+
+def get_snapshot():
+    """Возвращает текущий снимок базы знаний, пересобирая его при смене версии"""
+    global _snapshot, _snapshot_stale
+    version = get_version()
+    snapshot = _snapshot
+    if _snapshot_is_current(snapshot, version):
+        return snapshot
+
+    with _snapshot_lock:
+        if _snapshot_is_current(_snapshot, version):
+            return _snapshot
+        # Сбрасываем флаг до загрузки, чтобы изменения во время сборки не потерялись
+        _snapshot_stale = False
+        try:
+            new_snapshot = load_snapshot()
+        except Exception as e:
+            _snapshot_stale = True
+            if _snapshot is None:
+                raise
+            print(f"Ошибка при обновлении снимка базы знаний, используется предыдущий: {e}")
+            return _snapshot
+        # Подмена ссылки атомарна: читатели видят либо старый, либо новый снимок
+        _snapshot = new_snapshot
+        return new_snapshot
+
+
+def is_snapshot_loaded():
+    """Загружен ли снимок базы знаний (без обращения к базе)"""
+    return _snapshot is not None
+
+
+def invalidate_snapshot():
+    """Сообщает о локальной записи: версия будет перечитана при следующем обращении"""
+    global _snapshot_stale, _version_checked_at
+    _snapshot_stale = True
+    _version_checked_at = None
+
+
+# Ответы API, производные от базы знаний: имя -> (версия, значение)
+_derived = {}
+
+
+def cached_for_version(name, build):
+    """Значение build(), пересчитываемое только при смене версии базы знаний.
+
+    Все пути записи эксперта повышают версию, поэтому кэш не устаревает;
+    если версия недоступна, значение строится при каждом вызове.
+    """
+    version = get_version()
+    cached = _derived.get(name)
+    if version is not None and cached is not None and cached[0] == version:
+        return cached[1]
+    value = build()
+    if version is not None:
+        _derived[name] = (version, value)
+    return value
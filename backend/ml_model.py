@@ -1,18 +1,138 @@
 import numpy as np
-from sklearn.preprocessing import StandardScaler, LabelEncoder
-import tensorflow as tf
-from tensorflow.keras import layers, models
-import mysql.connector
-from config import db_config
+from config import ml_config, cache_config
 import json
 import os
+import threading
+import time
 from datetime import datetime
-import pandas as pd
 import joblib
-from db import get_db_connection
+from inference_scheduler import InferenceScheduler
+from result_cache import ResultCache, cache_key, canonical_characteristics
+from dataset_cache import cached_training_set
+from feature_encoder import FeatureEncoder
+from range_scaler import RangeScaler
+from incremental_training import affected_types, can_grow, transfer_weights
+from numpy_inference import NumpyPredictor, export_numpy_model, numpy_model_path
+from model_trainer import BackgroundTrainer
+import model_registry
+from knowledge_base import get_snapshot, get_version, load_snapshot
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+MODELS_DIR = os.path.join(BACKEND_DIR, 'models')
+# Прежнее расположение модели; при первом запуске переносится в реестр (model_registry)
+MODEL_PATH = os.path.join(MODELS_DIR, 'coffee_classifier.h5')
+
+
+def _tensorflow():
+    """Ленивый импорт TensorFlow: нужен для обучения и загрузки .h5, но не для NumPy-инференса"""
+    import tensorflow as tf
+    return tf
+
+
+# Гиперпараметры, выбранные tune_model.py; перекрывают ml_config['network']
+NETWORK_PATH = os.path.join(MODELS_DIR, 'network.json')
+
+
+def network_config():
+    """Гиперпараметры сети: ml_config['network'] с учётом результата подбора"""
+    network = dict(ml_config['network'])
+    if os.path.exists(NETWORK_PATH):
+        try:
+            with open(NETWORK_PATH, encoding='utf-8') as f:
+                network.update(json.load(f))
+        except (OSError, ValueError) as e:
+            print(f"Ошибка при чтении подобранных гиперпараметров: {e}")
+    network['hidden_units'] = list(network['hidden_units'])
+    return network
+
+
+def build_network(tf, n_features, n_classes, network=None):
+    """Архитектура классификатора: MLP с BatchNormalization после каждого скрытого слоя
+    и Dropout после всех скрытых слоёв, кроме последнего"""
+    network = network or network_config()
+    layers, models = tf.keras.layers, tf.keras.models
+    hidden_units = network['hidden_units']
+    stack = []
+    for index, units in enumerate(hidden_units):
+        if index == 0:
+            stack.append(layers.Dense(units, activation='relu', input_shape=(n_features,)))
+        else:
+            stack.append(layers.Dense(units, activation='relu'))
+        stack.append(layers.BatchNormalization())
+        if index < len(hidden_units) - 1 and network['dropout'] > 0:
+            stack.append(layers.Dropout(network['dropout']))
+    if not hidden_units:
+        stack.append(layers.InputLayer(input_shape=(n_features,)))
+    stack.append(layers.Dense(n_classes, activation='softmax'))
+    return models.Sequential(stack)
+
+
+def metadata_path(model_path):
+    """Путь к файлу метаданных, сопровождающему модель"""
+    return os.path.splitext(model_path)[0] + '.json'
+
+
+def load_model_metadata(model_path):
+    """Читает метаданные модели или возвращает None, если их нет"""
+    path = metadata_path(model_path)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def training_summary(metadata):
+    """Режим, точность и время полного обучения из метаданных модели"""
+    return {
+        'mode': metadata.get('training_mode'),
+        'validation_accuracy': metadata.get('validation_accuracy'),
+        'full_trained_at': metadata.get('full_trained_at')
+    }
+
+
+def layout_from_mapping(mapping):
+    """Порядок признаков модели в сериализуемом виде"""
+    return {
+        'numeric': [
+            {'id': char_id, 'name': mapping['numeric'][char_id]}
+            for char_id in sorted(mapping['numeric'].keys())
+        ],
+        'categorical': [
+            {'id': char_id, 'name': mapping['categorical'][char_id]['name'],
+             'values': list(mapping['categorical'][char_id]['values'])}
+            for char_id in sorted(mapping['categorical'].keys())
+        ]
+    }
+
+
+def mapping_from_layout(layout):
+    """Восстанавливает маппинг характеристик из сохранённого порядка признаков"""
+    return {
+        'numeric': {char['id']: char['name'] for char in layout['numeric']},
+        'categorical': {
+            char['id']: {'name': char['name'], 'values': list(char['values'])}
+            for char in layout['categorical']
+        }
+    }
+
+
+def mapping_from_snapshot(snapshot):
+    """Маппинг характеристик: все числовые и категориальные со всеми их значениями"""
+    characteristics = sorted(snapshot.characteristics.values(), key=lambda char: char['id'])
+    return {
+        'numeric': {str(char['id']): char['name'] for char in characteristics if char['type'] == 'numeric'},
+        'categorical': {
+            str(char['id']): {
+                'name': char['name'],
+                'values': [value for _, value in snapshot.categorical_values.get(char['id'], ())]
+            }
+            for char in characteristics if char['type'] == 'categorical'
+        }
+    }
+
 
 class CoffeeClassifier:
-    def __init__(self):
+    def __init__(self, load_artifacts=True):
         self.model = None
         self.label_encoders = {}
         self.scaler = None
@@ -22,79 +142,80 @@ class CoffeeClassifier:
         self.categorical_features = {}
         self.model_initialized = False
         self.last_training_time = None
+        # Планировщик объединяет одновременные запросы в один вызов модели
+        # Кэш предсказаний: ключ - каноническая форма образца и версия модели
+        self.result_cache = ResultCache(cache_config['max_entries'], cache_config['max_bytes'])
+        self.scheduler = InferenceScheduler(
+            self._predict_matrix,
+            max_wait_ms=ml_config['inference_batch_window_ms'],
+            max_batch_size=ml_config['inference_max_batch_size']
+        )
+        
+        # Версия обслуживаемой модели увеличивается при каждой подмене
+        self.model_version = 0
+        self._swap_lock = threading.Lock()
+        # Версия базы знаний, на которой обучена текущая модель
+        self.trained_kb_version = None
+        # id сорта для каждого выхода модели (None - старая модель без метаданных)
+        self.class_mapping = None
+        self._requested_version = None
+        # Версия реестра, которую обслуживает процесс, и время последней сверки с CURRENT
+        self.serving_version = None
+        self._registry_checked_at = None
+        self._activate_lock = threading.Lock()
+        # Режим и точность последнего обучения обслуживаемой модели (из метаданных)
+        self.training_summary = {}
+        self.trainer = BackgroundTrainer(self)
+        # Кодировщик признаков, компилируется по маппингу и scaler (см. get_encoder)
+        self._encoder = None
         
         # Инициализация в правильном порядке
         self.load_characteristic_mapping()  # Сначала загружаем маппинг
         self.load_characteristics()         # Затем характеристики
+        if not load_artifacts:
+            # Процессу обучения нужен только маппинг; scaler вычисляется при обучении
+            return
         self.initialize_model()            # Инициализируем модель
         self.load_model()                  # Загружаем или создаем модель
         self.load_encoders()               # Загружаем энкодеры
-        self.load_scaler()                 # Загружаем scaler
+        # Scaler приходит из метаданных модели (см. model_state)
 
     def load_characteristics(self):
+        """Характеристики, заданные хотя бы у одного сорта (по снимку базы знаний)"""
         try:
-            conn = mysql.connector.connect(**db_config)
-            cursor = conn.cursor()
-            
-            # Получаем числовые характеристики
-            cursor.execute("""
-                SELECT DISTINCT c.id, c.name 
-                FROM characteristics c
-                INNER JOIN coffee_numeric_characteristics cnc ON c.id = cnc.characteristic_id
-                WHERE c.type = 'numeric'
-                ORDER BY c.id
-            """)
-            self.numeric_features = [(row[0], row[1]) for row in cursor.fetchall()]
-            
-            # Получаем категориальные характеристики
-            cursor.execute("""
-                SELECT c.id, c.name, GROUP_CONCAT(DISTINCT cv.value ORDER BY cv.value) as possible_values
-                FROM characteristics c
-                INNER JOIN coffee_categorical_characteristics ccc ON c.id = ccc.characteristic_id
-                LEFT JOIN categorical_values cv ON c.id = cv.characteristic_id
-                WHERE c.type = 'categorical'
-                GROUP BY c.id, c.name
-                ORDER BY c.id
-            """)
-            for row in cursor.fetchall():
-                char_id, char_name, values = row
-                if values:
-                    self.categorical_features[char_id] = {
-                        'name': char_name,
-                        'values': values.split(',')
-                    }
-            
-            cursor.close()
-            conn.close()
+            snapshot = get_snapshot()
+            numeric_ids = {char_id for ranges in snapshot.numeric_ranges.values() for char_id in ranges}
+            self.numeric_features = [
+                (char_id, snapshot.characteristics[char_id]['name']) for char_id in sorted(numeric_ids)
+            ]
+            categorical_ids = {char_id for chars in snapshot.categorical_assignments.values() for char_id in chars}
+            self.categorical_features = {
+                char_id: {
+                    'name': snapshot.characteristics[char_id]['name'],
+                    'values': [value for _, value in snapshot.categorical_values[char_id]]
+                }
+                for char_id in sorted(categorical_ids)
+                if snapshot.categorical_values.get(char_id)
+            }
         except Exception as e:
             print(f"Ошибка при загрузке характеристик: {e}")
 
     def initialize_model(self):
         try:
-            conn = mysql.connector.connect(**db_config)
-            cursor = conn.cursor()
-            
-            # Получаем количество классов
-            cursor.execute("SELECT COUNT(*) FROM coffee_types")
-            self.n_classes = cursor.fetchone()[0]
+            self.n_classes = len(get_snapshot().coffee_types)
             
             # Вычисляем размерность входных данных
             n_numeric = len(self.numeric_features)
             n_categorical_values = sum(len(feat['values']) for feat in self.categorical_features.values())
             n_features = n_numeric + n_categorical_values
             
+            if ml_config['serving_engine'] != 'keras':
+                # Для NumPy-инференса заготовка Keras-модели не нужна
+                self.model_initialized = True
+                return
+            
             # Создаем модель
-            self.model = models.Sequential([
-                layers.Dense(128, activation='relu', input_shape=(n_features,)),
-                layers.BatchNormalization(),
-                layers.Dropout(0.3),
-                layers.Dense(64, activation='relu'),
-                layers.BatchNormalization(),
-                layers.Dropout(0.3),
-                layers.Dense(32, activation='relu'),
-                layers.BatchNormalization(),
-                layers.Dense(self.n_classes, activation='softmax')
-            ])
+            self.model = build_network(_tensorflow(), n_features, self.n_classes)
             
             self.model.compile(
                 optimizer='adam',
@@ -102,19 +223,22 @@ class CoffeeClassifier:
                 metrics=['accuracy']
             )
             
-            cursor.close()
-            conn.close()
             self.model_initialized = True
         except Exception as e:
             print(f"Ошибка при инициализации модели: {e}")
 
     def load_model(self):
-        """Загружает модель из файла или создает новую"""
+        """Загружает текущую версию из реестра или обучает новую модель"""
         try:
-            model_path = os.path.join('models', 'coffee_classifier.h5')
-            if os.path.exists(model_path):
-                print("Загрузка существующей модели...")
-                self.model = tf.keras.models.load_model(model_path)
+            version = model_registry.current_version()
+            if version is None and os.path.exists(MODEL_PATH):
+                # Переносим модель из прежнего расположения в реестр
+                print("Перенос существующей модели в реестр...")
+                version = model_registry.register(MODEL_PATH, move=False)
+                model_registry.promote(version)
+            if version is not None:
+                print(f"Загрузка модели версии {version}...")
+                self.activate_version(version)
             else:
                 print("Модель не найдена, начинаем обучение...")
                 self.train_model()
@@ -123,59 +247,173 @@ class CoffeeClassifier:
             print("Создаем новую модель...")
             self.train_model()
 
+    def load_serving_model(self, model_path, metadata=None):
+        """Загружает модель для обслуживания запросов.
+
+        При serving_engine == 'numpy' используется .npz-экспорт того же обучения
+        (TensorFlow не импортируется); если экспорта нет или он от другого
+        обучения, загружается .h5 и экспорт создаётся заново.
+        """
+        npz_path = numpy_model_path(model_path)
+        if ml_config['serving_engine'] == 'numpy' and os.path.exists(npz_path):
+            predictor = NumpyPredictor.load(npz_path)
+            if metadata and predictor.metadata.get('trained_at') == metadata.get('trained_at'):
+                print("Загружена NumPy-модель")
+                return predictor
+        
+        model = _tensorflow().keras.models.load_model(model_path)
+        if ml_config['serving_engine'] == 'numpy' and metadata:
+            try:
+                return export_numpy_model(model, npz_path, metadata)
+            except Exception as e:
+                print(f"Не удалось экспортировать модель в NumPy, используется Keras: {e}")
+        return model
+
+    def model_state(self, metadata, trained_at=None, kb_version=None):
+        """Состояние классификатора для модели с данными метаданными.
+
+        Если отпечаток совпадает с текущей базой знаний, модель считается актуальной
+        и не переобучается после перезапуска или отката.
+        """
+        if not metadata:
+            print("Метаданные модели не найдены, модель будет переобучена")
+            return {
+                'mapping': self.fetch_characteristic_mapping(),
+                'scaler': None,
+                'class_mapping': None,
+                'trained_at': trained_at,
+                'kb_version': kb_version,
+                'summary': {}
+            }
+        state = {
+            'mapping': mapping_from_layout(metadata['feature_layout']),
+            'scaler': None,
+            'class_mapping': metadata['class_mapping'],
+            'trained_at': datetime.fromisoformat(metadata['trained_at']),
+            'kb_version': metadata['kb_version'],
+            'summary': training_summary(metadata)
+        }
+        try:
+            snapshot = get_snapshot()
+        except Exception as e:
+            print(f"Не удалось сверить отпечаток базы знаний: {e}")
+            snapshot = None
+        if 'numeric_scaler' in metadata:
+            state['scaler'] = RangeScaler.from_dict(metadata['numeric_scaler'])
+        else:
+            # Модель обучена со старым общим scaler: нормализуем по текущим данным до переобучения
+            print("В метаданных модели нет параметров нормализации, модель будет переобучена")
+            state['kb_version'] = None
+            if snapshot is not None:
+                state['scaler'] = self.compute_scaler(snapshot, state['class_mapping'], state['mapping'])
+            return state
+        if snapshot is not None:
+            if metadata['kb_fingerprint'] == snapshot.fingerprint:
+                # Данные не менялись с момента обучения - переобучение не требуется
+                state['kb_version'] = snapshot.version
+            else:
+                print("База знаний изменилась с момента обучения модели")
+        return state
+
+    def validate_model(self, model, state):
+        """Проверяет размерности и выход модели перед введением в работу"""
+        mapping = state['mapping']
+        n_features = len(mapping['numeric']) + sum(
+            len(char['values']) for char in mapping['categorical'].values()
+        )
+        if model.input_shape[-1] != n_features:
+            raise ValueError(
+                f"Размерность входа модели {model.input_shape[-1]} не совпадает с числом признаков {n_features}"
+            )
+        if state['class_mapping'] is not None and model.output_shape[-1] != len(state['class_mapping']):
+            raise ValueError("Число выходов модели не совпадает с числом сортов в метаданных")
+        probe = model.predict(np.zeros((1, n_features), dtype=np.float32), verbose=0)
+        if not np.all(np.isfinite(probe)) or abs(float(np.sum(probe)) - 1.0) > 1e-3:
+            raise ValueError("Модель возвращает некорректные вероятности")
+
+    def activate_version(self, version):
+        """Загружает версию из реестра, проверяет её и атомарно подменяет обслуживаемую модель"""
+        path = model_registry.model_path(version)
+        metadata = load_model_metadata(path)
+        model = self.load_serving_model(path, metadata)
+        state = self.model_state(metadata)
+        self.validate_model(model, state)
+        with self._swap_lock:
+            self.characteristic_mapping = state['mapping']
+            self.scaler = state['scaler']
+            self._encoder = FeatureEncoder(state['mapping'], state['scaler'])
+            self.n_classes = model.output_shape[-1]
+            self.class_mapping = state['class_mapping']
+            self.model = model
+            self.model_version += 1
+            self.serving_version = version
+            self.last_training_time = state['trained_at']
+            self.trained_kb_version = state['kb_version']
+            self.training_summary = state['summary']
+        print(f"Модель версии {version} введена в работу")
+
+    def sync_registry(self, force=False):
+        """Подхватывает версию, продвинутую другим процессом (обучение, CLI, API другого воркера).
+
+        Указатель CURRENT перечитывается не чаще registry_poll_interval секунд.
+        """
+        now = time.monotonic()
+        if not force and self._registry_checked_at is not None \
+                and now - self._registry_checked_at < ml_config['registry_poll_interval']:
+            return False
+        self._registry_checked_at = now
+        version = model_registry.current_version()
+        if version is None or version == self.serving_version:
+            return False
+        # Активирует один поток; остальные продолжают обслуживать текущей моделью
+        if not self._activate_lock.acquire(blocking=False):
+            return False
+        try:
+            if version != self.serving_version:
+                self.activate_version(version)
+            return True
+        finally:
+            self._activate_lock.release()
+
+    def save_model_metadata(self, model_path, snapshot, class_mapping, trained_at, training):
+        """Сохраняет метаданные обученной модели рядом с её файлом и возвращает их"""
+        metadata = {
+            'kb_fingerprint': snapshot.fingerprint,
+            'kb_version': snapshot.version,
+            'type_fingerprints': {str(type_id): fingerprint for type_id, fingerprint in snapshot.type_fingerprints.items()},
+            'feature_layout': layout_from_mapping(training['mapping']),
+            'class_mapping': class_mapping,
+            'numeric_scaler': training['scaler'].to_dict(),
+            'trained_at': trained_at.isoformat(),
+            'training_mode': training.get('mode', 'full'),
+            'network': training.get('network'),
+            'full_trained_at': (training.get('full_trained_at') or trained_at).isoformat(),
+            'validation_accuracy': training.get('validation_accuracy')
+        }
+        with open(metadata_path(model_path), 'w', encoding='utf-8') as f:
+            json.dump(metadata, f, ensure_ascii=False, indent=2)
+        return metadata
+
     def load_encoders(self):
         try:
-            encoders_path = os.path.join('models', 'label_encoders.joblib')
+            encoders_path = os.path.join(MODELS_DIR, 'label_encoders.joblib')
             if os.path.exists(encoders_path):
                 self.label_encoders = joblib.load(encoders_path)
         except Exception as e:
             print(f"Ошибка при загрузке энкодеров: {e}")
 
-    def load_scaler(self):
-        try:
-            scaler_path = os.path.join('models', 'scaler.joblib')
-            if os.path.exists(scaler_path):
-                self.scaler = joblib.load(scaler_path)
-            else:
-                self.scaler = StandardScaler()
-                self.fit_scaler()
-        except Exception as e:
-            print(f"Ошибка при загрузке scaler: {e}")
-            self.scaler = StandardScaler()
+    def compute_scaler(self, snapshot, class_mapping, mapping=None):
+        """Параметры нормализации числовых характеристик по диапазонам сортов"""
+        mapping = mapping or self.characteristic_mapping
+        return RangeScaler.from_snapshot(snapshot, class_mapping, sorted(mapping['numeric'].keys()))
+
+    def fetch_characteristic_mapping(self):
+        """Маппинг характеристик по текущему снимку базы знаний, не изменяя состояние классификатора"""
+        return mapping_from_snapshot(get_snapshot())
 
     def load_characteristic_mapping(self):
         try:
-            conn = get_db_connection()
-            cursor = conn.cursor(dictionary=True)
-            
-            # Получаем числовые характеристики
-            cursor.execute("""
-                SELECT id, name 
-                FROM characteristics 
-                WHERE type = 'numeric'
-                ORDER BY id
-            """)
-            numeric_chars = cursor.fetchall()
-            
-            # Получаем категориальные характеристики
-            cursor.execute("""
-                SELECT c.id, c.name, GROUP_CONCAT(DISTINCT cv.value) as possible_values
-                FROM characteristics c
-                LEFT JOIN categorical_values cv ON c.id = cv.characteristic_id
-                WHERE c.type = 'categorical'
-                GROUP BY c.id, c.name
-                ORDER BY c.id
-            """)
-            categorical_chars = cursor.fetchall()
-            
-            # Создаем маппинг
-            self.characteristic_mapping = {
-                'numeric': {str(char['id']): char['name'] for char in numeric_chars},
-                'categorical': {str(char['id']): {
-                    'name': char['name'],
-                    'values': char['possible_values'].split(',') if char['possible_values'] else []
-                } for char in categorical_chars}
-            }
+            self.characteristic_mapping = self.fetch_characteristic_mapping()
             
             print("Загружен маппинг характеристик:")
             print("Числовые характеристики:", self.characteristic_mapping['numeric'])
@@ -184,137 +422,52 @@ class CoffeeClassifier:
         except Exception as e:
             print(f"Ошибка при загрузке маппинга характеристик: {e}")
             self.characteristic_mapping = {'numeric': {}, 'categorical': {}}
-        finally:
-            cursor.close()
-            conn.close()
 
-    def fit_scaler(self):
-        try:
-            conn = get_db_connection()
-            cursor = conn.cursor(dictionary=True)
-            
-            # Получаем все числовые значения
-            cursor.execute("""
-                SELECT cnc.characteristic_id, cnc.min_value, cnc.max_value
-                FROM coffee_numeric_characteristics cnc
-                JOIN characteristics c ON c.id = cnc.characteristic_id
-                WHERE c.type = 'numeric'
-                ORDER BY cnc.characteristic_id
-            """)
-            numeric_values = cursor.fetchall()
-            
-            if numeric_values:
-                # Преобразуем в numpy array, сохраняя порядок характеристик
-                values = []
-                for char_id in sorted(self.characteristic_mapping['numeric'].keys()):
-                    char_values = [v for v in numeric_values if str(v['characteristic_id']) == str(char_id)]
-                    if char_values:
-                        values.append([char_values[0]['min_value'], char_values[0]['max_value']])
-                    else:
-                        values.append([0.0, 0.0])
-                
-                values = np.array(values)
-                print("Размерность данных для обучения scaler:", values.shape)
-                
-                # Обучаем scaler на двумерных данных
-                self.scaler = StandardScaler()
-                # Преобразуем данные в нужный формат (n_samples, n_features)
-                values_reshaped = values.reshape(-1, 1)
-                self.scaler.fit(values_reshaped)
-                
-                # Сохраняем scaler
-                os.makedirs('models', exist_ok=True)
-                joblib.dump(self.scaler, os.path.join('models', 'scaler.joblib'))
-                
-        except Exception as e:
-            print(f"Ошибка при обучении scaler: {e}")
-        finally:
-            cursor.close()
-            conn.close()
+    def get_encoder(self):
+        """Кодировщик признаков для текущих маппинга и scaler.
+
+        Маппинг и scaler заменяются целиком при смене модели, поэтому кодировщик
+        компилируется заново только когда меняется один из этих объектов.
+        """
+        encoder = self._encoder
+        if encoder is None or encoder.mapping is not self.characteristic_mapping or encoder.scaler is not self.scaler:
+            encoder = FeatureEncoder(self.characteristic_mapping, self.scaler)
+            self._encoder = encoder
+        return encoder
 
     def prepare_input_data(self, input_data):
         try:
             if not isinstance(input_data, dict) or 'characteristics' not in input_data:
                 raise ValueError("Неверный формат входных данных")
-                
-            characteristics = input_data['characteristics']
-            if not isinstance(characteristics, dict):
-                raise ValueError("Неверный формат характеристик")
-                
-            numeric_chars = characteristics.get('numeric', {})
-            categorical_chars = characteristics.get('categorical', {})
-            
-            if not isinstance(numeric_chars, dict) or not isinstance(categorical_chars, dict):
-                raise ValueError("Неверный формат числовых или категориальных характеристик")
-            
-            # Подготавливаем числовые характеристики
-            numeric_features = []
-            for char_id in sorted(self.characteristic_mapping['numeric'].keys()):
-                try:
-                    if str(char_id) in numeric_chars:
-                        value = float(numeric_chars[str(char_id)])
-                        numeric_features.append(value)
-                    else:
-                        numeric_features.append(0.0)
-                except (ValueError, TypeError):
-                    numeric_features.append(0.0)
-            
-            # Подготавливаем категориальные характеристики
-            categorical_features = []
-            for char_id in sorted(self.characteristic_mapping['categorical'].keys()):
-                if str(char_id) in categorical_chars:
-                    value = str(categorical_chars[str(char_id)])
-                    char_values = self.characteristic_mapping['categorical'][char_id]['values']
-                    # One-hot encoding для категориального значения
-                    one_hot = [1 if v == value else 0 for v in char_values]
-                    categorical_features.extend(one_hot)
-                else:
-                    # Если значение не указано, заполняем нулями
-                    char_values = self.characteristic_mapping['categorical'][char_id]['values']
-                    categorical_features.extend([0] * len(char_values))
-            
-            # Нормализуем числовые признаки
-            if self.scaler is not None and numeric_features:
-                try:
-                    # Преобразуем числовые признаки в двумерный массив
-                    numeric_array = np.array(numeric_features).reshape(-1, 1)
-                    print("Размерность числовых признаков перед нормализацией:", numeric_array.shape)
-                    normalized_numeric = self.scaler.transform(numeric_array)
-                    numeric_features = normalized_numeric.flatten().tolist()
-                except Exception as e:
-                    print(f"Ошибка при нормализации числовых признаков: {e}")
-            
-            # Объединяем все признаки
-            features = numeric_features + categorical_features
-            
-            return np.array([features])
+            return self.get_encoder().encode(input_data)
         except Exception as e:
             print(f"Ошибка при подготовке входных данных: {e}")
             return None
 
+    def prepare_batch_input_data(self, samples):
+        """Кодирует список образцов в одну матрицу признаков за один проход"""
+        return self.get_encoder().encode_batch(samples, strict=True)
+
     def check_for_updates(self):
-        """Проверяет, нужно ли переобучить модель"""
+        """Подхватывает продвинутую версию модели и проверяет, нужно ли переобучение"""
         try:
-            conn = mysql.connector.connect(**db_config)
-            cursor = conn.cursor()
-            
-            # Проверяем последнее обновление данных
-            cursor.execute("""
-                SELECT MAX(GREATEST(
-                    (SELECT MAX(updated_at) FROM coffee_types),
-                    (SELECT MAX(updated_at) FROM coffee_numeric_characteristics),
-                    (SELECT MAX(updated_at) FROM coffee_categorical_characteristics)
-                )) as last_update
-            """)
-            last_update = cursor.fetchone()[0]
-            
-            cursor.close()
-            conn.close()
-            
-            # Если есть обновления, переобучаем модель
-            if not self.last_training_time or (last_update and last_update > self.last_training_time):
-                print("Обнаружены изменения в данных. Переобучение модели...")
-                self.train_model()
+            self.sync_registry()
+        except Exception as e:
+            print(f"Ошибка при переходе на новую версию модели: {e}")
+        
+        try:
+            # Версия базы знаний кэшируется в процессе и сверяется с MySQL не чаще
+            # version_poll_interval секунд, поэтому запрос к БД не делается на каждый вызов
+            version = get_version()
+            if version is None:
+                return False
+            
+            # Если есть обновления, переобучаем модель в фоне; запросы обслуживает текущая модель
+            if self.trained_kb_version is None or version > self.trained_kb_version:
+                if version != self._requested_version:
+                    self._requested_version = version
+                    print("Обнаружены изменения в данных. Запуск фонового переобучения модели...")
+                    self.trainer.request_retrain(reason='data_changed')
                 return True
                 
         except Exception as e:
@@ -322,139 +475,285 @@ class CoffeeClassifier:
             
         return False
 
-    def train_model(self):
+    def validation_accuracy(self, model, snapshot, encoder, class_mapping):
+        """Точность модели на свежей синтетической выборке по всем сортам"""
+        X_val, y_val = cached_training_set(
+            snapshot, encoder, class_mapping, ml_config['validation_samples_per_class'],
+            seed=ml_config['training_seed'] + 1
+        )
+        predictions = model.predict(X_val, batch_size=max(len(X_val), 1), verbose=0)
+        return float(np.mean(np.argmax(predictions, axis=1) == y_val))
+
+    def fit_full_model(self, tf, snapshot, class_mapping, samples_per_class, network=None):
+        """Обучение модели с нуля по всем сортам"""
+        network = network or network_config()
+        mapping = self.characteristic_mapping
+        # Нормализация считается по тем же диапазонам, из которых генерируется выборка
+        scaler = self.compute_scaler(snapshot, class_mapping, mapping)
+        encoder = FeatureEncoder(mapping, scaler)
+        
+        # Обучающие данные по всем сортам: из кэша или векторной генерацией
+        X_data, y_data = cached_training_set(
+            snapshot, encoder, class_mapping, samples_per_class, seed=ml_config['training_seed']
+        )
+        
+        if not len(X_data):
+            raise ValueError("Не удалось сгенерировать обучающие данные")
+        
+        print("Размерность обучающих данных:", X_data.shape)
+        print("Размерность меток:", y_data.shape)
+        
+        # Преобразуем метки в one-hot encoding
+        y_data = tf.keras.utils.to_categorical(y_data, num_classes=len(class_mapping))
+        
+        # Создаем и компилируем модель
+        model = build_network(tf, X_data.shape[1], len(class_mapping), network)
+        model.compile(
+            optimizer=tf.keras.optimizers.Adam(learning_rate=network['learning_rate']),
+            loss='categorical_crossentropy',
+            metrics=['accuracy']
+        )
+        
+        # Обучаем модель; на нормализованных по характеристикам входах она сходится
+        # быстрее, поэтому обучение останавливается, когда val_loss перестаёт улучшаться
+        history = model.fit(
+            X_data, y_data,
+            epochs=ml_config['max_epochs'],
+            batch_size=network['batch_size'],
+            validation_split=0.2,
+            callbacks=[tf.keras.callbacks.EarlyStopping(
+                monitor='val_loss',
+                patience=ml_config['early_stopping_patience'],
+                restore_best_weights=True
+            )],
+            verbose=1
+        )
+        return {
+            'model': model,
+            'mapping': mapping,
+            'scaler': scaler,
+            'history': history,
+            'mode': 'full',
+            'network': network,
+            'full_trained_at': None,
+            'validation_accuracy': self.validation_accuracy(model, snapshot, encoder, class_mapping)
+        }
+
+    def fine_tune_model(self, tf, snapshot, class_mapping, samples_per_class):
+        """Дообучает текущую модель после небольших правок базы знаний.
+
+        Входной и выходной слои расширяются под новые признаки и сорта, сеть
+        дообучается на свежих образцах изменённых сортов и replay-выборке остальных.
+        Возвращает None, если нужно полное обучение: нет базовой модели, подошёл
+        срок планового обучения, что-то удалено или точность ниже порога.
+        """
+        base_path = model_registry.current_model_path()
+        metadata = load_model_metadata(base_path) if base_path else None
+        if not metadata or not os.path.exists(base_path) or 'type_fingerprints' not in metadata:
+            print("Нет базовой модели с метаданными, выполняется полное обучение")
+            return None
+        full_trained_at = datetime.fromisoformat(metadata['full_trained_at'])
+        if (datetime.now() - full_trained_at).total_seconds() > ml_config['full_retrain_interval_hours'] * 3600:
+            print("Подошёл срок планового полного обучения")
+            return None
+        
+        network = network_config()
+        if metadata.get('network') != network:
+            print("Гиперпараметры сети изменились, выполняется полное обучение")
+            return None
+        
+        old_classes = metadata['class_mapping']
+        old_encoder = FeatureEncoder(
+            mapping_from_layout(metadata['feature_layout']),
+            RangeScaler.from_dict(metadata['numeric_scaler'])
+        )
+        mapping = self.characteristic_mapping
+        scaler = self.compute_scaler(snapshot, class_mapping, mapping)
+        encoder = FeatureEncoder(mapping, scaler)
+        if not can_grow(old_encoder, encoder, old_classes, class_mapping):
+            print("Удалены характеристики, значения или сорта, выполняется полное обучение")
+            return None
+        
+        changed = affected_types(metadata, snapshot, class_mapping)
+        print(f"Дообучение модели: изменено сортов {len(changed)} из {len(class_mapping)}")
+        model = build_network(tf, encoder.n_features, len(class_mapping), network)
+        transfer_weights(tf.keras.models.load_model(base_path), model, old_encoder, encoder, old_classes, class_mapping)
+        
+        # Свежие образцы изменённых сортов и небольшой replay остальных, чтобы не забыть их
+        class_index = {type_id: index for index, type_id in enumerate(class_mapping)}
+        changed_set = set(changed)
+        unchanged = [type_id for type_id in class_mapping if type_id not in changed_set]
+        X_parts, y_parts = [], []
+        for types, count in ((changed, samples_per_class), (unchanged, ml_config['replay_samples_per_class'])):
+            if not types or not count:
+                continue
+            X_part, y_part = cached_training_set(snapshot, encoder, types, count, seed=ml_config['training_seed'])
+            X_parts.append(X_part)
+            y_parts.append(np.array([class_index[type_id] for type_id in types])[y_part])
+        if not X_parts:
+            return None
+        X_data = np.concatenate(X_parts)
+        y_data = tf.keras.utils.to_categorical(np.concatenate(y_parts), num_classes=len(class_mapping))
+        
+        model.compile(
+            optimizer=tf.keras.optimizers.Adam(learning_rate=ml_config['fine_tune_learning_rate']),
+            loss='categorical_crossentropy',
+            metrics=['accuracy']
+        )
+        history = model.fit(
+            X_data, y_data,
+            epochs=ml_config['fine_tune_epochs'],
+            batch_size=network['batch_size'],
+            shuffle=True,
+            verbose=1
+        )
+        
+        accuracy = self.validation_accuracy(model, snapshot, encoder, class_mapping)
+        print(f"Точность дообученной модели на проверочной выборке: {accuracy:.3f}")
+        if accuracy < ml_config['min_validation_accuracy']:
+            print("Точность ниже порога, выполняется полное обучение")
+            return None
+        return {
+            'model': model,
+            'mapping': mapping,
+            'scaler': scaler,
+            'history': history,
+            'mode': 'incremental',
+            'network': network,
+            'full_trained_at': full_trained_at,
+            'validation_accuracy': accuracy
+        }
+
+    def save_trained_model(self, training, snapshot, class_mapping, model_path, trained_at):
+        """Сохраняет обученную модель с метаданными и NumPy-экспортом.
+
+        Обслуживаемая модель не меняется: в работу модель вводит swap_model
+        после проверки, вместе с её маппингом и scaler.
+        """
+        os.makedirs(os.path.dirname(model_path) or '.', exist_ok=True)
+        training['model'].save(model_path)
+        metadata = self.save_model_metadata(model_path, snapshot, class_mapping, trained_at, training)
+        try:
+            export_numpy_model(training['model'], numpy_model_path(model_path), metadata)
+        except Exception as e:
+            print(f"Не удалось экспортировать модель в NumPy: {e}")
+        return metadata
+
+    def train_model(self, model_path=None, samples_per_class=None, mode='full'):
+        """Обучает модель и сохраняет её с метаданными.
+
+        mode='auto' сначала пробует дообучить текущую модель (fine_tune_model)
+        и переходит к полному обучению, если дообучение неприменимо.
+        """
         try:
             print("Начало обучения модели...")
-            conn = mysql.connector.connect(**db_config)
-            cursor = conn.cursor()
-            
-            # Получаем все типы кофе
-            cursor.execute("SELECT id, name FROM coffee_types ORDER BY id")
-            coffee_types = cursor.fetchall()
-            self.n_classes = len(coffee_types)
-            
-            X_data = []
-            y_data = []
-            
-            # Генерируем обучающие данные
-            for coffee_id, _ in coffee_types:
-                # Получаем числовые характеристики
-                cursor.execute("""
-                    SELECT cnc.characteristic_id, cnc.min_value, cnc.max_value
-                    FROM coffee_numeric_characteristics cnc
-                    JOIN characteristics c ON c.id = cnc.characteristic_id
-                    WHERE cnc.coffee_type_id = %s AND c.type = 'numeric'
-                """, (coffee_id,))
-                numeric_results = cursor.fetchall()
-                
-                # Генерируем несколько образцов для каждого типа кофе
-                n_samples = 10
-                for _ in range(n_samples):
-                    numeric_chars = {}
-                    for char_id, min_val, max_val in numeric_results:
-                        # Генерируем случайное значение в диапазоне
-                        value = np.random.uniform(min_val, max_val)
-                        numeric_chars[str(char_id)] = value
-                    
-                    # Получаем категориальные характеристики
-                    cursor.execute("""
-                        SELECT ccc.characteristic_id, cv.value
-                        FROM coffee_categorical_characteristics ccc
-                        JOIN categorical_values cv ON ccc.categorical_value_id = cv.id
-                        JOIN characteristics c ON c.id = ccc.characteristic_id
-                        WHERE ccc.coffee_type_id = %s AND c.type = 'categorical'
-                    """, (coffee_id,))
-                    categorical_chars = {str(row[0]): row[1] for row in cursor.fetchall()}
-                    
-                    # Подготавливаем входные данные
-                    input_data = {
-                        'characteristics': {
-                            'numeric': numeric_chars,
-                            'categorical': categorical_chars
-                        }
-                    }
-                    
-                    print("Подготовка входных данных:", input_data)
-                    X = self.prepare_input_data(input_data)
-                    
-                    if X is not None:
-                        X_data.append(X[0])
-                        y_data.append(coffee_id - 1)  # -1 для 0-based индексации
-                    else:
-                        print("Пропуск образца из-за ошибки подготовки данных")
-            
-            if not X_data:
-                raise ValueError("Не удалось сгенерировать обучающие данные")
-            
-            # Преобразуем данные в numpy массивы
-            X_data = np.array(X_data)
-            y_data = np.array(y_data)
-            
-            print("Размерность обучающих данных:", X_data.shape)
-            print("Размерность меток:", y_data.shape)
-            
-            # Преобразуем метки в one-hot encoding
-            y_data = tf.keras.utils.to_categorical(y_data, num_classes=self.n_classes)
-            
-            # Создаем и компилируем модель
-            n_features = X_data.shape[1]
-            self.model = models.Sequential([
-                layers.Dense(128, activation='relu', input_shape=(n_features,)),
-                layers.BatchNormalization(),
-                layers.Dropout(0.3),
-                layers.Dense(64, activation='relu'),
-                layers.BatchNormalization(),
-                layers.Dropout(0.3),
-                layers.Dense(32, activation='relu'),
-                layers.BatchNormalization(),
-                layers.Dense(self.n_classes, activation='softmax')
-            ])
-            
-            self.model.compile(
-                optimizer=tf.keras.optimizers.Adam(learning_rate=0.001),
-                loss='categorical_crossentropy',
-                metrics=['accuracy']
-            )
-            
-            # Обучаем модель
-            history = self.model.fit(
-                X_data, y_data,
-                epochs=50,
-                batch_size=32,
-                validation_split=0.2,
-                verbose=1
-            )
-            
-            # Обновляем время последнего обучения
-            self.last_training_time = datetime.now()
-            
-            # Сохраняем модель
-            os.makedirs('models', exist_ok=True)
-            self.model.save(os.path.join('models', 'coffee_classifier.h5'))
-            
-            cursor.close()
-            conn.close()
+            # Снимок фиксирует версию и отпечаток данных, на которых обучается модель
+            snapshot = load_snapshot()
+            # Выход модели i соответствует сорту class_mapping[i]
+            class_mapping = [coffee_id for coffee_id, _ in snapshot.coffee_types]
+            samples_per_class = samples_per_class or ml_config['samples_per_class']
+            tf = _tensorflow()
+            
+            training = None
+            if mode == 'auto':
+                try:
+                    training = self.fine_tune_model(tf, snapshot, class_mapping, samples_per_class)
+                except Exception as e:
+                    print(f"Ошибка при дообучении модели, выполняется полное обучение: {e}")
+            if training is None:
+                training = self.fit_full_model(tf, snapshot, class_mapping, samples_per_class)
             
-            print("Обучение модели завершено")
-            return history
+            trained_at = datetime.now()
+            if model_path is not None:
+                self.save_trained_model(training, snapshot, class_mapping, model_path, trained_at)
+            else:
+                # Обучение в процессе сервера: модель проверяется, публикуется в реестре
+                # и вводится в работу тем же путём, что и версии из фонового обучения
+                staging_path = os.path.join(
+                    MODELS_DIR, f"coffee_classifier.staging-{trained_at.strftime('%Y%m%d%H%M%S%f')}.h5"
+                )
+                try:
+                    self.save_trained_model(training, snapshot, class_mapping, staging_path, trained_at)
+                    self.swap_model(staging_path, trained_at, snapshot.version)
+                finally:
+                    # После регистрации файлов уже нет; остаются только при ошибке
+                    model_registry.discard_artifacts(staging_path)
+            print(f"Обучение модели завершено (режим: {training['mode']})")
+            return training['history']
             
         except Exception as e:
             print(f"Ошибка при обучении модели: {e}")
             return None
 
+    def swap_model(self, model_path, trained_at, kb_version=None):
+        """Проверяет обученную модель, регистрирует её в реестре и вводит в работу.
+
+        Если текущая версия закреплена вручную, новая версия только регистрируется.
+        """
+        metadata = load_model_metadata(model_path)
+        model = self.load_serving_model(model_path, metadata)
+        self.validate_model(model, self.model_state(metadata, trained_at, kb_version))
+        
+        version = model_registry.register(model_path)
+        print(f"Модель зарегистрирована как версия {version}")
+        if model_registry.promote(version, automatic=True):
+            self.activate_version(version)
+        return version
+
+    def model_status(self):
+        """Версия обслуживаемой модели и состояние фонового обучения"""
+        status = self.trainer.status()
+        status['model_version'] = self.model_version
+        status['trained_at'] = self.last_training_time
+        status['trained_kb_version'] = self.trained_kb_version
+        status['training'] = self.training_summary
+        status['registry_version'] = self.serving_version
+        return status
+
+    def _predict_matrix(self, X):
+        """Один проход модели по всей матрице признаков"""
+        return self.model.predict(X, batch_size=max(len(X), 1), verbose=0)
+
+    def canonical_input(self, input_data):
+        """Каноническая форма образца или None, если формат не распознан или значения точнее ввода"""
+        characteristics = input_data.get('characteristics') if isinstance(input_data, dict) else None
+        if not isinstance(characteristics, dict):
+            return None
+        numeric_chars = characteristics.get('numeric', {})
+        categorical_chars = characteristics.get('categorical', {})
+        if not isinstance(numeric_chars, dict) or not isinstance(categorical_chars, dict):
+            return None
+        canonical = canonical_characteristics(numeric_chars, categorical_chars, cache_config['numeric_precision'])
+        if canonical is None:
+            # Значения точнее ввода считаются как есть, без кэша
+            return None
+        numeric, categorical = canonical
+        return {'characteristics': {'numeric': numeric, 'categorical': categorical}}
+
     def predict(self, input_data):
         try:
             # Проверяем обновления
             self.check_for_updates()
             
+            # Одинаковые (с точностью ввода) образцы считаются один раз на версию модели
+            canonical = self.canonical_input(input_data)
+            model_version = self.model_version
+            key = None
+            if canonical is not None:
+                input_data = canonical
+                key = cache_key('predict', model_version, canonical['characteristics'])
+                found, predictions = self.result_cache.get(key)
+                if found:
+                    return predictions.copy()
+            
             # Подготавливаем входные данные
             X = self.prepare_input_data(input_data)
             
             if X is None:
                 raise ValueError("Ошибка при подготовке входных данных")
             
-            # Получаем предсказания
-            predictions = self.model.predict(X, verbose=0)
+            # Получаем предсказания (в общем пакете с параллельными запросами)
+            predictions = self.scheduler.predict(X)
             
             print("Сырые предсказания:", predictions)
             print("Сумма вероятностей:", np.sum(predictions))
@@ -463,6 +762,9 @@ class CoffeeClassifier:
             predictions = predictions / np.sum(predictions, axis=1, keepdims=True)
             print("Нормализованные предсказания:", predictions)
             
+            # Если модель сменилась во время расчёта, результат не кэшируется
+            if key is not None and model_version == self.model_version:
+                self.result_cache.put(key, predictions.copy())
             return predictions
             
         except Exception as e:
@@ -470,6 +772,82 @@ class CoffeeClassifier:
             # Возвращаем равномерное распределение в случае ошибки
             return np.ones((1, self.n_classes)) / self.n_classes
 
+    def predict_batch(self, samples):
+        """Предсказывает вероятности для списка образцов одним проходом модели"""
+        self.check_for_updates()
+
+        X = self.prepare_batch_input_data(samples)
+        predictions = self._predict_matrix(X)
+
+        return predictions / np.sum(predictions, axis=1, keepdims=True)
+
+
+# Общий для всех обработчиков экземпляр классификатора, строится в фоне
+_classifier = None
+_classifier_thread = None
+_classifier_lock = threading.Lock()
+_classifier_status = {
+    'status': 'not_started',
+    'error': None,
+    'started_at': None,
+    'ready_at': None,
+    'load_seconds': None
+}
+
+
+def _load_classifier():
+    global _classifier
+    started = time.perf_counter()
+    try:
+        get_snapshot()  # Прогреваем снимок базы знаний
+        classifier = CoffeeClassifier()
+    except Exception as e:
+        print(f"Ошибка при загрузке классификатора: {e}")
+        with _classifier_lock:
+            _classifier_status.update({'status': 'failed', 'error': str(e)})
+        return
+    
+    load_seconds = time.perf_counter() - started
+    print(f"Классификатор загружен за {load_seconds:.2f} с")
+    with _classifier_lock:
+        _classifier = classifier
+        _classifier_status.update({
+            'status': 'ready',
+            'ready_at': datetime.now(),
+            'load_seconds': round(load_seconds, 3)
+        })
+
+
+def start_classifier_loading():
+    """Запускает построение общего классификатора в фоновом потоке (если ещё не запущено)"""
+    global _classifier_thread
+    with _classifier_lock:
+        if _classifier is not None:
+            return _classifier_thread
+        if _classifier_thread is not None and _classifier_thread.is_alive():
+            return _classifier_thread
+        _classifier_status.update({'status': 'loading', 'error': None, 'started_at': datetime.now()})
+        _classifier_thread = threading.Thread(target=_load_classifier, name='classifier-loader', daemon=True)
+        _classifier_thread.start()
+        return _classifier_thread
+
+
+def get_classifier(timeout=None):
+    """Возвращает общий классификатор, при необходимости запуская его загрузку.
+
+    Ждёт не дольше timeout секунд (None - до конца загрузки); если классификатор
+    за это время не готов, возвращает None.
+    """
+    if _classifier is None:
+        thread = start_classifier_loading()
+        if timeout != 0:
+            thread.join(timeout)
+    return _classifier
+
 
-# Создаем экземпляр классификатора
-classifier = CoffeeClassifier() 
\ No newline at end of file
+def classifier_status():
+    """Состояние загрузки общего классификатора"""
+    with _classifier_lock:
+        status = dict(_classifier_status)
+    status['model_loaded'] = _classifier is not None and _classifier.model is not None
+    return status
@@ -0,0 +1,322 @@
+"""Реестр версий модели.
+
+Каждая версия - неизменяемый каталог models/registry/versions/vNNNNNN с файлами
+model.h5, model.json (метаданные: раскладка признаков, scaler, сорта, метрики)
+и model.npz (NumPy-экспорт). Текущая версия задаётся указателем CURRENT,
+который перезаписывается атомарно (os.replace), поэтому читатели видят либо
+старую, либо новую версию целиком. Изменения указателя (продвижение, откат,
+закрепление, очистка) выполняются под блокировкой файла CURRENT.lock, общей
+для всех процессов: воркеров, обучения и командной строки.
+
+    python model_registry.py list
+    python model_registry.py promote v000003 [--pin]
+    python model_registry.py rollback
+    python model_registry.py unpin
+    python model_registry.py gc [--keep 5]
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from config import ml_config
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: межпроцессной блокировки нет, остаются блокировки внутри процесса
+    fcntl = None
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+REGISTRY_DIR = os.path.join(BACKEND_DIR, 'models', 'registry')
+VERSIONS_DIR = os.path.join(REGISTRY_DIR, 'versions')
+CURRENT_PATH = os.path.join(REGISTRY_DIR, 'CURRENT')
+# Обучение ведёт один процесс из всех воркеров (см. model_trainer)
+TRAINING_LOCK_PATH = os.path.join(REGISTRY_DIR, 'TRAINING.lock')
+MODEL_FILE = 'model.h5'
+ARTIFACT_EXTENSIONS = ('.h5', '.json', '.npz')
+VERSION_PATTERN = re.compile(r'^v(\d{6})$')
+# Сколько предыдущих версий помнит указатель для отката
+MAX_HISTORY = 10
+
+_pointer_lock = threading.Lock()
+
+
+def check_version(version):
+    """Проверяет имя версии до его использования в пути"""
+    if not isinstance(version, str) or not VERSION_PATTERN.match(version):
+        raise ValueError(f"Некорректное имя версии: {version}")
+    return version
+
+
+@contextmanager
+def file_lock(path):
+    """Межпроцессная блокировка на файле (flock); снимается и при завершении процесса"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'a') as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def version_names():
+    """Имена версий по возрастанию"""
+    if not os.path.isdir(VERSIONS_DIR):
+        return []
+    return sorted(name for name in os.listdir(VERSIONS_DIR) if VERSION_PATTERN.match(name))
+
+
+def model_path(version):
+    """Путь к файлу модели версии (метаданные и .npz лежат рядом)"""
+    return os.path.join(VERSIONS_DIR, check_version(version), MODEL_FILE)
+
+
+def read_pointer():
+    """Указатель на текущую версию: version, history (для отката), pinned"""
+    try:
+        with open(CURRENT_PATH, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {'version': None, 'history': [], 'pinned': False}
+
+
+def _write_pointer(pointer):
+    os.makedirs(REGISTRY_DIR, exist_ok=True)
+    tmp_path = f"{CURRENT_PATH}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(pointer, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, CURRENT_PATH)
+
+
+@contextmanager
+def _pointer_update():
+    """Чтение и перезапись указателя под блокировкой потоков и процессов"""
+    with _pointer_lock, file_lock(CURRENT_PATH + '.lock'):
+        yield
+
+
+def current_version():
+    return read_pointer().get('version')
+
+
+def current_model_path():
+    version = current_version()
+    return model_path(version) if version else None
+
+
+def discard_artifacts(source_path):
+    """Удаляет незарегистрированную модель вместе с её .json/.npz"""
+    base = os.path.splitext(source_path)[0]
+    for extension in ARTIFACT_EXTENSIONS:
+        if os.path.exists(base + extension):
+            os.remove(base + extension)
+
+
+def register(source_path, move=True):
+    """Добавляет модель (и её .json/.npz) в реестр новой версией и возвращает её имя.
+
+    Файлы собираются во временном каталоге, который затем переименовывается в
+    каталог версии: версия появляется в реестре только целиком.
+    """
+    os.makedirs(VERSIONS_DIR, exist_ok=True)
+    incoming = os.path.join(VERSIONS_DIR, f".incoming-{os.getpid()}-{time.time_ns()}")
+    os.makedirs(incoming)
+    try:
+        base = os.path.splitext(source_path)[0]
+        for extension in ARTIFACT_EXTENSIONS:
+            source = base + extension
+            if not os.path.exists(source):
+                continue
+            target = os.path.join(incoming, 'model' + extension)
+            if move:
+                os.replace(source, target)
+            else:
+                shutil.copy2(source, target)
+
+        while True:
+            names = version_names()
+            number = int(VERSION_PATTERN.match(names[-1]).group(1)) + 1 if names else 1
+            version = f"v{number:06d}"
+            try:
+                # Переименование в непустой существующий каталог невозможно,
+                # поэтому два процесса не получат одну и ту же версию
+                os.rename(incoming, os.path.join(VERSIONS_DIR, version))
+                return version
+            except OSError:
+                if not os.path.exists(os.path.join(VERSIONS_DIR, version)):
+                    raise
+    finally:
+        if os.path.exists(incoming):
+            shutil.rmtree(incoming, ignore_errors=True)
+
+
+def promote(version, pinned=False, automatic=False):
+    """Делает версию текущей.
+
+    Автоматическое продвижение (после обучения) не выполняется, пока текущая
+    версия закреплена вручную (pinned); возвращает False в этом случае.
+    """
+    with _pointer_update():
+        if not os.path.exists(model_path(version)):
+            raise ValueError(f"Версия {version} не найдена в реестре")
+        pointer = read_pointer()
+        if automatic and pointer.get('pinned'):
+            print(f"Текущая версия {pointer.get('version')} закреплена, {version} не продвигается")
+            return False
+        history = list(pointer.get('history', []))
+        if pointer.get('version') and pointer['version'] != version:
+            history.append(pointer['version'])
+        _write_pointer({
+            'version': version,
+            'history': history[-MAX_HISTORY:],
+            'pinned': pinned,
+            'promoted_at': datetime.now().isoformat()
+        })
+    print(f"Текущая версия модели: {version}")
+    return True
+
+
+def rollback():
+    """Возвращает предыдущую текущую версию и закрепляет её"""
+    with _pointer_update():
+        pointer = read_pointer()
+        history = [version for version in pointer.get('history', []) if os.path.exists(model_path(version))]
+        if not history:
+            raise ValueError("Нет предыдущей версии для отката")
+        version = history.pop()
+        _write_pointer({
+            'version': version,
+            'history': history,
+            'pinned': True,
+            'promoted_at': datetime.now().isoformat()
+        })
+    print(f"Откат на версию модели: {version}")
+    return version
+
+
+def unpin():
+    """Снимает закрепление: версии после обучения снова продвигаются автоматически"""
+    with _pointer_update():
+        pointer = read_pointer()
+        pointer['pinned'] = False
+        _write_pointer(pointer)
+
+
+def read_metadata(version):
+    """Метаданные версии ({} если их нет)"""
+    try:
+        with open(os.path.splitext(model_path(version))[0] + '.json', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def latest_kb_version():
+    """Версия базы знаний, на которой обучена последняя зарегистрированная модель"""
+    names = version_names()
+    return read_metadata(names[-1]).get('kb_version') if names else None
+
+
+def describe(version):
+    """Сведения о версии: время обучения, режим и метрики из метаданных"""
+    metadata = read_metadata(version)
+    version_dir = os.path.dirname(model_path(version))
+    return {
+        'version': version,
+        'trained_at': metadata.get('trained_at'),
+        'kb_version': metadata.get('kb_version'),
+        'training_mode': metadata.get('training_mode'),
+        'validation_accuracy': metadata.get('validation_accuracy'),
+        'network': metadata.get('network'),
+        'size_bytes': sum(
+            os.path.getsize(os.path.join(version_dir, name)) for name in os.listdir(version_dir)
+        )
+    }
+
+
+def list_versions():
+    pointer = read_pointer()
+    versions = []
+    for version in version_names():
+        info = describe(version)
+        info['current'] = version == pointer.get('version')
+        versions.append(info)
+    return versions
+
+
+def collect_garbage(keep=None):
+    """Удаляет старые версии, кроме keep последних, текущей и доступных для отката.
+
+    Версии новее текущей не удаляются никогда: обучение могло только что
+    зарегистрировать такую версию и ещё не успеть её продвинуть.
+    """
+    keep = ml_config['registry_keep_versions'] if keep is None else keep
+    if keep < 1:
+        raise ValueError("Нужно оставить хотя бы одну версию")
+    # Под блокировкой указателя: удаляемая версия не может стать текущей в это время
+    with _pointer_update():
+        pointer = read_pointer()
+        current = pointer.get('version')
+        protected = set(pointer.get('history', []))
+        names = version_names()
+        protected.update(names[-keep:])
+
+        removed = []
+        for version in names:
+            # Без текущей версии все версии считаются новыми
+            if version not in protected and current is not None and version < current:
+                shutil.rmtree(os.path.join(VERSIONS_DIR, version), ignore_errors=True)
+                removed.append(version)
+    return removed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Реестр версий модели классификации кофе')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('list', help='Список версий')
+    promote_parser = commands.add_parser('promote', help='Сделать версию текущей')
+    promote_parser.add_argument('version')
+    promote_parser.add_argument('--pin', action='store_true',
+                                help='Закрепить версию: обученные позже версии не продвигаются автоматически')
+    commands.add_parser('rollback', help='Откатиться на предыдущую версию (с закреплением)')
+    commands.add_parser('unpin', help='Снять закрепление текущей версии')
+    gc_parser = commands.add_parser('gc', help='Удалить старые версии')
+    gc_parser.add_argument('--keep', type=int, default=None, help='Сколько последних версий оставить')
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'list':
+            for info in list_versions():
+                marker = '*' if info['current'] else ' '
+                print(
+                    f"{marker} {info['version']}  обучена {info['trained_at']}  "
+                    f"режим {info['training_mode']}  точность {info['validation_accuracy']}"
+                )
+        elif args.command == 'promote':
+            promote(args.version, pinned=args.pin)
+        elif args.command == 'rollback':
+            rollback()
+        elif args.command == 'unpin':
+            unpin()
+        elif args.command == 'gc':
+            removed = collect_garbage(args.keep)
+            print(f"Удалено версий: {len(removed)}")
+    except ValueError as e:
+        print(f"Ошибка: {e}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,150 @@
+import os
+import subprocess
+import sys
+import threading
+from datetime import datetime
+import model_registry
+from knowledge_base import fetch_version
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+TRAIN_WORKER = os.path.join(BACKEND_DIR, 'train_worker.py')
+
+
+class BackgroundTrainer:
+    """Фоновое переобучение модели в отдельном процессе.
+
+    Пока идёт обучение, запросы обслуживает текущая модель. Новая модель
+    обучается процессом train_worker.py во временный файл, затем проверяется
+    и атомарно подменяется через classifier.swap_model.
+
+    Обучает один процесс из всех воркеров: обучение идёт под межпроцессной
+    блокировкой реестра, а получивший её следом сначала подхватывает уже
+    зарегистрированную версию и не обучает модель повторно на тех же данных.
+    """
+
+    def __init__(self, classifier):
+        self.classifier = classifier
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pending = False
+        # Следующее обучение - полное (иначе дообучение текущей модели, если возможно)
+        self._full = False
+        self._status = {
+            'status': 'idle',
+            'reason': None,
+            'mode': None,
+            'started_at': None,
+            'finished_at': None,
+            'last_error': None,
+            'trainings': 0
+        }
+
+    def request_retrain(self, reason=None, full=False):
+        """Запускает переобучение в фоне; повторные запросы во время обучения объединяются.
+
+        По умолчанию воркер дообучает текущую модель и сам переходит к полному
+        обучению по расписанию или при падении точности; full=True - сразу с нуля.
+        """
+        with self._lock:
+            self._full = self._full or full
+            if self._thread is not None and self._thread.is_alive():
+                self._pending = True
+                return False
+            self._status['reason'] = reason
+            self._thread = threading.Thread(target=self._run, name='model-trainer', daemon=True)
+            self._thread.start()
+            return True
+
+    def is_training(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self):
+        while True:
+            self._train_once()
+            with self._lock:
+                if not self._pending:
+                    return
+                self._pending = False
+
+    def _already_trained(self, kb_version):
+        """Модель на этой версии базы знаний уже обучена другим процессом"""
+        if kb_version is None:
+            return False
+        try:
+            self.classifier.sync_registry(force=True)
+        except Exception as e:
+            print(f"Ошибка при переходе на новую версию модели: {e}")
+        latest = model_registry.latest_kb_version()
+        return latest is not None and latest >= kb_version
+
+    def _train_once(self):
+        with self._lock:
+            mode = 'full' if self._full else 'auto'
+            self._full = False
+            self._status.update({
+                'status': 'waiting',
+                'mode': mode,
+                'started_at': None,
+                'finished_at': None,
+                'last_error': None
+            })
+
+        # Версия читается до старта обучения: более поздние правки вызовут новое обучение
+        try:
+            kb_version = fetch_version()
+        except Exception as e:
+            print(f"Версия базы знаний недоступна: {e}")
+            kb_version = None
+
+        with model_registry.file_lock(model_registry.TRAINING_LOCK_PATH):
+            if mode != 'full' and self._already_trained(kb_version):
+                print(f"Модель на версии базы знаний {kb_version} уже обучена другим процессом")
+                with self._lock:
+                    self._status['status'] = 'idle'
+                    self._status['finished_at'] = datetime.now()
+                return
+            self._train_locked(mode, kb_version)
+
+    def _train_locked(self, mode, kb_version):
+        started_at = datetime.now()
+        with self._lock:
+            self._status['status'] = 'training'
+            self._status['started_at'] = started_at
+
+        os.makedirs(os.path.join(BACKEND_DIR, 'models'), exist_ok=True)
+        output_path = os.path.join(
+            BACKEND_DIR, 'models', f"coffee_classifier.training-{started_at.strftime('%Y%m%d%H%M%S%f')}.h5"
+        )
+
+        error = None
+        try:
+            print(f"Запуск фонового обучения модели: {output_path}")
+            process = subprocess.run(
+                [sys.executable, TRAIN_WORKER, '--output', output_path, '--mode', mode],
+                cwd=BACKEND_DIR
+            )
+            if process.returncode != 0:
+                raise RuntimeError(f"Процесс обучения завершился с кодом {process.returncode}")
+            self.classifier.swap_model(output_path, started_at, kb_version)
+        except Exception as e:
+            error = str(e)
+            print(f"Ошибка фонового обучения модели: {e}")
+        finally:
+            for extension in ('.h5', '.json', '.npz'):
+                path = os.path.splitext(output_path)[0] + extension
+                if os.path.exists(path):
+                    os.remove(path)
+
+        with self._lock:
+            self._status['status'] = 'failed' if error else 'idle'
+            self._status['finished_at'] = datetime.now()
+            self._status['last_error'] = error
+            if not error:
+                self._status['trainings'] += 1
+
+    def status(self):
+        """Текущее состояние фонового обучения"""
+        with self._lock:
+            status = dict(self._status)
+            status['pending'] = self._pending
+            return status
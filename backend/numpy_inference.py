@@ -0,0 +1,133 @@
+"""Инференс модели на чистом NumPy.
+
+Keras-модель (Dense + BatchNormalization + Dropout) экспортируется в компактный
+.npz: слои BatchNormalization сворачиваются в следующие за ними Dense, Dropout
+на инференсе отбрасывается. Сервер загружает .npz без импорта TensorFlow.
+"""
+import json
+import os
+import numpy as np
+
+SUPPORTED_ACTIVATIONS = ('linear', 'relu', 'softmax')
+
+
+def numpy_model_path(model_path):
+    """Путь к .npz-экспорту, сопровождающему модель"""
+    return os.path.splitext(model_path)[0] + '.npz'
+
+
+def fold_keras_model(model):
+    """Сворачивает BatchNormalization в соседние Dense.
+
+    BN после активации задаёт аффинное преобразование x' = a * x + c входа
+    следующего Dense, поэтому W' = a[:, None] * W и b' = c @ W + b.
+    Возвращает список (kernel, bias, activation).
+    """
+    folded = []
+    pending = None  # (a, c) от ещё не свёрнутого BatchNormalization
+    for layer in model.layers:
+        kind = layer.__class__.__name__
+        if kind in ('Dropout', 'InputLayer'):
+            continue
+        if kind == 'BatchNormalization':
+            config = layer.get_config()
+            weights = list(layer.get_weights())
+            gamma = weights.pop(0) if config.get('scale', True) else None
+            beta = weights.pop(0) if config.get('center', True) else None
+            moving_mean, moving_variance = weights
+            a = 1.0 / np.sqrt(moving_variance + config['epsilon'])
+            if gamma is not None:
+                a = gamma * a
+            c = -moving_mean * a
+            if beta is not None:
+                c = c + beta
+            if pending is not None:
+                # Два BN подряд: композиция аффинных преобразований
+                a, c = pending[0] * a, pending[1] * a + c
+            pending = (a, c)
+        elif kind == 'Dense':
+            config = layer.get_config()
+            weights = layer.get_weights()
+            kernel = weights[0].astype(np.float64)
+            bias = weights[1].astype(np.float64) if config.get('use_bias', True) else np.zeros(kernel.shape[1])
+            if pending is not None:
+                a, c = pending
+                bias = c @ kernel + bias
+                kernel = a[:, None] * kernel
+                pending = None
+            activation = config['activation']
+            if activation not in SUPPORTED_ACTIVATIONS:
+                raise ValueError(f"Неподдерживаемая активация: {activation}")
+            folded.append((kernel, bias, activation))
+        else:
+            raise ValueError(f"Неподдерживаемый слой: {kind}")
+
+    if pending is not None:
+        raise ValueError("BatchNormalization в конце модели не может быть свёрнут")
+    return folded
+
+
+class NumpyPredictor:
+    """Прямой проход MLP на NumPy с интерфейсом, совместимым с keras predict"""
+
+    def __init__(self, layers, metadata=None):
+        self.layers = [
+            (np.asarray(kernel, dtype=np.float32), np.asarray(bias, dtype=np.float32), activation)
+            for kernel, bias, activation in layers
+        ]
+        self.metadata = metadata or {}
+
+    @property
+    def input_shape(self):
+        return (None, self.layers[0][0].shape[0])
+
+    @property
+    def output_shape(self):
+        return (None, self.layers[-1][0].shape[1])
+
+    def predict(self, X, batch_size=None, verbose=0):
+        X = np.asarray(X, dtype=np.float32)
+        for kernel, bias, activation in self.layers:
+            X = X @ kernel + bias
+            if activation == 'relu':
+                np.maximum(X, 0, out=X)
+            elif activation == 'softmax':
+                X = np.exp(X - X.max(axis=1, keepdims=True))
+                X /= X.sum(axis=1, keepdims=True)
+        return X
+
+    def save(self, path):
+        """Атомарно сохраняет веса и метаданные в .npz"""
+        arrays = {}
+        for index, (kernel, bias, activation) in enumerate(self.layers):
+            arrays[f'kernel_{index}'] = kernel
+            arrays[f'bias_{index}'] = bias
+        arrays['activations'] = np.array([activation for _, _, activation in self.layers])
+        arrays['metadata'] = np.array(json.dumps(self.metadata, ensure_ascii=False))
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            activations = [str(activation) for activation in data['activations']]
+            layers = [
+                (data[f'kernel_{index}'], data[f'bias_{index}'], activation)
+                for index, activation in enumerate(activations)
+            ]
+            metadata = json.loads(str(data['metadata']))
+        return cls(layers, metadata)
+
+
+def export_numpy_model(model, path, metadata=None, tolerance=1e-4, seed=0):
+    """Экспортирует keras-модель в .npz, проверяя численную эквивалентность"""
+    predictor = NumpyPredictor(fold_keras_model(model), metadata)
+    n_features = predictor.input_shape[1]
+    probe = np.random.default_rng(seed).normal(size=(256, n_features)).astype(np.float32)
+    expected = model.predict(probe, verbose=0)
+    difference = float(np.max(np.abs(predictor.predict(probe) - expected)))
+    if difference > tolerance:
+        raise ValueError(f"NumPy-модель расходится с Keras: максимальная разница {difference:.2e}")
+    predictor.save(path)
+    return predictor
@@ -0,0 +1,66 @@
+import math
+import numpy as np
+
+# Дисперсия, ниже которой характеристика считается константной
+MIN_VARIANCE = 1e-12
+
+
+class RangeScaler:
+    """Нормализация числовых характеристик, вычисленная аналитически по диапазонам.
+
+    Обучающая выборка для характеристики - равновесная смесь по сортам
+    равномерных распределений U(min, max) (0.0 у сортов без диапазона), поэтому
+    её среднее и дисперсия считаются в замкнутом виде, без сэмплирования:
+    E[x] = (min + max) / 2, E[x^2] = (min^2 + min*max + max^2) / 3.
+    Параметры хранятся отдельно для каждой характеристики (ключ - id строкой).
+    """
+
+    def __init__(self, mean, scale):
+        self.mean = dict(mean)
+        self.scale = dict(scale)
+
+    @classmethod
+    def from_snapshot(cls, snapshot, class_mapping, numeric_ids):
+        """Параметры для характеристик numeric_ids по диапазонам сортов class_mapping"""
+        mean = {}
+        scale = {}
+        n_classes = max(len(class_mapping), 1)
+        for char_id in numeric_ids:
+            first_moment = 0.0
+            second_moment = 0.0
+            for type_id in class_mapping:
+                bounds = snapshot.numeric_ranges.get(type_id, {}).get(int(char_id))
+                if not bounds or bounds[0] is None or bounds[1] is None:
+                    continue
+                low, high = bounds
+                first_moment += (low + high) / 2
+                second_moment += (low * low + low * high + high * high) / 3
+            char_mean = first_moment / n_classes
+            variance = second_moment / n_classes - char_mean * char_mean
+
+            if variance > MIN_VARIANCE:
+                mean[str(char_id)] = char_mean
+                scale[str(char_id)] = math.sqrt(variance)
+                continue
+            # Все сорта дают одно значение: берём равномерное распределение по допустимым границам
+            limits = snapshot.numeric_limits.get(int(char_id))
+            if limits and limits[0] is not None and limits[1] is not None and limits[1] > limits[0]:
+                mean[str(char_id)] = (limits[0] + limits[1]) / 2
+                scale[str(char_id)] = (limits[1] - limits[0]) / math.sqrt(12)
+            else:
+                mean[str(char_id)] = char_mean
+                scale[str(char_id)] = 1.0
+        return cls(mean, scale)
+
+    def parameters(self, numeric_ids):
+        """Массивы (mean, scale) в порядке столбцов numeric_ids"""
+        mean = np.array([self.mean.get(str(char_id), 0.0) for char_id in numeric_ids], dtype=np.float32)
+        scale = np.array([self.scale.get(str(char_id), 1.0) for char_id in numeric_ids], dtype=np.float32)
+        return mean, scale
+
+    def to_dict(self):
+        return {'mean': self.mean, 'scale': self.scale}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['mean'], data['scale'])
@@ -0,0 +1,108 @@
+import hashlib
+import json
+import math
+import threading
+from collections import OrderedDict
+import numpy as np
+
+
+def canonical_characteristics(numeric_chars, categorical_chars, precision):
+    """Приводит характеристики образца к каноническому виду для ключа кэша.
+
+    Ключи - строки, числовые значения - float ("5.5", 5.5 и 5.50 дают один
+    ключ); нечисловые значения оставляются как есть, чтобы анализ вернул ту же
+    ошибку. Если значение задано точнее ввода (как в базе, DECIMAL(10,2)),
+    возвращает None: такой образец считается как есть и не кэшируется, иначе
+    5.554 и 5.546 делили бы один ключ.
+    """
+    numeric = {}
+    for char_id, value in numeric_chars.items():
+        try:
+            number = float(value)
+        except (ValueError, TypeError):
+            numeric[str(char_id)] = value
+            continue
+        if math.isfinite(number) and round(number, precision) != number:
+            return None
+        numeric[str(char_id)] = number
+    categorical = {str(char_id): value for char_id, value in categorical_chars.items()}
+    return numeric, categorical
+
+
+def cache_key(*parts):
+    """SHA-256 от канонического JSON частей ключа"""
+    canonical = json.dumps(parts, ensure_ascii=False, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def _estimate_size(value):
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    return len(json.dumps(value, ensure_ascii=False, default=str))
+
+
+class ResultCache:
+    """Потокобезопасный LRU-кэш результатов с ограничением по числу записей и объёму"""
+
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, key):
+        """Возвращает (найдено, значение) и отмечает запись как недавно использованную"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return True, entry[0]
+
+    def put(self, key, value):
+        size = _estimate_size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self._evictions += 1
+
+    def get_or_compute(self, key, compute):
+        """Значение из кэша или результат compute(), сохранённый в кэш"""
+        found, value = self.get(key)
+        if found:
+            return value
+        value = compute()
+        self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Счётчики попаданий и промахов и текущий размер"""
+        with self._lock:
+            requests = self._hits + self._misses
+            return {
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': self._hits / requests if requests else 0.0,
+                'evictions': self._evictions,
+                'entries': len(self._entries),
+                'bytes': self._bytes
+            }
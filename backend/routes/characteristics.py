@@ -1,59 +1,51 @@
 from flask import Blueprint, jsonify, request
-from db import get_db_connection
-import mysql.connector
+from knowledge_base import invalidate_snapshot, cached_for_version
+from storage import get_repository
 
 characteristics = Blueprint('characteristics', __name__, url_prefix='/api/expert/characteristics')
 
 @characteristics.route('/', methods=['GET'])
 def get_characteristics():
     try:
-        db = get_db_connection()
-        cursor = db.cursor(dictionary=True)
-
-        # Получаем все характеристики
-        cursor.execute('SELECT * FROM characteristics ORDER BY name')
-        characteristics = cursor.fetchall()
-        
-        # Разделяем на числовые и категориальные
-        numeric = []
-        categorical = []
+        return jsonify(cached_for_version('characteristics', load_characteristics_listing))
+    except Exception as e:
+        print('Ошибка при получении характеристик:', str(e))
+        return jsonify({'error': 'Внутренняя ошибка сервера'}), 500
 
-        for char in characteristics:
-            if char['type'] == 'numeric':
-                # Получаем ограничения для числовых характеристик
-                cursor.execute(
-                    'SELECT min_value, max_value FROM numeric_characteristic_limits WHERE characteristic_id = %s',
-                    (char['id'],)
-                )
-                limits = cursor.fetchone()
-                
-                if limits:
-                    numeric.append({
-                        'id': char['id'],
-                        'name': char['name'],
-                        'type': char['type'],
-                        'min_value': limits['min_value'],
-                        'max_value': limits['max_value']
-                    })
-            else:
-                # Получаем значения для категориальных характеристик
-                cursor.execute(
-                    'SELECT value FROM categorical_values WHERE characteristic_id = %s ORDER BY value',
-                    (char['id'],)
-                )
-                values = cursor.fetchall()
-                
-                categorical.append({
+def load_characteristics_listing():
+    """Список характеристик за два запроса независимо от их числа"""
+    repository = get_repository()
+    # Все характеристики вместе с ограничениями числовых
+    characteristics = repository.characteristics_with_limits()
+
+    # Значения всех категориальных характеристик
+    values_by_characteristic = {}
+    for row in repository.list_categorical_values():
+        values_by_characteristic.setdefault(row['characteristic_id'], []).append(row['value'])
+
+    # Разделяем на числовые и категориальные
+    numeric = []
+    categorical = []
+
+    for char in characteristics:
+        if char['type'] == 'numeric':
+            if char['limits_id'] is not None:
+                numeric.append({
                     'id': char['id'],
                     'name': char['name'],
                     'type': char['type'],
-                    'values': [v['value'] for v in values]
+                    'min_value': char['min_value'],
+                    'max_value': char['max_value']
                 })
+        else:
+            categorical.append({
+                'id': char['id'],
+                'name': char['name'],
+                'type': char['type'],
+                'values': values_by_characteristic.get(char['id'], [])
+            })
 
-        return jsonify({'numeric': numeric, 'categorical': categorical})
-    except Exception as e:
-        print('Ошибка при получении характеристик:', str(e))
-        return jsonify({'error': 'Внутренняя ошибка сервера'}), 500
+    return {'numeric': numeric, 'categorical': categorical}
 
 @characteristics.route('/', methods=['POST'])
 def add_characteristic():
@@ -65,62 +57,26 @@ def add_characteristic():
         max_value = data.get('max_value')
         values = data.get('values', [])
 
-        db = get_db_connection()
-        cursor = db.cursor()
-
-        # Начинаем транзакцию
-        db.start_transaction()
-
-        # Добавляем характеристику
-        cursor.execute(
-            'INSERT INTO characteristics (name, type) VALUES (%s, %s)',
-            (name, type)
-        )
-        characteristic_id = cursor.lastrowid
-
+        # Числовой характеристике - ограничения, категориальной - значения
         if type == 'numeric':
-            # Добавляем ограничения для числовой характеристики
-            cursor.execute(
-                'INSERT INTO numeric_characteristic_limits (characteristic_id, min_value, max_value) VALUES (%s, %s, %s)',
-                (characteristic_id, min_value, max_value)
-            )
+            characteristic_id = get_repository().add_characteristic(name, type, limits=(min_value, max_value))
         else:
-            # Добавляем значения для категориальной характеристики
-            for value in values:
-                cursor.execute(
-                    'INSERT INTO categorical_values (characteristic_id, value) VALUES (%s, %s)',
-                    (characteristic_id, value)
-                )
+            characteristic_id = get_repository().add_characteristic(name, type, values=values)
 
-        db.commit()
+        invalidate_snapshot()
         return jsonify({'success': True, 'id': characteristic_id})
     except Exception as e:
-        db.rollback()
         print('Ошибка при добавлении характеристики:', str(e))
         return jsonify({'error': 'Внутренняя ошибка сервера'}), 500
 
 @characteristics.route('/<int:id>', methods=['DELETE'])
 def delete_characteristic(id):
     try:
-        db = get_db_connection()
-        cursor = db.cursor()
-
-        # Начинаем транзакцию
-        db.start_transaction()
-
-        # Удаляем ограничения числовых характеристик
-        cursor.execute('DELETE FROM numeric_characteristic_limits WHERE characteristic_id = %s', (id,))
-        
-        # Удаляем значения категориальных характеристик
-        cursor.execute('DELETE FROM categorical_values WHERE characteristic_id = %s', (id,))
-        
-        # Удаляем саму характеристику
-        cursor.execute('DELETE FROM characteristics WHERE id = %s', (id,))
-
-        db.commit()
+        # Ограничения, значения и сама характеристика удаляются в одной транзакции
+        get_repository().delete_characteristic(id)
+        invalidate_snapshot()
         return jsonify({'success': True})
     except Exception as e:
-        db.rollback()
         print('Ошибка при удалении характеристики:', str(e))
         return jsonify({'error': 'Внутренняя ошибка сервера'}), 500
 
@@ -128,20 +84,10 @@ def delete_characteristic(id):
 def update_numeric_limits(id):
     try:
         data = request.get_json()
-        min_value = data.get('min_value')
-        max_value = data.get('max_value')
-
-        db = get_db_connection()
-        cursor = db.cursor()
-
-        cursor.execute(
-            'UPDATE numeric_characteristic_limits SET min_value = %s, max_value = %s WHERE characteristic_id = %s',
-            (min_value, max_value, id)
-        )
-        db.commit()
+        get_repository().set_numeric_limits(id, data.get('min_value'), data.get('max_value'))
+        invalidate_snapshot()
         return jsonify({'success': True})
     except Exception as e:
-        db.rollback()
         print('Ошибка при обновлении ограничений:', str(e))
         return jsonify({'error': 'Внутренняя ошибка сервера'}), 500
 
@@ -149,27 +95,10 @@ def update_numeric_limits(id):
 def update_categorical_values(id):
     try:
         data = request.get_json()
-        values = data.get('values', [])
-
-        db = get_db_connection()
-        cursor = db.cursor()
-
-        # Начинаем транзакцию
-        db.start_transaction()
-
-        # Удаляем старые значения
-        cursor.execute('DELETE FROM categorical_values WHERE characteristic_id = %s', (id,))
-
-        # Добавляем новые значения
-        for value in values:
-            cursor.execute(
-                'INSERT INTO categorical_values (characteristic_id, value) VALUES (%s, %s)',
-                (id, value)
-            )
-
-        db.commit()
+        # Старые значения заменяются новыми в одной транзакции
+        get_repository().replace_categorical_values(id, data.get('values', []))
+        invalidate_snapshot()
         return jsonify({'success': True})
     except Exception as e:
-        db.rollback()
         print('Ошибка при обновлении значений:', str(e))
-        return jsonify({'error': 'Внутренняя ошибка сервера'}), 500 
\ No newline at end of file
+        return jsonify({'error': 'Внутренняя ошибка сервера'}), 500
@@ -1,66 +1,28 @@
 from flask import Blueprint, jsonify, request
-from db import get_db_connection
+from knowledge_base import invalidate_snapshot
+from storage import get_repository
 
 coffee_type_characteristics = Blueprint('coffee_type_characteristics', __name__)
 
 @coffee_type_characteristics.route('/coffee-type/<int:coffee_type_id>/characteristics', methods=['GET'])
 def get_coffee_type_characteristics(coffee_type_id):
     print(f"Получен запрос на характеристики для сорта кофе {coffee_type_id}")
-    conn = None
-    cursor = None
     try:
-        print("Подключение к базе данных...")
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        repository = get_repository()
         
         # Проверяем существование сорта кофе
-        print("Проверка существования сорта кофе...")
-        cursor.execute("SELECT id FROM coffee_types WHERE id = %s", (coffee_type_id,))
-        if not cursor.fetchone():
+        if not repository.coffee_type_exists(coffee_type_id):
             print(f"Сорт кофе {coffee_type_id} не найден")
             return jsonify({
                 'success': False,
                 'error': 'Сорт кофе не найден'
             }), 404
         
-        # Получаем все числовые характеристики
-        print("Получение числовых характеристик...")
-        cursor.execute("""
-            SELECT c.id, c.name, c.type
-            FROM characteristics c
-            WHERE c.type = 'numeric'
-        """)
-        all_numeric = cursor.fetchall()
-        
-        # Получаем выбранные числовые характеристики
-        cursor.execute("""
-            SELECT characteristic_id
-            FROM coffee_numeric_characteristics
-            WHERE coffee_type_id = %s
-        """, (coffee_type_id,))
-        selected_numeric = [row['characteristic_id'] for row in cursor.fetchall()]
-        
-        # Получаем все категориальные характеристики
-        print("Получение категориальных характеристик...")
-        cursor.execute("""
-            SELECT c.id, c.name, c.type
-            FROM characteristics c
-            WHERE c.type = 'categorical'
-        """)
-        all_categorical = cursor.fetchall()
-        
-        # Получаем выбранные категориальные характеристики
-        cursor.execute("""
-            SELECT DISTINCT characteristic_id
-            FROM coffee_categorical_characteristics
-            WHERE coffee_type_id = %s
-        """, (coffee_type_id,))
-        selected_categorical = [row['characteristic_id'] for row in cursor.fetchall()]
-        
-        # Формируем ответ
+        # Все характеристики и выбранные у сорта
+        selected_numeric, selected_categorical = repository.type_characteristic_ids(coffee_type_id)
         response = {
-            'numeric': all_numeric,
-            'categorical': all_categorical,
+            'numeric': repository.list_characteristics('numeric'),
+            'categorical': repository.list_characteristics('categorical'),
             'selected': {
                 'numeric': selected_numeric,
                 'categorical': selected_categorical
@@ -76,94 +38,48 @@ def get_coffee_type_characteristics(coffee_type_id):
             'success': False,
             'error': f'Произошла ошибка при получении характеристик: {str(e)}'
         }), 500
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
-            print("Соединение с базой данных закрыто")
 
 @coffee_type_characteristics.route('/coffee-type/<int:coffee_type_id>/characteristics', methods=['POST'])
 def update_coffee_type_characteristics(coffee_type_id):
     print(f"Получен запрос на обновление характеристик для сорта кофе {coffee_type_id}")
-    conn = None
-    cursor = None
     try:
         data = request.get_json()
         print("Получены данные:", data)
-        
-        print("Подключение к базе данных...")
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        repository = get_repository()
         
         # Проверяем существование сорта кофе
-        print("Проверка существования сорта кофе...")
-        cursor.execute("SELECT id FROM coffee_types WHERE id = %s", (coffee_type_id,))
-        if not cursor.fetchone():
+        if not repository.coffee_type_exists(coffee_type_id):
             print(f"Сорт кофе {coffee_type_id} не найден")
             return jsonify({
                 'success': False,
                 'error': 'Сорт кофе не найден'
             }), 404
         
-        # Начинаем транзакцию
-        print("Начало транзакции...")
-        cursor.execute("START TRANSACTION")
-        
-        # Удаляем все существующие характеристики
-        print("Удаление старых характеристик...")
-        cursor.execute("DELETE FROM coffee_numeric_characteristics WHERE coffee_type_id = %s", (coffee_type_id,))
-        cursor.execute("DELETE FROM coffee_categorical_characteristics WHERE coffee_type_id = %s", (coffee_type_id,))
-        
-        # Добавляем только выбранные числовые характеристики
-        print("Добавление числовых характеристик...")
-        for char in data.get('numeric', []):
-            print(f"Обработка числовой характеристики: {char}")
-            cursor.execute("""
-                INSERT INTO coffee_numeric_characteristics 
-                (coffee_type_id, characteristic_id, min_value, max_value)
-                VALUES (%s, %s, %s, %s)
-            """, (coffee_type_id, char['id'], char.get('min_value', 0), char.get('max_value', 0)))
-        
-        # Добавляем только выбранные категориальные характеристики
-        print("Добавление категориальных характеристик...")
-        for char in data.get('categorical', []):
-            print(f"Обработка категориальной характеристики: {char}")
-            # Получаем все возможные значения для характеристики
-            cursor.execute("""
-                SELECT id FROM categorical_values 
-                WHERE characteristic_id = %s
-            """, (char['id'],))
-            values = cursor.fetchall()
-            
-            if values:
-                # Берем первое значение как дефолтное
-                value_id = values[0][0]
-                cursor.execute("""
-                    INSERT INTO coffee_categorical_characteristics 
-                    (coffee_type_id, characteristic_id, categorical_value_id)
-                    VALUES (%s, %s, %s)
-                """, (coffee_type_id, char['id'], value_id))
-        
-        # Подтверждаем транзакцию
-        print("Подтверждение транзакции...")
-        cursor.execute("COMMIT")
+        numeric = [
+            (char['id'], char.get('min_value', 0), char.get('max_value', 0))
+            for char in data.get('numeric', [])
+        ]
+        # Для категориальной характеристики первое её значение берётся как значение по умолчанию
+        first_values = {}
+        for row in repository.list_categorical_values():
+            first_values.setdefault(row['characteristic_id'], row)
+            if row['id'] < first_values[row['characteristic_id']]['id']:
+                first_values[row['characteristic_id']] = row
+        categorical = [
+            (char['id'], first_values[char['id']]['value'])
+            for char in data.get('categorical', []) if char['id'] in first_values
+        ]
+        
+        # Старые характеристики заменяются выбранными в одной транзакции
+        repository.replace_type_characteristics(coffee_type_id, numeric, categorical)
+        invalidate_snapshot()
         
         print("Характеристики успешно обновлены")
         return jsonify({'success': True})
         
     except Exception as e:
-        if conn:
-            print("Откат транзакции из-за ошибки...")
-            cursor.execute("ROLLBACK")
         print(f"Ошибка при обновлении характеристик: {str(e)}")
         return jsonify({
             'success': False,
             'error': f'Произошла ошибка при обновлении характеристик: {str(e)}'
         }), 500
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
-            print("Соединение с базой данных закрыто") 
\ No newline at end of file
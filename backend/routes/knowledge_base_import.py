@@ -0,0 +1,25 @@
+from flask import Blueprint, jsonify, request
+from bulk_import import CatalogError, import_catalog, parse_csv, parse_json
+
+knowledge_base_import = Blueprint('knowledge_base_import', __name__, url_prefix='/api/expert')
+
+
+@knowledge_base_import.route('/import', methods=['POST'])
+def import_knowledge_base():
+    """Массовый импорт каталога сортов (JSON или text/csv); ?dry_run=1 - только проверка"""
+    dry_run = request.args.get('dry_run', '').lower() in ('1', 'true', 'yes')
+    try:
+        if request.mimetype == 'text/csv':
+            entries = parse_csv(request.get_data(as_text=True))
+        else:
+            data = request.get_json(silent=True)
+            if data is None:
+                return jsonify({'success': False, 'error': 'Ожидается каталог в формате JSON или CSV'}), 400
+            entries = parse_json(data)
+        summary = import_catalog(entries, dry_run=dry_run)
+        return jsonify({'success': True, **summary})
+    except CatalogError as e:
+        return jsonify({'success': False, 'error': str(e), 'errors': e.errors}), 400
+    except Exception as e:
+        print(f"Ошибка при импорте каталога: {e}")
+        return jsonify({'success': False, 'error': f'Произошла ошибка при импорте каталога: {str(e)}'}), 500
@@ -0,0 +1,74 @@
+from flask import Blueprint, jsonify, request
+import model_registry
+from ml_model import get_classifier
+
+model_versions = Blueprint('model_versions', __name__, url_prefix='/api/model')
+
+
+def sync_local_classifier():
+    # Этот процесс переходит на новую версию сразу, остальные - при следующей сверке с реестром
+    classifier = get_classifier(timeout=0)
+    if classifier is not None:
+        classifier.sync_registry(force=True)
+
+
+@model_versions.route('/versions', methods=['GET'])
+def list_versions():
+    """Версии модели в реестре"""
+    pointer = model_registry.read_pointer()
+    return jsonify({
+        'current': pointer.get('version'),
+        'pinned': pointer.get('pinned', False),
+        'versions': model_registry.list_versions()
+    })
+
+
+@model_versions.route('/versions/<version>/promote', methods=['POST'])
+def promote_version(version):
+    """Делает версию текущей; {"pin": true} закрепляет её"""
+    data = request.get_json(silent=True) or {}
+    try:
+        model_registry.check_version(version)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        model_registry.promote(version, pinned=bool(data.get('pin', False)))
+        sync_local_classifier()
+        return jsonify({'message': f'Версия {version} введена в работу', 'current': version})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 404
+    except Exception as e:
+        print(f"Ошибка при продвижении версии модели: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@model_versions.route('/rollback', methods=['POST'])
+def rollback_version():
+    """Откат на предыдущую версию (с закреплением)"""
+    try:
+        version = model_registry.rollback()
+        sync_local_classifier()
+        return jsonify({'message': f'Выполнен откат на версию {version}', 'current': version})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 409
+    except Exception as e:
+        print(f"Ошибка при откате версии модели: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@model_versions.route('/unpin', methods=['POST'])
+def unpin_version():
+    """Снимает закрепление текущей версии"""
+    model_registry.unpin()
+    return jsonify({'message': 'Закрепление снято'})
+
+
+@model_versions.route('/gc', methods=['POST'])
+def collect_garbage():
+    """Удаляет старые версии; {"keep": N} - сколько последних оставить"""
+    data = request.get_json(silent=True) or {}
+    keep = data.get('keep')
+    if keep is not None and (not isinstance(keep, int) or keep < 1):
+        return jsonify({'error': 'keep должен быть положительным целым'}), 400
+    removed = model_registry.collect_garbage(keep)
+    return jsonify({'removed': removed})
@@ -0,0 +1,772 @@
+"""Хранилище базы знаний.
+
+Весь доступ к данным (сорта, характеристики, ограничения, значения, диапазоны
+сортов) идёт через репозиторий get_repository(). Реализации отличаются только
+подключением и диалектом: MySQLRepository работает через пул db.py,
+SQLiteRepository - с локальным файлом в том же процессе, без сервера и сети.
+Запросы написаны на общем подмножестве SQL. Каждый пишущий метод выполняется
+в одной транзакции и повышает версию базы знаний.
+
+    python storage.py init-sqlite data/coffee_classification.sqlite3 [--snapshot models/knowledge_base.npz]
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import threading
+from contextlib import contextmanager
+from decimal import Decimal
+from config import storage_config
+
+
+class DuplicateError(ValueError):
+    """Запись с таким уникальным значением уже существует"""
+
+
+class Repository:
+    """Операции с базой знаний; подклассы задают подключение и диалект"""
+
+    backend = None
+    placeholder = '%s'
+
+    # --- Подключение и транзакции (переопределяются реализациями) ---
+
+    def _connect(self):
+        raise NotImplementedError
+
+    def _release(self, conn):
+        raise NotImplementedError
+
+    def _cursor(self, conn):
+        """Курсор, возвращающий строки в виде словарей"""
+        raise NotImplementedError
+
+    def _begin(self, conn):
+        pass
+
+    def is_duplicate_error(self, error):
+        raise NotImplementedError
+
+    def pool_metrics(self):
+        return None
+
+    @contextmanager
+    def _session(self):
+        """Курсор в транзакции: фиксируется при успехе, откатывается при ошибке"""
+        conn = self._connect()
+        cursor = self._cursor(conn)
+        try:
+            self._begin(conn)
+            yield cursor
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+            self._release(conn)
+
+    def _sql(self, sql):
+        return sql if self.placeholder == '%s' else sql.replace('%s', self.placeholder)
+
+    def _execute(self, cursor, sql, params=()):
+        cursor.execute(self._sql(sql), params)
+
+    def _executemany(self, cursor, sql, rows):
+        if rows:
+            cursor.executemany(self._sql(sql), rows)
+
+    def _query(self, cursor, sql, params=()):
+        self._execute(cursor, sql, params)
+        return cursor.fetchall()
+
+    def _query_one(self, cursor, sql, params=()):
+        rows = self._query(cursor, sql, params)
+        return rows[0] if rows else None
+
+    def _fetch(self, sql, params=()):
+        with self._session() as cursor:
+            return self._query(cursor, sql, params)
+
+    @staticmethod
+    def _in(values):
+        return ', '.join(['%s'] * len(values))
+
+    # --- Версия базы знаний ---
+
+    def _read_version(self, cursor):
+        row = self._query_one(cursor, "SELECT version FROM knowledge_base_version WHERE id = 1")
+        return int(row['version']) if row is not None else 0
+
+    def _bump_version(self, cursor):
+        self._execute(cursor, "UPDATE knowledge_base_version SET version = version + 1 WHERE id = 1")
+
+    def read_version(self):
+        with self._session() as cursor:
+            return self._read_version(cursor)
+
+    def load_knowledge_base(self):
+        """Все данные для снимка базы знаний за фиксированное число запросов в одной транзакции"""
+        with self._session() as cursor:
+            # Версия читается первой в той же транзакции, что и данные
+            try:
+                version = self._read_version(cursor)
+            except Exception as e:
+                print(f"Версия базы знаний недоступна: {e}")
+                version = None
+            return {
+                'version': version,
+                'coffee_types': self._query(cursor, "SELECT id, name FROM coffee_types ORDER BY id"),
+                'characteristics': self._query(cursor, "SELECT id, name, type FROM characteristics ORDER BY id"),
+                'numeric_limits': self._query(cursor, """
+                    SELECT characteristic_id, min_value, max_value FROM numeric_characteristic_limits
+                """),
+                'categorical_values': self._query(cursor, """
+                    SELECT characteristic_id, id, value
+                    FROM categorical_values
+                    ORDER BY characteristic_id, value
+                """),
+                'numeric_ranges': self._query(cursor, """
+                    SELECT coffee_type_id, characteristic_id, min_value, max_value
+                    FROM coffee_numeric_characteristics
+                    ORDER BY coffee_type_id, characteristic_id
+                """),
+                'categorical_assignments': self._query(cursor, """
+                    SELECT cc.coffee_type_id, cc.characteristic_id, cv.value
+                    FROM coffee_categorical_characteristics cc
+                    JOIN categorical_values cv ON cc.categorical_value_id = cv.id
+                    ORDER BY cc.coffee_type_id, cc.characteristic_id, cc.id
+                """)
+            }
+
+    # --- Сорта кофе ---
+
+    def list_coffee_types(self):
+        return self._fetch("SELECT id, name FROM coffee_types ORDER BY name")
+
+    def coffee_type_exists(self, type_id):
+        return bool(self._fetch("SELECT id FROM coffee_types WHERE id = %s", (type_id,)))
+
+    def add_coffee_type(self, name):
+        """Добавляет сорт и возвращает его id; DuplicateError, если название занято"""
+        try:
+            with self._session() as cursor:
+                self._execute(cursor, "INSERT INTO coffee_types (name) VALUES (%s)", (name,))
+                type_id = cursor.lastrowid
+                self._bump_version(cursor)
+                return type_id
+        except Exception as e:
+            if self.is_duplicate_error(e):
+                raise DuplicateError(f'Сорт кофе "{name}" уже существует') from e
+            raise
+
+    def delete_coffee_type(self, type_id):
+        """Удаляет сорт с его характеристиками; False, если сорта нет"""
+        with self._session() as cursor:
+            if self._query_one(cursor, "SELECT id FROM coffee_types WHERE id = %s", (type_id,)) is None:
+                return False
+            self._execute(cursor, "DELETE FROM coffee_numeric_characteristics WHERE coffee_type_id = %s", (type_id,))
+            self._execute(cursor, "DELETE FROM coffee_categorical_characteristics WHERE coffee_type_id = %s", (type_id,))
+            self._execute(cursor, "DELETE FROM coffee_types WHERE id = %s", (type_id,))
+            self._bump_version(cursor)
+            return True
+
+    # --- Характеристики ---
+
+    def list_characteristics(self, char_type=None):
+        if char_type is None:
+            return self._fetch("SELECT id, name, type FROM characteristics ORDER BY id")
+        return self._fetch("SELECT id, name, type FROM characteristics WHERE type = %s ORDER BY id", (char_type,))
+
+    def get_characteristic(self, char_id):
+        rows = self._fetch("SELECT id, name, type FROM characteristics WHERE id = %s", (char_id,))
+        return rows[0] if rows else None
+
+    def find_characteristic(self, name):
+        rows = self._fetch("SELECT id, name, type FROM characteristics WHERE name = %s", (name,))
+        return rows[0] if rows else None
+
+    def characteristics_with_limits(self, char_type=None):
+        """Характеристики с глобальными ограничениями (limits_id - None, если ограничений нет)"""
+        sql = """
+            SELECT c.id, c.name, c.type,
+                   ncl.id AS limits_id, ncl.min_value, ncl.max_value
+            FROM characteristics c
+            LEFT JOIN numeric_characteristic_limits ncl ON c.id = ncl.characteristic_id
+        """
+        if char_type is None:
+            return self._fetch(sql + " ORDER BY c.name")
+        return self._fetch(sql + " WHERE c.type = %s ORDER BY c.name", (char_type,))
+
+    def numeric_limits(self):
+        """id характеристики -> (min, max) глобальных ограничений"""
+        rows = self._fetch("SELECT characteristic_id, min_value, max_value FROM numeric_characteristic_limits")
+        return {row['characteristic_id']: (row['min_value'], row['max_value']) for row in rows}
+
+    def add_characteristic(self, name, char_type, limits=None, values=()):
+        """Добавляет характеристику с ограничениями (числовая) или значениями (категориальная)"""
+        with self._session() as cursor:
+            self._execute(cursor, "INSERT INTO characteristics (name, type) VALUES (%s, %s)", (name, char_type))
+            char_id = cursor.lastrowid
+            if limits is not None:
+                self._execute(cursor, """
+                    INSERT INTO numeric_characteristic_limits (characteristic_id, min_value, max_value)
+                    VALUES (%s, %s, %s)
+                """, (char_id, limits[0], limits[1]))
+            self._executemany(
+                cursor, "INSERT INTO categorical_values (characteristic_id, value) VALUES (%s, %s)",
+                [(char_id, value) for value in values]
+            )
+            self._bump_version(cursor)
+            return char_id
+
+    def delete_characteristic(self, char_id):
+        with self._session() as cursor:
+            self._execute(cursor, "DELETE FROM numeric_characteristic_limits WHERE characteristic_id = %s", (char_id,))
+            self._execute(cursor, "DELETE FROM categorical_values WHERE characteristic_id = %s", (char_id,))
+            self._execute(cursor, "DELETE FROM characteristics WHERE id = %s", (char_id,))
+            self._bump_version(cursor)
+
+    def set_numeric_limits(self, char_id, min_value, max_value):
+        with self._session() as cursor:
+            self._execute(cursor, """
+                UPDATE numeric_characteristic_limits SET min_value = %s, max_value = %s
+                WHERE characteristic_id = %s
+            """, (min_value, max_value, char_id))
+            self._bump_version(cursor)
+
+    def replace_categorical_values(self, char_id, values):
+        with self._session() as cursor:
+            self._execute(cursor, "DELETE FROM categorical_values WHERE characteristic_id = %s", (char_id,))
+            self._executemany(
+                cursor, "INSERT INTO categorical_values (characteristic_id, value) VALUES (%s, %s)",
+                [(char_id, value) for value in values]
+            )
+            self._bump_version(cursor)
+
+    # --- Значения категориальных характеристик ---
+
+    def list_categorical_values(self, char_id=None):
+        """Значения (characteristic_id, id, value) по возрастанию значения"""
+        if char_id is None:
+            return self._fetch("""
+                SELECT characteristic_id, id, value FROM categorical_values ORDER BY characteristic_id, value
+            """)
+        return self._fetch("""
+            SELECT characteristic_id, id, value FROM categorical_values
+            WHERE characteristic_id = %s ORDER BY value
+        """, (char_id,))
+
+    def categorical_characteristic_values(self):
+        """Категориальные характеристики и их значения: строка на значение (value - None, если значений нет)"""
+        return self._fetch("""
+            SELECT c.id, c.name, c.type, cv.value
+            FROM characteristics c
+            LEFT JOIN categorical_values cv ON c.id = cv.characteristic_id
+            WHERE c.type = 'categorical'
+            ORDER BY c.name, c.id, cv.value
+        """)
+
+    def _value_ids(self, cursor, char_ids):
+        """Одна карта (id характеристики, значение) -> id значения для заданных характеристик"""
+        if not char_ids:
+            return {}
+        rows = self._query(cursor, f"""
+            SELECT characteristic_id, id, value FROM categorical_values
+            WHERE characteristic_id IN ({self._in(char_ids)})
+        """, tuple(char_ids))
+        return {(row['characteristic_id'], row['value']): row['id'] for row in rows}
+
+    # --- Характеристики сортов ---
+
+    def type_characteristic_ids(self, type_id):
+        """id числовых и категориальных характеристик, заданных у сорта"""
+        with self._session() as cursor:
+            numeric = self._query(cursor, """
+                SELECT characteristic_id FROM coffee_numeric_characteristics WHERE coffee_type_id = %s
+            """, (type_id,))
+            categorical = self._query(cursor, """
+                SELECT DISTINCT characteristic_id FROM coffee_categorical_characteristics WHERE coffee_type_id = %s
+            """, (type_id,))
+        return [row['characteristic_id'] for row in numeric], [row['characteristic_id'] for row in categorical]
+
+    def type_numeric_ranges(self, type_id):
+        """Диапазоны числовых характеристик сорта с глобальными ограничениями (limits_id - None, если их нет)"""
+        return self._fetch("""
+            SELECT c.id, c.name, c.type, cn.min_value, cn.max_value,
+                   ncl.id AS limits_id, ncl.min_value AS global_min, ncl.max_value AS global_max
+            FROM coffee_numeric_characteristics cn
+            JOIN characteristics c ON c.id = cn.characteristic_id
+            LEFT JOIN numeric_characteristic_limits ncl ON c.id = ncl.characteristic_id
+            WHERE cn.coffee_type_id = %s
+            ORDER BY cn.id
+        """, (type_id,))
+
+    def type_categorical_values(self, type_id):
+        """Выбранные значения категориальных характеристик сорта: строка на значение"""
+        return self._fetch("""
+            SELECT c.id, c.name, c.type, cv.value
+            FROM coffee_categorical_characteristics cc
+            JOIN characteristics c ON c.id = cc.characteristic_id
+            JOIN categorical_values cv ON cv.id = cc.categorical_value_id
+            WHERE cc.coffee_type_id = %s
+            ORDER BY cc.id
+        """, (type_id,))
+
+    def add_type_characteristic(self, type_id, char_id, numeric=None, values=()):
+        """Добавляет сорту числовой диапазон (numeric=(min, max)) или значения категориальной характеристики.
+
+        Неизвестные значения пропускаются; возвращает число добавленных строк.
+        """
+        with self._session() as cursor:
+            if numeric is not None:
+                self._execute(cursor, """
+                    INSERT INTO coffee_numeric_characteristics
+                    (coffee_type_id, characteristic_id, min_value, max_value)
+                    VALUES (%s, %s, %s, %s)
+                """, (type_id, char_id, numeric[0], numeric[1]))
+                added = 1
+            else:
+                value_ids = self._value_ids(cursor, [char_id])
+                rows = [
+                    (type_id, char_id, value_ids[(char_id, value)])
+                    for value in dict.fromkeys(values) if (char_id, value) in value_ids
+                ]
+                self._executemany(cursor, """
+                    INSERT INTO coffee_categorical_characteristics
+                    (coffee_type_id, characteristic_id, categorical_value_id)
+                    VALUES (%s, %s, %s)
+                """, rows)
+                added = len(rows)
+            if added:
+                self._bump_version(cursor)
+            return added
+
+    def add_categorical_assignment(self, type_id, char_id, value_id):
+        with self._session() as cursor:
+            self._execute(cursor, """
+                INSERT INTO coffee_categorical_characteristics
+                (coffee_type_id, characteristic_id, categorical_value_id)
+                VALUES (%s, %s, %s)
+            """, (type_id, char_id, value_id))
+            self._bump_version(cursor)
+
+    def delete_type_characteristic(self, type_id, char_id):
+        """Удаляет характеристику у сорта; возвращает число удалённых строк"""
+        with self._session() as cursor:
+            self._execute(cursor, """
+                DELETE FROM coffee_numeric_characteristics WHERE coffee_type_id = %s AND characteristic_id = %s
+            """, (type_id, char_id))
+            deleted = cursor.rowcount
+            self._execute(cursor, """
+                DELETE FROM coffee_categorical_characteristics WHERE coffee_type_id = %s AND characteristic_id = %s
+            """, (type_id, char_id))
+            deleted += cursor.rowcount
+            if deleted:
+                self._bump_version(cursor)
+            return deleted
+
+    def replace_type_characteristics(self, type_id, numeric, categorical, create_values=False):
+        """Заменяет все характеристики сорта.
+
+        numeric - [(id характеристики, min, max)], categorical - [(id характеристики, значение)].
+        Неизвестные значения создаются (create_values) или пропускаются.
+        """
+        with self._session() as cursor:
+            self._execute(cursor, "DELETE FROM coffee_numeric_characteristics WHERE coffee_type_id = %s", (type_id,))
+            self._execute(cursor, "DELETE FROM coffee_categorical_characteristics WHERE coffee_type_id = %s", (type_id,))
+            self._executemany(cursor, """
+                INSERT INTO coffee_numeric_characteristics
+                (coffee_type_id, characteristic_id, min_value, max_value)
+                VALUES (%s, %s, %s, %s)
+            """, [(type_id, char_id, min_value, max_value) for char_id, min_value, max_value in numeric])
+
+            categorical = list(dict.fromkeys(categorical))
+            value_ids = self._value_ids(cursor, sorted({char_id for char_id, _ in categorical}))
+            missing = [item for item in categorical if item not in value_ids]
+            if create_values and missing:
+                self._executemany(
+                    cursor, "INSERT INTO categorical_values (characteristic_id, value) VALUES (%s, %s)", missing
+                )
+                value_ids.update(self._value_ids(cursor, sorted({char_id for char_id, _ in missing})))
+            self._executemany(cursor, """
+                INSERT INTO coffee_categorical_characteristics
+                (coffee_type_id, characteristic_id, categorical_value_id)
+                VALUES (%s, %s, %s)
+            """, [(type_id, char_id, value_ids[(char_id, value)])
+                  for char_id, value in categorical if (char_id, value) in value_ids])
+            self._bump_version(cursor)
+
+    def update_type_values(self, type_id, numeric, categorical):
+        """Обновляет диапазоны сорта и заменяет выбранные значения его категориальных характеристик.
+
+        numeric - [(id характеристики, min, max)], categorical - {id характеристики: [значения]};
+        неизвестные значения пропускаются.
+        """
+        with self._session() as cursor:
+            self._executemany(cursor, """
+                UPDATE coffee_numeric_characteristics
+                SET min_value = %s, max_value = %s
+                WHERE coffee_type_id = %s AND characteristic_id = %s
+            """, [(min_value, max_value, type_id, char_id) for char_id, min_value, max_value in numeric])
+
+            value_ids = self._value_ids(cursor, sorted(categorical))
+            self._executemany(cursor, """
+                DELETE FROM coffee_categorical_characteristics
+                WHERE coffee_type_id = %s AND characteristic_id = %s
+            """, [(type_id, char_id) for char_id in categorical])
+            self._executemany(cursor, """
+                INSERT INTO coffee_categorical_characteristics
+                (coffee_type_id, characteristic_id, categorical_value_id)
+                VALUES (%s, %s, %s)
+            """, [
+                (type_id, char_id, value_ids[(char_id, value)])
+                for char_id, values in categorical.items()
+                for value in dict.fromkeys(values) if (char_id, value) in value_ids
+            ])
+            self._bump_version(cursor)
+
+    def import_catalog(self, plan):
+        """Записывает проверенный каталог (см. bulk_import.validate_catalog) фиксированным числом запросов"""
+        names = [entry['name'] for entry in plan]
+
+        def type_ids(cursor):
+            # Названия в MySQL сравниваются без учёта регистра, в SQLite (NOCASE) - только
+            # для латиницы; при нескольких совпадениях точное название важнее
+            rows = self._query(cursor, f"SELECT id, name FROM coffee_types WHERE name IN ({self._in(names)})", tuple(names))
+            exact = set(names)
+            rows.sort(key=lambda row: row['name'] in exact)
+            return {row['name'].casefold(): row['id'] for row in rows}
+
+        with self._session() as cursor:
+            ids = type_ids(cursor)
+            new_names = [name for name in names if name.casefold() not in ids]
+            if new_names:
+                self._executemany(cursor, "INSERT INTO coffee_types (name) VALUES (%s)", [(name,) for name in new_names])
+                ids = type_ids(cursor)
+
+            affected = tuple(ids[name.casefold()] for name in names)
+            self._execute(cursor, f"""
+                DELETE FROM coffee_numeric_characteristics WHERE coffee_type_id IN ({self._in(affected)})
+            """, affected)
+            self._execute(cursor, f"""
+                DELETE FROM coffee_categorical_characteristics WHERE coffee_type_id IN ({self._in(affected)})
+            """, affected)
+
+            numeric_rows = [
+                (ids[entry['name'].casefold()], char_id, min_value, max_value)
+                for entry in plan for char_id, min_value, max_value in entry['numeric']
+            ]
+            self._executemany(cursor, """
+                INSERT INTO coffee_numeric_characteristics
+                (coffee_type_id, characteristic_id, min_value, max_value)
+                VALUES (%s, %s, %s, %s)
+            """, numeric_rows)
+            categorical_rows = [
+                (ids[entry['name'].casefold()], char_id, value_id)
+                for entry in plan for char_id, value_id in entry['categorical']
+            ]
+            self._executemany(cursor, """
+                INSERT INTO coffee_categorical_characteristics
+                (coffee_type_id, characteristic_id, categorical_value_id)
+                VALUES (%s, %s, %s)
+            """, categorical_rows)
+            self._bump_version(cursor)
+
+        return {
+            'coffee_types': len(plan),
+            'created': len(new_names),
+            'updated': len(plan) - len(new_names),
+            'numeric_ranges': len(numeric_rows),
+            'categorical_values': len(categorical_rows)
+        }
+
+    # --- Полнота данных ---
+
+    def completeness_data(self):
+        """Данные отчёта о полноте: сорта, число характеристик, некорректные диапазоны, пустые значения"""
+        with self._session() as cursor:
+            coffee_types = self._query(cursor, "SELECT id, name FROM coffee_types ORDER BY id")
+            counts = self._query(cursor, """
+                SELECT coffee_type_id, COUNT(*) AS count
+                FROM coffee_numeric_characteristics
+                GROUP BY coffee_type_id
+                UNION ALL
+                SELECT coffee_type_id, COUNT(*) AS count
+                FROM coffee_categorical_characteristics
+                GROUP BY coffee_type_id
+            """)
+            invalid_numeric = self._query(cursor, """
+                SELECT
+                    cn.coffee_type_id,
+                    c.name,
+                    cn.min_value,
+                    cn.max_value,
+                    ncl.min_value AS global_min,
+                    ncl.max_value AS global_max
+                FROM coffee_numeric_characteristics cn
+                JOIN characteristics c ON c.id = cn.characteristic_id
+                JOIN numeric_characteristic_limits ncl ON c.id = ncl.characteristic_id
+                WHERE cn.min_value IS NULL
+                    OR cn.max_value IS NULL
+                    OR cn.min_value < ncl.min_value
+                    OR cn.max_value > ncl.max_value
+                    OR cn.min_value = 0 AND cn.max_value = 0
+                ORDER BY cn.coffee_type_id, cn.id
+            """)
+            empty_categorical = self._query(cursor, """
+                SELECT cc.coffee_type_id, c.name
+                FROM coffee_categorical_characteristics cc
+                JOIN characteristics c ON c.id = cc.characteristic_id
+                GROUP BY cc.coffee_type_id, cc.characteristic_id, c.name
+                HAVING COUNT(cc.categorical_value_id) = 0
+                ORDER BY cc.coffee_type_id, MIN(cc.id)
+            """)
+        characteristic_counts = {}
+        for row in counts:
+            characteristic_counts[row['coffee_type_id']] = characteristic_counts.get(row['coffee_type_id'], 0) + row['count']
+        return coffee_types, characteristic_counts, invalid_numeric, empty_categorical
+
+
+class MySQLRepository(Repository):
+    """Репозиторий на сервере MySQL; соединения берутся из пула db.py"""
+
+    backend = 'mysql'
+
+    def __init__(self):
+        self._migrate()
+
+    def _migrate(self):
+        """Создаёт таблицу версии в базах, развёрнутых до её появления в init.sql.
+
+        Каждая запись эксперта повышает версию в своей транзакции, поэтому без
+        таблицы не прошло бы ни одно изменение. Повторный запуск ничего не меняет.
+        """
+        with self._session() as cursor:
+            self._execute(cursor, """
+                CREATE TABLE IF NOT EXISTS knowledge_base_version (
+                    id TINYINT PRIMARY KEY,
+                    version BIGINT NOT NULL DEFAULT 0
+                )
+            """)
+            self._execute(cursor, "INSERT IGNORE INTO knowledge_base_version (id, version) VALUES (1, 0)")
+
+    def _connect(self):
+        # mysql.connector нужен только этой реализации
+        from db import get_db_connection
+        return get_db_connection()
+
+    def _release(self, conn):
+        conn.close()
+
+    def _cursor(self, conn):
+        return conn.cursor(dictionary=True)
+
+    def is_duplicate_error(self, error):
+        return getattr(error, 'errno', None) == 1062
+
+    def pool_metrics(self):
+        from db import pool_metrics
+        return pool_metrics()
+
+
+# Схема SQLite повторяет init.sql; ENUM заменён проверкой, AUTO_INCREMENT - INTEGER PRIMARY KEY
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS coffee_types (
+    id INTEGER PRIMARY KEY,
+    name VARCHAR(255) NOT NULL UNIQUE COLLATE NOCASE,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS characteristics (
+    id INTEGER PRIMARY KEY,
+    name VARCHAR(255) NOT NULL UNIQUE COLLATE NOCASE,
+    type TEXT NOT NULL CHECK (type IN ('numeric', 'categorical')),
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS numeric_characteristic_limits (
+    id INTEGER PRIMARY KEY,
+    characteristic_id INTEGER NOT NULL UNIQUE REFERENCES characteristics(id),
+    min_value DECIMAL(10,2),
+    max_value DECIMAL(10,2)
+);
+
+CREATE TABLE IF NOT EXISTS categorical_values (
+    id INTEGER PRIMARY KEY,
+    characteristic_id INTEGER NOT NULL REFERENCES characteristics(id),
+    value VARCHAR(100) NOT NULL,
+    UNIQUE (characteristic_id, value)
+);
+
+CREATE TABLE IF NOT EXISTS coffee_numeric_characteristics (
+    id INTEGER PRIMARY KEY,
+    coffee_type_id INTEGER NOT NULL REFERENCES coffee_types(id) ON DELETE CASCADE,
+    characteristic_id INTEGER NOT NULL REFERENCES characteristics(id) ON DELETE CASCADE,
+    min_value DECIMAL(10,2),
+    max_value DECIMAL(10,2),
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (coffee_type_id, characteristic_id)
+);
+
+CREATE TABLE IF NOT EXISTS coffee_categorical_characteristics (
+    id INTEGER PRIMARY KEY,
+    coffee_type_id INTEGER NOT NULL REFERENCES coffee_types(id) ON DELETE CASCADE,
+    characteristic_id INTEGER NOT NULL REFERENCES characteristics(id) ON DELETE CASCADE,
+    categorical_value_id INTEGER NOT NULL REFERENCES categorical_values(id) ON DELETE CASCADE,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (coffee_type_id, characteristic_id, categorical_value_id)
+);
+
+CREATE TABLE IF NOT EXISTS knowledge_base_version (
+    id INTEGER PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+);
+
+INSERT OR IGNORE INTO knowledge_base_version (id, version) VALUES (1, 0);
+"""
+
+
+# Границы диапазонов приходят из API как Decimal; sqlite3 их не принимает
+sqlite3.register_adapter(Decimal, float)
+
+
+def _dict_row(cursor, row):
+    return {column[0]: value for column, value in zip(cursor.description, row)}
+
+
+class SQLiteRepository(Repository):
+    """Репозиторий на локальном файле SQLite: одно соединение на поток, без сервера"""
+
+    backend = 'sqlite'
+    placeholder = '?'
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._connect()
+        conn.executescript(SQLITE_SCHEMA)
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Транзакции открываются явно в _begin
+            conn = sqlite3.connect(self.path, isolation_level=None, timeout=30)
+            conn.row_factory = _dict_row
+            conn.execute("PRAGMA foreign_keys = ON")
+            # WAL: читатели из других процессов не блокируют запись
+            conn.execute("PRAGMA journal_mode = WAL")
+            self._local.conn = conn
+        return conn
+
+    def _release(self, conn):
+        # Соединение остаётся открытым для следующих вызовов в этом потоке
+        pass
+
+    def _cursor(self, conn):
+        return conn.cursor()
+
+    def _begin(self, conn):
+        conn.execute("BEGIN")
+
+    def is_duplicate_error(self, error):
+        return isinstance(error, sqlite3.IntegrityError) and 'UNIQUE' in str(error)
+
+    def load_from_snapshot(self, snapshot):
+        """Заполняет пустую базу данными снимка базы знаний с сохранением id"""
+        with self._session() as cursor:
+            if self._query_one(cursor, "SELECT id FROM coffee_types") is not None:
+                raise ValueError(f"База {self.path} уже содержит данные")
+            self._executemany(cursor, "INSERT INTO coffee_types (id, name) VALUES (%s, %s)", list(snapshot.coffee_types))
+            self._executemany(cursor, "INSERT INTO characteristics (id, name, type) VALUES (%s, %s, %s)", [
+                (char_id, char['name'], char['type']) for char_id, char in sorted(snapshot.characteristics.items())
+            ])
+            self._executemany(cursor, """
+                INSERT INTO numeric_characteristic_limits (characteristic_id, min_value, max_value) VALUES (%s, %s, %s)
+            """, [(char_id, bounds[0], bounds[1]) for char_id, bounds in sorted(snapshot.numeric_limits.items())])
+            self._executemany(cursor, """
+                INSERT INTO categorical_values (id, characteristic_id, value) VALUES (%s, %s, %s)
+            """, [
+                (value_id, char_id, value)
+                for char_id, values in sorted(snapshot.categorical_values.items()) for value_id, value in values
+            ])
+            self._executemany(cursor, """
+                INSERT INTO coffee_numeric_characteristics (coffee_type_id, characteristic_id, min_value, max_value)
+                VALUES (%s, %s, %s, %s)
+            """, [
+                (type_id, char_id, bounds[0], bounds[1])
+                for type_id, ranges in sorted(snapshot.numeric_ranges.items())
+                for char_id, bounds in sorted(ranges.items())
+            ])
+            value_ids = {
+                (char_id, value): value_id
+                for char_id, values in snapshot.categorical_values.items() for value_id, value in values
+            }
+            self._executemany(cursor, """
+                INSERT INTO coffee_categorical_characteristics (coffee_type_id, characteristic_id, categorical_value_id)
+                VALUES (%s, %s, %s)
+            """, [
+                (type_id, char_id, value_ids[(char_id, value)])
+                for type_id, chars in sorted(snapshot.categorical_assignments.items())
+                for char_id, values in sorted(chars.items()) for value in values
+            ])
+            self._execute(cursor, "UPDATE knowledge_base_version SET version = %s WHERE id = 1", (snapshot.version or 0,))
+
+
+_repository = None
+_repository_lock = threading.Lock()
+
+
+def create_repository(config=storage_config):
+    if config['backend'] == 'mysql':
+        return MySQLRepository()
+    if config['backend'] == 'sqlite':
+        return SQLiteRepository(config['sqlite_path'])
+    raise ValueError(f"Неизвестное хранилище: {config['backend']}")
+
+
+def get_repository():
+    """Репозиторий, выбранный в storage_config (создаётся при первом обращении)"""
+    global _repository
+    if _repository is None:
+        with _repository_lock:
+            if _repository is None:
+                _repository = create_repository()
+    return _repository
+
+
+def init_app(app):
+    """Подключает к приложению обслуживание соединений выбранного хранилища"""
+    if storage_config['backend'] == 'mysql':
+        from db import init_app as init_db
+        init_db(app)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Хранилище базы знаний')
+    commands = parser.add_subparsers(dest='command', required=True)
+    init_parser = commands.add_parser('init-sqlite', help='Создать базу SQLite')
+    init_parser.add_argument('path')
+    init_parser.add_argument('--snapshot', default=None,
+                             help='Заполнить данными из файла снимка (kb_snapshot.py export)')
+    args = parser.parse_args()
+
+    try:
+        repository = SQLiteRepository(args.path)
+        if args.snapshot:
+            from knowledge_base import load_snapshot_file
+            snapshot = load_snapshot_file(args.snapshot)
+            repository.load_from_snapshot(snapshot)
+            print(f"База {args.path} заполнена: сортов {len(snapshot.coffee_types)}, версия {snapshot.version}")
+        else:
+            print(f"Схема базы {args.path} создана")
+    except (OSError, ValueError, sqlite3.Error) as e:
+        print(f"Ошибка: {e}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,36 @@
+import os
+import sys
+import pytest
+
+# Модули backend импортируются по имени, как при запуске из каталога backend
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    """Реестр моделей во временном каталоге"""
+    import model_registry
+    registry_dir = tmp_path / 'registry'
+    monkeypatch.setattr(model_registry, 'REGISTRY_DIR', str(registry_dir))
+    monkeypatch.setattr(model_registry, 'VERSIONS_DIR', str(registry_dir / 'versions'))
+    monkeypatch.setattr(model_registry, 'CURRENT_PATH', str(registry_dir / 'CURRENT'))
+    monkeypatch.setattr(model_registry, 'TRAINING_LOCK_PATH', str(registry_dir / 'TRAINING.lock'))
+    return model_registry
+
+
+@pytest.fixture
+def sqlite_repository(tmp_path, monkeypatch):
+    """Пустая база знаний SQLite во временном файле, установленная как хранилище приложения"""
+    import knowledge_base
+    import storage
+    from config import kb_config
+    repository = storage.SQLiteRepository(str(tmp_path / 'kb.sqlite3'))
+    monkeypatch.setattr(storage, '_repository', repository)
+    monkeypatch.setitem(kb_config, 'snapshot_path', None)
+    # Кэши снимка и производных ответов помнят только номер версии, а не базу
+    monkeypatch.setattr(knowledge_base, '_derived', {})
+    knowledge_base.invalidate_snapshot()
+    yield repository
+    knowledge_base.invalidate_snapshot()
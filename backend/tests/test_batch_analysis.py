@@ -0,0 +1,55 @@
+"""Пакетная ML-классификация отклоняет образцы, которые нельзя закодировать"""
+import numpy as np
+import pytest
+from config import ml_config
+from feature_encoder import FeatureEncoder
+
+MAPPING = {
+    'numeric': {'1': 'acidity'},
+    'categorical': {'2': {'name': 'region', 'values': ['Кения']}}
+}
+
+
+def _sample(numeric, categorical=None):
+    return {'characteristics': {'numeric': numeric, 'categorical': categorical or {}}}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setitem(ml_config, 'preload_model', False)
+    import app
+
+    class FakeClassifier:
+        class_mapping = {}
+
+        def predict_batch(self, samples):
+            raise AssertionError('образцы с ошибкой не должны доходить до модели')
+
+    monkeypatch.setattr(app, 'ready_classifier', lambda: FakeClassifier())
+    return app.app.test_client()
+
+
+def test_strict_encoding_reports_sample_index():
+    encoder = FeatureEncoder(MAPPING)
+    X = encoder.encode_batch([_sample({'1': '5.5'}, {'2': 'Кения'}), _sample({'1': 'abc'})])
+    np.testing.assert_array_equal(X, [[5.5, 1.0], [0.0, 0.0]])
+    with pytest.raises(ValueError, match='Образец 1'):
+        encoder.encode_batch([_sample({'1': 5}), _sample({'1': 'abc'})], strict=True)
+
+
+@pytest.mark.parametrize('sample', [
+    _sample({'1': 'abc'}),
+    _sample({'1': None}),
+    _sample({'1': True}),
+    _sample({'1': 'nan'}),
+    _sample(['acidity']),
+    {'characteristics': ['acidity']},
+    {'characteristics': {'numeric': {}}},
+    'образец'
+])
+def test_batch_rejects_invalid_sample_with_index(client, sample):
+    response = client.post('/api/specialist/analyze-ml/batch', json={'samples': [_sample({'1': 5}), sample]})
+    assert response.status_code == 400
+    body = response.get_json()
+    assert body['index'] == 1
+    assert body['error'].startswith('Образец 1')
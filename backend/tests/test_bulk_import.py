@@ -0,0 +1,107 @@
+"""Проверка каталога массового импорта и его запись"""
+import pytest
+from flask import Flask
+import knowledge_base
+from bulk_import import CatalogError, import_catalog, parse_csv, validate_catalog
+
+
+@pytest.fixture
+def repository(sqlite_repository):
+    sqlite_repository.add_coffee_type('Арабика')
+    sqlite_repository.add_characteristic('acidity', 'numeric', limits=(0, 10))
+    sqlite_repository.add_characteristic('region', 'categorical', values=['Эфиопия', 'Кения'])
+    return sqlite_repository
+
+
+@pytest.fixture
+def snapshot(repository):
+    return knowledge_base.load_snapshot_from_db()
+
+
+def _entry(numeric=None, categorical=None, name='Либерика'):
+    return {'name': name, 'characteristics': {'numeric': numeric or [], 'categorical': categorical or []}}
+
+
+def _errors(snapshot, entries):
+    with pytest.raises(CatalogError) as error:
+        validate_catalog(snapshot, entries)
+    return error.value.errors
+
+
+def test_valid_catalog(snapshot):
+    plan = validate_catalog(snapshot, [_entry(
+        [{'name': 'acidity', 'min_value': '4,5', 'max_value': 6}],
+        [{'name': 'region', 'values': ['Кения', 'Кения']}]
+    )])
+    (entry,) = plan
+    assert entry['numeric'] == [(snapshot.characteristic_ids_by_name['acidity'], 4.5, 6.0)]
+    assert len(entry['categorical']) == 1
+
+
+@pytest.mark.parametrize('entry', [
+    {'name': 'Либерика', 'characteristics': ['acidity']},
+    {'name': 'Либерика', 'characteristics': {'numeric': 'acidity'}},
+    _entry(numeric=['acidity']),
+    _entry(numeric=[5]),
+    _entry(categorical=[None]),
+    _entry(categorical=[{'name': 'region', 'values': 'Кения'}]),
+    _entry(categorical=[{'name': 'region', 'values': [['Кения']]}]),
+    _entry(categorical=[{'name': 'region', 'values': [{'value': 'Кения'}]}]),
+    _entry(numeric=[{'name': ['acidity'], 'min_value': 1, 'max_value': 2}]),
+    _entry(numeric=[{'id': [1], 'min_value': 1, 'max_value': 2}]),
+    'Либерика',
+])
+def test_malformed_entries_are_catalog_errors(snapshot, entry):
+    assert _errors(snapshot, [entry])
+
+
+@pytest.mark.parametrize('bounds', [
+    ('nan', 5), (1, 'inf'), ('-inf', 5), (float('nan'), 5), (1, float('inf')), (True, 5), (None, 5), ('abc', 5)
+])
+def test_non_finite_bounds_rejected(snapshot, bounds):
+    (error,) = _errors(snapshot, [_entry([{'name': 'acidity', 'min_value': bounds[0], 'max_value': bounds[1]}])])
+    assert 'конечными числами' in error
+
+
+def test_range_checks(snapshot):
+    errors = _errors(snapshot, [
+        _entry([{'name': 'acidity', 'min_value': 6, 'max_value': 4}]),
+        _entry([{'name': 'acidity', 'min_value': 1, 'max_value': 11}], name='Робуста'),
+        _entry([{'name': 'region', 'min_value': 1, 'max_value': 2}], name='Эксцельса'),
+        _entry(name='либерика')
+    ])
+    assert len(errors) == 4
+
+
+def test_csv_catalog(snapshot):
+    entries = parse_csv(
+        "coffee_type,characteristic,min_value,max_value,value\n"
+        "Либерика,acidity,1,2,\n"
+        "Либерика,region,,,Кения\n"
+        "Робуста,acidity,3,4,\n"
+    )
+    plan = validate_catalog(snapshot, entries)
+    assert [(entry['name'], len(entry['numeric']), len(entry['categorical'])) for entry in plan] == [
+        ('Либерика', 1, 1), ('Робуста', 1, 0)
+    ]
+
+
+def test_import_writes_catalog(repository):
+    summary = import_catalog([_entry([{'name': 'acidity', 'min_value': 1, 'max_value': 2}])])
+    assert (summary['created'], summary['numeric_ranges']) == (1, 1)
+    assert 'Либерика' in [name for _, name in knowledge_base.get_snapshot().coffee_types]
+
+
+def test_import_route_rejects_malformed_catalog(repository):
+    from routes.knowledge_base_import import knowledge_base_import
+    app = Flask(__name__)
+    app.register_blueprint(knowledge_base_import)
+    client = app.test_client()
+    response = client.post('/api/expert/import', json=[_entry(numeric=['acidity'])])
+    assert response.status_code == 400
+    assert response.get_json()['errors']
+    response = client.post(
+        '/api/expert/import', data='[{"name": "Либерика", "characteristics": {"numeric": '
+        '[{"name": "acidity", "min_value": NaN, "max_value": 2}]}}]', content_type='application/json'
+    )
+    assert response.status_code == 400
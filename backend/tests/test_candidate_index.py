@@ -0,0 +1,59 @@
+"""Битовый индекс кандидатов согласован с векторизованным IntervalMatcher"""
+import random
+import pytest
+import knowledge_base
+
+GRID = [step / 2 for step in range(11)]  # общие концы интервалов 0 - 5
+VALUES = ['Африка', 'Азия', 'Америка']
+
+
+@pytest.fixture
+def snapshot(sqlite_repository):
+    """Случайные сорта с совпадающими концами интервалов и частично заданными характеристиками"""
+    rng = random.Random(7)
+    repository = sqlite_repository
+    numeric = [repository.add_characteristic(f'numeric_{index}', 'numeric', limits=(0, 5)) for index in range(3)]
+    categorical = [
+        repository.add_characteristic(f'categorical_{index}', 'categorical', values=VALUES) for index in range(2)
+    ]
+    for index in range(12):
+        type_id = repository.add_coffee_type(f'Сорт {index}')
+        ranges = [
+            (char_id, *sorted(rng.sample(GRID, 2))) if rng.random() < 0.8 else None for char_id in numeric
+        ]
+        # Вырожденный интервал из одной точки
+        if index == 0:
+            ranges[0] = (numeric[0], 2.5, 2.5)
+        values = [
+            (char_id, value) for char_id in categorical for value in VALUES if rng.random() < 0.5
+        ]
+        repository.replace_type_characteristics(type_id, [r for r in ranges if r], values)
+    return knowledge_base.load_snapshot_from_db(), numeric, categorical
+
+
+def _samples(numeric, categorical):
+    rng = random.Random(11)
+    points = GRID + [value + 0.25 for value in GRID] + [-1.0, 6.0]
+    for _ in range(500):
+        numeric_chars = {
+            str(char_id): rng.choice(points) for char_id in numeric if rng.random() < 0.7
+        }
+        categorical_chars = {
+            str(char_id): rng.choice(VALUES + ['нет такого']) for char_id in categorical if rng.random() < 0.5
+        }
+        yield numeric_chars, categorical_chars
+    # Пустой образец и неизвестные характеристики
+    yield {}, {}
+    yield {'999': 1.0}, {}
+    yield {}, {'999': 'Африка'}
+
+
+def test_index_agrees_with_matcher(snapshot):
+    snapshot, numeric, categorical = snapshot
+    index, matcher = snapshot.candidate_index, snapshot.matcher
+    for numeric_chars, categorical_chars in _samples(numeric, categorical):
+        summary = matcher.match(numeric_chars, categorical_chars).summary
+        expected = [int(type_id) for type_id in summary['type_id'][summary['matches']]]
+        candidates = index.candidates(numeric_chars, categorical_chars)
+        assert index.type_ids_of(candidates) == expected, (numeric_chars, categorical_chars)
+        assert index.first_type_id(candidates) == (expected[0] if expected else None)
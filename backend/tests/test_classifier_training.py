@@ -0,0 +1,60 @@
+"""Обучение в процессе сервера вводит модель в работу целиком через реестр"""
+import pytest
+
+pytest.importorskip('tensorflow')
+
+import ml_model
+from config import ml_config
+
+
+@pytest.fixture
+def knowledge(sqlite_repository):
+    """Три хорошо разделимых сорта в базе SQLite"""
+    repository = sqlite_repository
+    acidity = repository.add_characteristic('acidity', 'numeric', limits=(0, 30))
+    body = repository.add_characteristic('body', 'numeric', limits=(0, 30))
+    region = repository.add_characteristic('region', 'categorical', values=['Африка', 'Азия', 'Америка'])
+    for index, (name, value) in enumerate((('Арабика', 'Африка'), ('Робуста', 'Азия'), ('Либерика', 'Америка'))):
+        type_id = repository.add_coffee_type(name)
+        low = index * 10
+        repository.replace_type_characteristics(
+            type_id, [(acidity, low, low + 5), (body, low, low + 5)], [(region, value)]
+        )
+    return repository
+
+
+@pytest.fixture
+def small_training(tmp_path, monkeypatch):
+    monkeypatch.setitem(ml_config, 'samples_per_class', 100)
+    monkeypatch.setitem(ml_config, 'validation_samples_per_class', 20)
+    monkeypatch.setitem(ml_config, 'max_epochs', 30)
+    monkeypatch.setattr(ml_model, 'MODELS_DIR', str(tmp_path))
+    monkeypatch.setattr(ml_model, 'MODEL_PATH', str(tmp_path / 'legacy.h5'))
+    monkeypatch.setattr(ml_model, 'NETWORK_PATH', str(tmp_path / 'network.json'))
+    cached = ml_model.cached_training_set
+    monkeypatch.setattr(
+        ml_model, 'cached_training_set',
+        lambda *args, **kwargs: cached(*args, cache_dir=str(tmp_path / 'dataset_cache'), **kwargs)
+    )
+
+
+def test_in_process_training_activates_registered_version(knowledge, registry, small_training):
+    classifier = ml_model.CoffeeClassifier()
+
+    assert registry.current_version() == 'v000001'
+    assert classifier.serving_version == 'v000001'
+    # Подмена одна: модель, scaler и сорта пришли из метаданных той же версии
+    assert classifier.model_version == 1
+    metadata = registry.read_metadata('v000001')
+    assert classifier.class_mapping == metadata['class_mapping']
+    assert classifier.scaler.to_dict() == metadata['numeric_scaler']
+    assert classifier.trained_kb_version == knowledge.read_version()
+
+    (liberica,) = [row for row in knowledge.list_coffee_types() if row['name'] == 'Либерика']
+    acidity, body = (char['id'] for char in knowledge.list_characteristics('numeric'))
+    (region,) = (char['id'] for char in knowledge.list_characteristics('categorical'))
+    # Образец полный, как обучающие: без региона короткое обучение не всегда уверенно
+    predictions = classifier.predict({'characteristics': {
+        'numeric': {str(acidity): 22, str(body): 23}, 'categorical': {str(region): 'Америка'}
+    }})
+    assert classifier.class_mapping[int(predictions[0].argmax())] == liberica['id']
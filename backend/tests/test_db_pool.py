@@ -0,0 +1,125 @@
+"""Пул соединений: выдача, ожидание, проверка и возврат соединений"""
+import threading
+import time
+import pytest
+from flask import Flask
+import db
+from db import ConnectionPool, PoolError
+
+
+class FakeConnection:
+    def __init__(self, number):
+        self.number = number
+        self.in_transaction = False
+        self.alive = True
+        self.closed = False
+        self.rollbacks = 0
+
+    def ping(self, reconnect=False):
+        if not self.alive:
+            raise db.mysql.connector.errors.OperationalError('соединение потеряно')
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.in_transaction = False
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def connections(monkeypatch):
+    """Открытые пулом поддельные соединения по порядку"""
+    opened = []
+
+    def connect(**config):
+        opened.append(FakeConnection(len(opened)))
+        return opened[-1]
+
+    monkeypatch.setattr(db.mysql.connector, 'connect', connect)
+    return opened
+
+
+def _pool(size=2, borrow_timeout=0.2, health_check_idle_seconds=60):
+    return ConnectionPool({}, size, borrow_timeout, health_check_idle_seconds)
+
+
+def test_released_connection_is_reused(connections):
+    pool = _pool()
+    first = pool.acquire()
+    first.close()
+    first.close()  # повторный close() ничего не делает
+    second = pool.acquire()
+    assert second.number == 0
+    assert len(connections) == 1
+    assert pool.metrics()['in_use'] == 1
+
+
+def test_acquire_times_out_when_pool_is_exhausted(connections):
+    pool = _pool(size=1, borrow_timeout=0.05)
+    pool.acquire()
+    started = time.monotonic()
+    with pytest.raises(PoolError):
+        pool.acquire()
+    assert time.monotonic() - started >= 0.05
+    assert pool.metrics()['timeouts'] == 1
+    assert len(connections) == 1
+
+
+def test_waiter_receives_released_connection(connections):
+    pool = _pool(size=1, borrow_timeout=2)
+    lease = pool.acquire()
+    received = []
+    waiter = threading.Thread(target=lambda: received.append(pool.acquire()))
+    waiter.start()
+    while pool.metrics()['waiters'] == 0:
+        time.sleep(0.001)
+    lease.close()
+    waiter.join(2)
+    assert [connection.number for connection in received] == [0]
+    assert pool.metrics()['wait_ms_max'] > 0
+
+
+def test_idle_connection_failing_ping_is_replaced(connections):
+    pool = _pool(health_check_idle_seconds=0)
+    lease = pool.acquire()
+    connections[0].alive = False
+    lease.close()
+    replacement = pool.acquire()
+    assert replacement.number == 1
+    assert connections[0].closed
+    metrics = pool.metrics()
+    assert (metrics['open'], metrics['health_check_failures']) == (1, 1)
+
+
+def test_release_rolls_back_open_transaction(connections):
+    pool = _pool()
+    lease = pool.acquire()
+    connections[0].in_transaction = True
+    lease.close()
+    assert connections[0].rollbacks == 1
+    assert not pool.acquire().in_transaction
+
+
+def test_failed_connect_frees_slot(connections, monkeypatch):
+    pool = _pool(size=1)
+
+    def refuse(**config):
+        raise db.mysql.connector.errors.InterfaceError('сервер недоступен')
+
+    monkeypatch.setattr(db.mysql.connector, 'connect', refuse)
+    with pytest.raises(db.mysql.connector.Error):
+        pool.acquire()
+    assert pool.metrics()['open'] == 0
+
+
+def test_request_leases_returned_at_teardown(connections, monkeypatch):
+    pool = _pool(size=1)
+    monkeypatch.setattr(db, 'get_pool', lambda: pool)
+    app = Flask(__name__)
+    db.init_app(app)
+    with app.app_context():
+        db.get_db_connection()  # close() забыт
+        assert pool.metrics()['in_use'] == 1
+    assert pool.metrics()['in_use'] == 0
+    assert pool.acquire().number == 0
@@ -0,0 +1,23 @@
+"""Файлы моделей не зависят от текущего каталога процесса"""
+import os
+import dataset_cache
+import ml_model
+import model_registry
+import tune_model
+from conftest import BACKEND_DIR
+
+PATHS = (
+    ml_model.MODEL_PATH,
+    ml_model.NETWORK_PATH,
+    tune_model.TUNING_DIR,
+    tune_model.RESULTS_PATH,
+    model_registry.REGISTRY_DIR,
+    dataset_cache.CACHE_DIR
+)
+
+
+def test_model_paths_are_under_backend_models():
+    models_dir = os.path.join(BACKEND_DIR, 'models')
+    for path in PATHS:
+        assert os.path.isabs(path)
+        assert os.path.commonpath([path, models_dir]) == models_dir
@@ -0,0 +1,113 @@
+"""Реестр версий: продвижение, откат, закрепление и одновременные изменения указателя"""
+import multiprocessing
+import pytest
+from flask import Flask
+
+
+def _register(registry, tmp_path, count):
+    versions = []
+    for number in range(count):
+        source = tmp_path / f"model-{number}.h5"
+        source.write_bytes(b'model')
+        versions.append(registry.register(str(source)))
+    return versions
+
+
+def test_register_numbers_versions(registry, tmp_path):
+    assert _register(registry, tmp_path, 3) == ['v000001', 'v000002', 'v000003']
+    assert registry.version_names() == ['v000001', 'v000002', 'v000003']
+
+
+def test_promote_and_rollback(registry, tmp_path):
+    v1, v2, v3 = _register(registry, tmp_path, 3)
+    for version in (v1, v2, v3):
+        registry.promote(version)
+    assert registry.read_pointer()['history'] == [v1, v2]
+
+    assert registry.rollback() == v2
+    pointer = registry.read_pointer()
+    assert (pointer['version'], pointer['history'], pointer['pinned']) == (v2, [v1], True)
+
+
+def test_pinned_version_blocks_automatic_promotion(registry, tmp_path):
+    v1, v2 = _register(registry, tmp_path, 2)
+    registry.promote(v1, pinned=True)
+    assert not registry.promote(v2, automatic=True)
+    assert registry.current_version() == v1
+    registry.unpin()
+    assert registry.promote(v2, automatic=True)
+    assert registry.current_version() == v2
+
+
+def test_rollback_without_history(registry, tmp_path):
+    (v1,) = _register(registry, tmp_path, 1)
+    registry.promote(v1)
+    with pytest.raises(ValueError):
+        registry.rollback()
+
+
+@pytest.mark.parametrize('version', ['../versions', 'v1', 'v000001/../../x', ''])
+def test_invalid_version_names(registry, version):
+    with pytest.raises(ValueError):
+        registry.promote(version)
+
+
+def test_gc_keeps_current_and_history(registry, tmp_path):
+    versions = _register(registry, tmp_path, 5)
+    registry.promote(versions[0])
+    registry.promote(versions[2])
+    assert registry.collect_garbage(keep=1) == [versions[1]]
+    # Текущая, история и зарегистрированные после текущей ещё не продвинутые версии
+    assert registry.version_names() == [versions[0], versions[2], versions[3], versions[4]]
+
+
+def test_gc_keeps_versions_newer_than_current(registry, tmp_path):
+    versions = _register(registry, tmp_path, 3)
+    assert registry.collect_garbage(keep=1) == []
+    registry.promote(versions[1], pinned=True)
+    assert registry.collect_garbage(keep=1) == [versions[0]]
+    assert registry.version_names() == versions[1:]
+
+
+@pytest.mark.parametrize('keep', [0, -1])
+def test_gc_requires_keeping_a_version(registry, keep):
+    with pytest.raises(ValueError):
+        registry.collect_garbage(keep=keep)
+
+
+def _promote_after(registry, barrier, version):
+    barrier.wait()
+    registry.promote(version)
+
+
+def test_concurrent_promotions_keep_history(registry, tmp_path):
+    versions = _register(registry, tmp_path, 8)
+    context = multiprocessing.get_context('fork')
+    barrier = context.Barrier(len(versions))
+    processes = [context.Process(target=_promote_after, args=(registry, barrier, version)) for version in versions]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(30)
+        assert process.exitcode == 0
+
+    pointer = registry.read_pointer()
+    assert sorted(pointer['history'] + [pointer['version']]) == versions
+
+
+def test_promote_route_rejects_invalid_name(registry):
+    from routes.model_versions import model_versions
+    app = Flask(__name__)
+    app.register_blueprint(model_versions)
+    client = app.test_client()
+    assert client.post('/api/model/versions/v0..x/promote').status_code == 400
+    assert client.post('/api/model/versions/v000009/promote').status_code == 404
+
+
+def test_gc_route_rejects_keep_below_one(registry):
+    from routes.model_versions import model_versions
+    app = Flask(__name__)
+    app.register_blueprint(model_versions)
+    client = app.test_client()
+    assert client.post('/api/model/gc', json={'keep': 0}).status_code == 400
+    assert client.post('/api/model/gc', json={'keep': 1}).get_json() == {'removed': []}
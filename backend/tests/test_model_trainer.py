@@ -0,0 +1,82 @@
+"""Одно обучение на изменение базы знаний при нескольких процессах-воркерах"""
+import json
+import os
+import threading
+import time
+import pytest
+import model_trainer
+from model_trainer import BackgroundTrainer
+
+
+class FakeClassifier:
+    """Регистрирует и продвигает обученный файл, как CoffeeClassifier.swap_model"""
+
+    def __init__(self, registry):
+        self.registry = registry
+
+    def sync_registry(self, force=False):
+        return False
+
+    def swap_model(self, model_path, trained_at, kb_version=None):
+        version = self.registry.register(model_path)
+        self.registry.promote(version, automatic=True)
+        return version
+
+
+@pytest.fixture
+def trainings(registry, monkeypatch):
+    """Подменяет процесс train_worker.py: пишет модель с метаданными и считает запуски"""
+    runs = []
+    fail_first = []
+
+    def run(command, cwd=None):
+        runs.append(command)
+        # Обучение занимает время, за которое остальные воркеры успевают запросить своё
+        time.sleep(0.2)
+        if fail_first and len(runs) == 1:
+            return model_trainer.subprocess.CompletedProcess(command, 1)
+        output_path = command[command.index('--output') + 1]
+        open(output_path, 'w').close()
+        with open(os.path.splitext(output_path)[0] + '.json', 'w', encoding='utf-8') as f:
+            json.dump({'kb_version': 3}, f)
+        return model_trainer.subprocess.CompletedProcess(command, 0)
+
+    monkeypatch.setattr(model_trainer.subprocess, 'run', run)
+    monkeypatch.setattr(model_trainer, 'fetch_version', lambda: 3)
+    monkeypatch.setattr(model_trainer, 'BACKEND_DIR', str(registry.REGISTRY_DIR))
+    return runs, fail_first
+
+
+def _retrain_in_workers(registry, count=3):
+    trainers = [BackgroundTrainer(FakeClassifier(registry)) for _ in range(count)]
+    barrier = threading.Barrier(count)
+
+    def request(trainer):
+        barrier.wait()
+        trainer.request_retrain(reason='data_changed')
+
+    threads = [threading.Thread(target=request, args=(trainer,)) for trainer in trainers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for trainer in trainers:
+        trainer._thread.join(10)
+    return trainers
+
+
+def test_one_training_per_change(registry, trainings):
+    runs, _ = trainings
+    trainers = _retrain_in_workers(registry)
+    assert len(runs) == 1
+    assert registry.version_names() == ['v000001']
+    assert all(trainer.status()['status'] == 'idle' for trainer in trainers)
+
+
+def test_next_worker_retrains_after_failure(registry, trainings):
+    runs, fail_first = trainings
+    fail_first.append(True)
+    trainers = _retrain_in_workers(registry)
+    assert len(runs) == 2
+    assert registry.version_names() == ['v000001']
+    assert sorted(trainer.status()['status'] for trainer in trainers) == ['failed', 'idle', 'idle']
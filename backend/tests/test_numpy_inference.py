@@ -0,0 +1,66 @@
+"""NumPy-экспорт совпадает с Keras-моделью после свёртки BatchNormalization"""
+import numpy as np
+import pytest
+
+tf = pytest.importorskip('tensorflow')
+
+from ml_model import build_network
+from numpy_inference import NumpyPredictor, export_numpy_model, fold_keras_model
+
+
+def _randomize_batch_norm(model, rng):
+    """Ненулевые gamma/beta и накопленные статистики, чтобы свёртка была нетривиальной"""
+    for layer in model.layers:
+        if layer.__class__.__name__ == 'BatchNormalization':
+            layer.set_weights([
+                rng.uniform(0.5, 2.0, size=weight.shape).astype(np.float32)
+                if index == len(layer.get_weights()) - 1
+                else rng.normal(size=weight.shape).astype(np.float32)
+                for index, weight in enumerate(layer.get_weights())
+            ])
+
+
+def _probe(rng, n_features):
+    return rng.normal(size=(64, n_features)).astype(np.float32)
+
+
+def test_folded_network_matches_keras(tmp_path):
+    rng = np.random.default_rng(1)
+    model = build_network(tf, 7, 4, {'hidden_units': [16, 8], 'dropout': 0.3})
+    _randomize_batch_norm(model, rng)
+    X = _probe(rng, 7)
+
+    predictor = export_numpy_model(model, str(tmp_path / 'model.npz'), {'kb_version': 3})
+    expected = model.predict(X, verbose=0)
+    np.testing.assert_allclose(predictor.predict(X), expected, atol=1e-5)
+
+    loaded = NumpyPredictor.load(str(tmp_path / 'model.npz'))
+    np.testing.assert_allclose(loaded.predict(X), expected, atol=1e-5)
+    assert loaded.metadata == {'kb_version': 3}
+    assert (loaded.input_shape, loaded.output_shape) == ((None, 7), (None, 4))
+
+
+def test_fold_without_scale_and_center_and_consecutive_batch_norm():
+    rng = np.random.default_rng(2)
+    layers = tf.keras.layers
+    model = tf.keras.models.Sequential([
+        layers.Dense(6, activation='relu', input_shape=(5,)),
+        layers.BatchNormalization(scale=False),
+        layers.BatchNormalization(center=False),
+        layers.Dense(3, activation='softmax')
+    ])
+    _randomize_batch_norm(model, rng)
+    X = _probe(rng, 5)
+    np.testing.assert_allclose(
+        NumpyPredictor(fold_keras_model(model)).predict(X), model.predict(X, verbose=0), atol=1e-5
+    )
+
+
+def test_trailing_batch_norm_is_rejected():
+    layers = tf.keras.layers
+    model = tf.keras.models.Sequential([
+        layers.Dense(4, activation='relu', input_shape=(3,)),
+        layers.BatchNormalization()
+    ])
+    with pytest.raises(ValueError):
+        fold_keras_model(model)
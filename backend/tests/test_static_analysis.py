@@ -0,0 +1,50 @@
+"""Статический анализ и кэш его результатов"""
+import pytest
+from config import ml_config
+from result_cache import canonical_characteristics
+
+
+@pytest.fixture
+def client(sqlite_repository, monkeypatch):
+    acidity = sqlite_repository.add_characteristic('acidity', 'numeric', limits=(0, 10))
+    type_id = sqlite_repository.add_coffee_type('Арабика')
+    sqlite_repository.replace_type_characteristics(type_id, [(acidity, 4, 5.55)], [])
+    monkeypatch.setitem(ml_config, 'preload_model', False)
+    import app
+    app.static_cache.clear()
+    yield app.app.test_client(), acidity
+    app.static_cache.clear()
+
+
+def _analyze(client, char_id, value):
+    return client.post('/api/specialist/analyze-static', json={
+        'characteristics': {'numeric': {str(char_id): value}, 'categorical': {}}
+    })
+
+
+def test_canonical_form_does_not_round():
+    numeric, categorical = canonical_characteristics({1: '5.5', 2: 5.55, 3: 'abc'}, {4: 'x'}, 2)
+    assert numeric == {'1': 5.5, '2': 5.55, '3': 'abc'}
+    assert categorical == {'4': 'x'}
+    # Значения точнее ввода не кэшируются
+    assert canonical_characteristics({1: 5.554}, {}, 2) is None
+    assert canonical_characteristics({1: 0.1 + 0.2}, {}, 2) is None
+
+
+def test_boundary_value_matches(client):
+    client, acidity = client
+    response = _analyze(client, acidity, 5.55)
+    assert response.status_code == 200
+    assert response.get_json()['type'] == 'Арабика'
+
+
+def test_value_beyond_precision_is_analyzed_raw_and_not_cached(client):
+    import app
+    client, acidity = client
+    # Раньше 5.554 округлялось до 5.55 и попадало в диапазон 4 - 5.55
+    response = _analyze(client, acidity, 5.554)
+    assert response.status_code == 200
+    assert response.get_json()['type'] is None
+    assert app.static_cache.stats()['entries'] == 0
+    assert _analyze(client, acidity, 5.55).get_json()['type'] == 'Арабика'
+    assert app.static_cache.stats()['entries'] == 1
@@ -0,0 +1,167 @@
+"""Репозиторий хранилища на обоих движках.
+
+SQLite запускается на временном файле. MySQL - только если TEST_MYSQL_DATABASE
+указывает на отдельную базу со схемой init.sql: её таблицы очищаются перед
+каждым тестом.
+"""
+import os
+from decimal import Decimal
+import pytest
+import storage
+from storage import DuplicateError, MySQLRepository, SQLiteRepository
+
+MYSQL_TABLES = (
+    'coffee_categorical_characteristics',
+    'coffee_numeric_characteristics',
+    'categorical_values',
+    'numeric_characteristic_limits',
+    'characteristics',
+    'coffee_types'
+)
+
+
+def _mysql_repository():
+    database = os.environ.get('TEST_MYSQL_DATABASE')
+    if not database:
+        pytest.skip('TEST_MYSQL_DATABASE не задана')
+    import db
+    from config import db_config
+    db_config['database'] = database
+    db._pool = None
+    repository = MySQLRepository()
+    with repository._session() as cursor:
+        for table in MYSQL_TABLES:
+            repository._execute(cursor, f"DELETE FROM {table}")
+        repository._execute(cursor, "UPDATE knowledge_base_version SET version = 0 WHERE id = 1")
+    return repository
+
+
+@pytest.fixture(params=['sqlite', 'mysql'])
+def repository(request, tmp_path):
+    if request.param == 'sqlite':
+        return SQLiteRepository(str(tmp_path / 'kb.sqlite3'))
+    return _mysql_repository()
+
+
+@pytest.fixture
+def catalog(repository):
+    """Сорт, числовая характеристика с ограничениями и категориальная со значениями"""
+    type_id = repository.add_coffee_type('Арабика')
+    acidity = repository.add_characteristic('acidity', 'numeric', limits=(0, 10))
+    region = repository.add_characteristic('region', 'categorical', values=['Эфиопия', 'Кения, Ньери'])
+    process = repository.add_characteristic('process', 'categorical', values=['мытая'])
+    return type_id, acidity, region, process
+
+
+def _selected(repository, type_id):
+    return sorted((row['id'], row['value']) for row in repository.type_categorical_values(type_id))
+
+
+def test_duplicate_coffee_type(repository):
+    repository.add_coffee_type('Robusta')
+    with pytest.raises(DuplicateError):
+        repository.add_coffee_type('robusta')
+
+
+def test_writes_bump_version(repository):
+    version = repository.read_version()
+    repository.add_coffee_type('Robusta')
+    assert repository.read_version() == version + 1
+
+
+def test_replace_keeps_existing_values_when_creating_new(repository, catalog):
+    type_id, acidity, region, process = catalog
+    repository.replace_type_characteristics(
+        type_id,
+        [(acidity, 4, 6)],
+        [(region, 'Эфиопия'), (process, 'натуральная')],
+        create_values=True
+    )
+    assert _selected(repository, type_id) == [(region, 'Эфиопия'), (process, 'натуральная')]
+    assert [row['value'] for row in repository.list_categorical_values(process)] == ['мытая', 'натуральная']
+
+
+def test_replace_skips_unknown_values_without_create(repository, catalog):
+    type_id, acidity, region, process = catalog
+    repository.replace_type_characteristics(type_id, [], [(region, 'Кения, Ньери'), (process, 'натуральная')])
+    assert _selected(repository, type_id) == [(region, 'Кения, Ньери')]
+
+
+def test_add_and_delete_type_characteristic(repository, catalog):
+    type_id, acidity, region, process = catalog
+    assert repository.add_type_characteristic(type_id, acidity, numeric=(4, 6)) == 1
+    assert repository.add_type_characteristic(type_id, region, values=['Эфиопия', 'нет такого']) == 1
+    assert repository.type_characteristic_ids(type_id) == ([acidity], [region])
+    assert repository.delete_type_characteristic(type_id, region) == 1
+    assert repository.delete_type_characteristic(type_id, region) == 0
+
+
+def test_update_type_values_accepts_decimal(repository, catalog):
+    type_id, acidity, region, process = catalog
+    repository.add_type_characteristic(type_id, acidity, numeric=(4, 6))
+    repository.add_type_characteristic(type_id, region, values=['Эфиопия'])
+    repository.update_type_values(type_id, [(acidity, Decimal('4.25'), Decimal('5'))], {region: ['Кения, Ньери']})
+    (numeric,) = repository.type_numeric_ranges(type_id)
+    assert (float(numeric['min_value']), float(numeric['max_value'])) == (4.25, 5.0)
+    assert numeric['limits_id'] is not None
+    assert _selected(repository, type_id) == [(region, 'Кения, Ньери')]
+
+
+def test_delete_coffee_type_removes_characteristics(repository, catalog):
+    type_id, acidity, region, process = catalog
+    repository.add_type_characteristic(type_id, acidity, numeric=(4, 6))
+    assert repository.delete_coffee_type(type_id)
+    assert not repository.delete_coffee_type(type_id)
+    assert repository.type_numeric_ranges(type_id) == []
+
+
+def test_import_catalog_creates_and_replaces(repository, catalog):
+    type_id, acidity, region, process = catalog
+    repository.add_type_characteristic(type_id, acidity, numeric=(4, 6))
+    value_id = repository.list_categorical_values(region)[0]['id']
+    summary = repository.import_catalog([
+        {'name': 'Арабика', 'numeric': [], 'categorical': [(region, value_id)]},
+        {'name': 'Либерика', 'numeric': [(acidity, 1, 2)], 'categorical': []}
+    ])
+    assert (summary['created'], summary['updated']) == (1, 1)
+    assert repository.type_numeric_ranges(type_id) == []
+    assert len(repository.type_categorical_values(type_id)) == 1
+
+
+def test_completeness_data(repository, catalog):
+    type_id, acidity, region, process = catalog
+    empty_id = repository.add_coffee_type('Robusta')
+    repository.add_type_characteristic(type_id, acidity, numeric=(0, 12))
+    coffee_types, counts, invalid_numeric, empty_categorical = repository.completeness_data()
+    assert {row['id'] for row in coffee_types} == {type_id, empty_id}
+    assert counts == {type_id: 1}
+    assert [row['name'] for row in invalid_numeric] == ['acidity']
+
+
+def test_snapshot_roundtrip_into_sqlite(repository, catalog, tmp_path, monkeypatch):
+    import knowledge_base
+    type_id, acidity, region, process = catalog
+    repository.add_type_characteristic(type_id, acidity, numeric=(4, 6))
+    repository.add_type_characteristic(type_id, region, values=['Эфиопия'])
+    monkeypatch.setattr(storage, '_repository', repository)
+    snapshot = knowledge_base.load_snapshot_from_db()
+
+    copy = SQLiteRepository(str(tmp_path / 'copy.sqlite3'))
+    copy.load_from_snapshot(snapshot)
+    assert copy.list_coffee_types() == repository.list_coffee_types()
+    assert copy.read_version() == repository.read_version()
+    assert _selected(copy, type_id) == _selected(repository, type_id)
+    with pytest.raises(ValueError):
+        copy.load_from_snapshot(snapshot)
+
+
+def test_mysql_creates_missing_version_table():
+    """База, развёрнутая до появления таблицы версии, продолжает принимать записи"""
+    repository = _mysql_repository()
+    with repository._session() as cursor:
+        repository._execute(cursor, "DROP TABLE knowledge_base_version")
+    repository = MySQLRepository()
+    MySQLRepository()  # повторная миграция ничего не меняет
+    assert repository.read_version() == 0
+    repository.add_coffee_type('Robusta')
+    assert repository.read_version() == 1
@@ -0,0 +1,58 @@
+"""Продвижение кандидата подбора гиперпараметров"""
+import json
+import os
+import pytest
+
+tf = pytest.importorskip('tensorflow')
+
+import ml_model
+import tune_model
+from ml_model import build_network
+
+
+class FakeClassifier:
+    characteristic_mapping = {'numeric': {}, 'categorical': {}}
+
+    def __init__(self, fail):
+        self.fail = fail
+        self.swapped = []
+
+    def save_trained_model(self, training, snapshot, class_mapping, model_path, trained_at):
+        base = os.path.splitext(model_path)[0]
+        for extension in ('.h5', '.json', '.npz'):
+            with open(base + extension, 'w') as f:
+                f.write('{}')
+
+    def swap_model(self, model_path, trained_at):
+        if self.fail:
+            raise ValueError('модель не прошла проверку')
+        self.swapped.append(model_path)
+
+
+@pytest.fixture
+def tuning(tmp_path, monkeypatch):
+    models_dir = tmp_path / 'models'
+    models_dir.mkdir()
+    monkeypatch.setattr(tune_model, 'MODELS_DIR', str(models_dir))
+    monkeypatch.setattr(ml_model, 'NETWORK_PATH', str(models_dir / 'network.json'))
+    network = {'hidden_units': [4], 'dropout': 0.0}
+    candidate_path = str(tmp_path / 'candidate.h5')
+    build_network(tf, 3, 2, network).save(candidate_path)
+    best = {'model_path': candidate_path, 'network': network, 'accuracy': 1.0}
+    return models_dir, best
+
+
+def test_failed_swap_keeps_hyperparameters_and_removes_model(tuning):
+    models_dir, best = tuning
+    with pytest.raises(ValueError):
+        tune_model.promote(FakeClassifier(fail=True), None, [], None, best)
+    assert os.listdir(models_dir) == []
+
+
+def test_successful_swap_saves_hyperparameters(tuning):
+    models_dir, best = tuning
+    classifier = FakeClassifier(fail=False)
+    tune_model.promote(classifier, None, [], None, best)
+    assert len(classifier.swapped) == 1
+    with open(models_dir / 'network.json', encoding='utf-8') as f:
+        assert json.load(f) == best['network']
@@ -0,0 +1,36 @@
+"""Процесс обучения модели, запускаемый BackgroundTrainer.
+
+Обучает модель по текущим данным базы знаний и сохраняет её в указанный файл.
+Запускается отдельным процессом, чтобы обучение не блокировало сервер (и GIL).
+С --snapshot данные берутся из файла снимка (kb_snapshot.py export), а не из MySQL.
+
+    python train_worker.py --output models/coffee_classifier.training.h5 --mode auto
+"""
+import argparse
+import sys
+from config import kb_config
+from ml_model import CoffeeClassifier
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Обучение модели классификации кофе')
+    parser.add_argument('--output', required=True, help='Путь для сохранения обученной модели')
+    parser.add_argument('--samples-per-class', type=int, default=None,
+                        help='Число синтетических образцов на сорт (по умолчанию из config.ml_config)')
+    parser.add_argument('--mode', choices=('full', 'auto'), default='full',
+                        help='full - обучение с нуля, auto - дообучение текущей модели, если возможно')
+    parser.add_argument('--snapshot', default=None,
+                        help='Файл снимка базы знаний для обучения без MySQL')
+    args = parser.parse_args()
+
+    if args.snapshot:
+        kb_config['snapshot_path'] = args.snapshot
+    classifier = CoffeeClassifier(load_artifacts=False)
+    history = classifier.train_model(
+        model_path=args.output, samples_per_class=args.samples_per_class, mode=args.mode
+    )
+    return 0 if history is not None else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,48 @@
+import numpy as np
+
+
+def generate_training_set(snapshot, encoder, class_mapping, samples_per_class, seed=None):
+    """Векторно генерирует синтетическую обучающую выборку по снимку базы знаний.
+
+    Числовые признаки всех классов берутся одним вызовом uniform по матрицам
+    диапазонов (для неопределённых характеристик - 0.0), категориальные
+    one-hot столбцы заполняются индексированием массивов: каждому образцу
+    случайно выбирается одно из допустимых для сорта значений. Раскладку
+    столбцов и нормализацию задаёт encoder (FeatureEncoder) - тот же, что при инференсе.
+
+    Возвращает (X float32 [n_classes * samples_per_class, n_features], y int [..]).
+    """
+    rng = np.random.default_rng(seed)
+    n_numeric = encoder.n_numeric
+    n_classes = len(class_mapping)
+
+    # Матрицы диапазонов (классы x числовые характеристики)
+    low = np.zeros((n_classes, n_numeric))
+    high = np.zeros((n_classes, n_numeric))
+    for class_index, type_id in enumerate(class_mapping):
+        ranges = snapshot.numeric_ranges.get(type_id, {})
+        for column, char_id in enumerate(encoder.numeric_ids):
+            bounds = ranges.get(int(char_id))
+            if bounds and bounds[0] is not None and bounds[1] is not None:
+                low[class_index, column], high[class_index, column] = bounds
+
+    labels = np.repeat(np.arange(n_classes), samples_per_class)
+    X = np.zeros((len(labels), encoder.n_features), dtype=np.float32)
+
+    # Все числовые признаки за один вызов
+    X[:, :n_numeric] = rng.uniform(low[labels], high[labels])
+    encoder.normalize(X)
+
+    # One-hot блок: для каждого класса выбираем допустимые столбцы индексированием
+    for class_index, type_id in enumerate(class_mapping):
+        assignments = snapshot.categorical_assignments.get(type_id, {})
+        rows = np.arange(class_index * samples_per_class, (class_index + 1) * samples_per_class)
+        for char_id, value_columns in encoder.categorical_columns.items():
+            columns = np.array([
+                value_columns[value] for value in assignments.get(int(char_id), ()) if value in value_columns
+            ], dtype=np.int64)
+            if columns.size == 0:
+                continue
+            X[rows, columns[rng.integers(columns.size, size=samples_per_class)]] = 1.0
+
+    return X, labels
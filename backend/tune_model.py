@@ -0,0 +1,236 @@
+"""Подбор гиперпараметров модели.
+
+Кандидаты из config.tuning_config обучаются параллельно в отдельных процессах,
+каждому выделяется фиксированное число потоков, чтобы процессы не делили ядра.
+Для каждого кандидата записываются точность, время обучения и задержка
+одиночного предсказания NumPy-движком. Текущей становится самая маленькая
+модель, которая укладывается в бюджет задержки и теряет не больше
+accuracy_tolerance точности относительно лучшего кандидата; её гиперпараметры
+сохраняются в models/network.json и используются при следующих обучениях.
+
+    python tune_model.py --workers 4 --threads 1 --latency-budget-ms 1.0
+"""
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import numpy as np
+from config import ml_config, tuning_config
+import model_registry
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+MODELS_DIR = os.path.join(BACKEND_DIR, 'models')
+TUNING_DIR = os.path.join(MODELS_DIR, 'tuning')
+RESULTS_PATH = os.path.join(MODELS_DIR, 'tuning_results.json')
+# Переменные окружения, ограничивающие потоки BLAS и TensorFlow в процессах-воркерах
+THREAD_ENV_VARS = (
+    'OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS',
+    'TF_NUM_INTRAOP_THREADS', 'TF_NUM_INTEROP_THREADS'
+)
+LATENCY_RUNS = 200
+
+
+def candidate_networks(config=tuning_config):
+    """Все сочетания гиперпараметров из сетки"""
+    return [
+        {
+            'hidden_units': list(hidden_units),
+            'dropout': dropout,
+            'learning_rate': learning_rate,
+            'batch_size': batch_size
+        }
+        for hidden_units, dropout, learning_rate, batch_size in itertools.product(
+            config['hidden_units'], config['dropout'], config['learning_rate'], config['batch_size']
+        )
+    ]
+
+
+def candidate_name(network):
+    units = 'x'.join(str(units) for units in network['hidden_units']) or 'linear'
+    return f"{units}_d{network['dropout']}_lr{network['learning_rate']}_b{network['batch_size']}"
+
+
+def _init_worker(threads):
+    """Инициализатор процесса пула: фиксирует число потоков TensorFlow"""
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+
+def evaluate_candidate(network, X_train, y_train, X_val, y_val, n_classes):
+    """Обучает одного кандидата и измеряет точность, время обучения и задержку"""
+    import tensorflow as tf
+    from ml_model import build_network
+    from numpy_inference import NumpyPredictor, fold_keras_model
+
+    started = time.perf_counter()
+    model = build_network(tf, X_train.shape[1], n_classes, network)
+    model.compile(
+        optimizer=tf.keras.optimizers.Adam(learning_rate=network['learning_rate']),
+        loss='categorical_crossentropy',
+        metrics=['accuracy']
+    )
+    model.fit(
+        X_train, tf.keras.utils.to_categorical(y_train, num_classes=n_classes),
+        epochs=ml_config['max_epochs'],
+        batch_size=network['batch_size'],
+        validation_split=0.2,
+        callbacks=[tf.keras.callbacks.EarlyStopping(
+            monitor='val_loss',
+            patience=ml_config['early_stopping_patience'],
+            restore_best_weights=True
+        )],
+        verbose=0
+    )
+    train_seconds = time.perf_counter() - started
+
+    # Точность и задержка меряются на том движке, которым обслуживаются запросы
+    predictor = NumpyPredictor(fold_keras_model(model))
+    accuracy = float(np.mean(np.argmax(predictor.predict(X_val), axis=1) == y_val))
+    sample = np.ascontiguousarray(X_val[:1])
+    timings = []
+    for _ in range(LATENCY_RUNS):
+        call_started = time.perf_counter()
+        predictor.predict(sample)
+        timings.append(time.perf_counter() - call_started)
+
+    model_path = os.path.join(TUNING_DIR, candidate_name(network) + '.h5')
+    model.save(model_path)
+    return {
+        'name': candidate_name(network),
+        'network': network,
+        'accuracy': accuracy,
+        'train_seconds': round(train_seconds, 3),
+        'latency_ms': round(float(np.median(timings)) * 1000, 4),
+        'parameters': int(model.count_params()),
+        'model_path': model_path
+    }
+
+
+def select_candidate(results, latency_budget_ms, accuracy_tolerance):
+    """Самая маленькая модель в бюджете задержки, не уступающая лучшей больше допуска"""
+    eligible = [result for result in results if result['latency_ms'] <= latency_budget_ms]
+    if not eligible:
+        return None
+    best_accuracy = max(result['accuracy'] for result in eligible)
+    good = [result for result in eligible if result['accuracy'] >= best_accuracy - accuracy_tolerance]
+    return min(good, key=lambda result: (result['parameters'], -result['accuracy'], result['latency_ms']))
+
+
+def promote(classifier, snapshot, class_mapping, scaler, best):
+    """Делает выбранного кандидата текущей моделью и сохраняет его гиперпараметры"""
+    import tensorflow as tf
+    from ml_model import NETWORK_PATH
+
+    training = {
+        'model': tf.keras.models.load_model(best['model_path']),
+        'mapping': classifier.characteristic_mapping,
+        'scaler': scaler,
+        'history': None,
+        'mode': 'full',
+        'network': best['network'],
+        'full_trained_at': None,
+        'validation_accuracy': best['accuracy']
+    }
+    trained_at = datetime.now()
+    model_path = os.path.join(MODELS_DIR, f"coffee_classifier.tuning-{trained_at.strftime('%Y%m%d%H%M%S%f')}.h5")
+    try:
+        classifier.save_trained_model(training, snapshot, class_mapping, model_path, trained_at)
+        classifier.swap_model(model_path, trained_at)
+    except Exception:
+        # Непринятая модель не остаётся в models/, гиперпараметры прежние
+        model_registry.discard_artifacts(model_path)
+        raise
+
+    # Гиперпараметры сохраняются только для модели, прошедшей проверку и регистрацию
+    tmp_path = NETWORK_PATH + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(best['network'], f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, NETWORK_PATH)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Подбор гиперпараметров модели классификации кофе')
+    parser.add_argument('--workers', type=int, default=tuning_config['workers'],
+                        help='Число параллельных процессов обучения')
+    parser.add_argument('--threads', type=int, default=tuning_config['threads_per_worker'],
+                        help='Потоков на процесс')
+    parser.add_argument('--latency-budget-ms', type=float, default=tuning_config['latency_budget_ms'],
+                        help='Бюджет задержки одиночного предсказания, мс')
+    parser.add_argument('--no-promote', action='store_true',
+                        help='Только записать результаты, не меняя текущую модель')
+    args = parser.parse_args()
+
+    from knowledge_base import load_snapshot
+    from feature_encoder import FeatureEncoder
+    from dataset_cache import cached_training_set
+    from ml_model import CoffeeClassifier
+
+    classifier = CoffeeClassifier(load_artifacts=False)
+    snapshot = load_snapshot()
+    class_mapping = [type_id for type_id, _ in snapshot.coffee_types]
+    scaler = classifier.compute_scaler(snapshot, class_mapping)
+    encoder = FeatureEncoder(classifier.characteristic_mapping, scaler)
+    X_train, y_train = cached_training_set(
+        snapshot, encoder, class_mapping, ml_config['samples_per_class'], seed=ml_config['training_seed']
+    )
+    X_val, y_val = cached_training_set(
+        snapshot, encoder, class_mapping, ml_config['validation_samples_per_class'],
+        seed=ml_config['training_seed'] + 1
+    )
+    data = (np.asarray(X_train), np.asarray(y_train), np.asarray(X_val), np.asarray(y_val), len(class_mapping))
+
+    candidates = candidate_networks()
+    print(f"Кандидатов: {len(candidates)}, процессов: {args.workers}, потоков на процесс: {args.threads}")
+    os.makedirs(TUNING_DIR, exist_ok=True)
+    # Дочерние процессы наследуют окружение: BLAS и TensorFlow читают его при импорте
+    for name in THREAD_ENV_VARS:
+        os.environ[name] = str(args.threads)
+
+    results = []
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=context,
+                             initializer=_init_worker, initargs=(args.threads,)) as pool:
+        futures = [pool.submit(evaluate_candidate, network, *data) for network in candidates]
+        for future in futures:
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"Ошибка при обучении кандидата: {e}")
+                continue
+            results.append(result)
+            print(
+                f"{result['name']}: точность {result['accuracy']:.3f}, параметров {result['parameters']}, "
+                f"обучение {result['train_seconds']:.1f} с, задержка {result['latency_ms']:.3f} мс"
+            )
+
+    best = select_candidate(results, args.latency_budget_ms, tuning_config['accuracy_tolerance'])
+    with open(RESULTS_PATH, 'w', encoding='utf-8') as f:
+        json.dump({
+            'tuned_at': datetime.now().isoformat(),
+            'kb_fingerprint': snapshot.fingerprint,
+            'latency_budget_ms': args.latency_budget_ms,
+            'selected': best['name'] if best else None,
+            'results': results
+        }, f, ensure_ascii=False, indent=2)
+
+    try:
+        if best is None:
+            print("Ни один кандидат не уложился в бюджет задержки")
+            return 1
+        print(f"Выбран кандидат {best['name']}")
+        if not args.no_promote:
+            promote(classifier, snapshot, class_mapping, scaler, best)
+        return 0
+    finally:
+        shutil.rmtree(TUNING_DIR, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())